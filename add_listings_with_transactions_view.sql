@@ -0,0 +1,35 @@
+-- ============================================================================
+-- LISTINGS WITH TRANSACTIONS (MATERIALIZED VIEW) - OPTIONAL
+-- ============================================================================
+-- Purpose: Distinct listing_ids that have sold, so report generation does not
+--          run SELECT DISTINCT over all of order_transactions on every run
+-- Safe to run multiple times (uses IF NOT EXISTS)
+--
+-- NOTE: reportsv4_optimized.py refreshes this view at the start of every run
+-- and reads it in get_all_listings(). It falls back to the DISTINCT query when
+-- the view is missing, empty, or older than the newest order.
+--
+-- Manual refresh:
+--   REFRESH MATERIALIZED VIEW CONCURRENTLY listings_with_transactions;
+-- ============================================================================
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS listings_with_transactions AS
+SELECT
+    ot.listing_id,
+    MAX(o.created_timestamp) AS last_seen_ts
+FROM order_transactions ot
+JOIN orders o ON o.order_id = ot.order_id
+WHERE ot.listing_id IS NOT NULL
+GROUP BY ot.listing_id;
+
+-- Unique index is required for REFRESH ... CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_listings_with_transactions_listing_id
+    ON listings_with_transactions(listing_id);
+
+ANALYZE listings_with_transactions;
+
+-- Success message
+SELECT
+    'listings_with_transactions created successfully!' as status,
+    COUNT(*) as total_rows
+FROM listings_with_transactions;
@@ -0,0 +1,46 @@
+-- ============================================================================
+-- DAILY ORDER METRICS ROLL-UP (MATERIALIZED VIEW) - OPTIONAL
+-- ============================================================================
+-- Purpose: Pre-aggregated per-day sales by listing/product for ad-hoc analytics
+--          and dashboard queries that only need sums, not per-order detail
+-- Safe to run multiple times (uses IF NOT EXISTS)
+--
+-- NOTE: reportsv4_optimized.py still reads raw orders for report generation.
+-- COGS and FedEx shipping costs are computed per transaction (cost.csv, desi,
+-- zone lookups), which a daily roll-up cannot provide.
+--
+-- Refresh after each order sync:
+--   REFRESH MATERIALIZED VIEW CONCURRENTLY order_metrics_daily;
+-- ============================================================================
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS order_metrics_daily AS
+SELECT
+    date_trunc('day', to_timestamp(o.created_timestamp)) AS day,
+    COALESCE(ot.listing_id, 0) AS listing_id,
+    COALESCE(ot.product_id, 0) AS product_id,
+    COUNT(DISTINCT o.order_id) AS order_count,
+    COUNT(DISTINCT o.buyer_user_id) AS buyer_count,  -- distinct per day, not additive across days
+    SUM(ot.quantity) AS quantity_sold,
+    SUM(ot.quantity * ot.price) AS item_revenue,
+    SUM(COALESCE(ot.shipping_cost, 0)) AS shipping_charged,
+    SUM(COALESCE(ot.tax_cost, 0)) AS tax_collected
+FROM orders o
+JOIN order_transactions ot ON ot.order_id = o.order_id
+WHERE o.status NOT IN ('cancelled', 'canceled')
+GROUP BY 1, 2, 3;
+
+-- Unique index is required for REFRESH ... CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_order_metrics_daily_key
+    ON order_metrics_daily(day, listing_id, product_id);
+CREATE INDEX IF NOT EXISTS idx_order_metrics_daily_product_day
+    ON order_metrics_daily(product_id, day);
+CREATE INDEX IF NOT EXISTS idx_order_metrics_daily_listing_day
+    ON order_metrics_daily(listing_id, day);
+
+ANALYZE order_metrics_daily;
+
+-- Success message
+SELECT
+    'order_metrics_daily created successfully!' as status,
+    COUNT(*) as total_rows
+FROM order_metrics_daily;
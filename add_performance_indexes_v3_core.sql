@@ -13,6 +13,8 @@ CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
 CREATE INDEX IF NOT EXISTS idx_orders_buyer_user_id ON orders(buyer_user_id);
 CREATE INDEX IF NOT EXISTS idx_orders_country ON orders(country);
 CREATE INDEX IF NOT EXISTS idx_orders_timestamp_status ON orders(created_timestamp, status);
+-- Metrics fetch: time window + keyset pagination ORDER BY (created_timestamp, order_id)
+CREATE INDEX IF NOT EXISTS idx_orders_timestamp_order ON orders(created_timestamp, order_id);
 
 -- 2. ORDER_TRANSACTIONS TABLE - CRITICAL FOR SKU/LISTING FILTERING
 CREATE INDEX IF NOT EXISTS idx_order_transactions_order_id ON order_transactions(order_id);
@@ -21,6 +23,8 @@ CREATE INDEX IF NOT EXISTS idx_order_transactions_listing_id ON order_transactio
 CREATE INDEX IF NOT EXISTS idx_order_transactions_sku ON order_transactions(sku);
 CREATE INDEX IF NOT EXISTS idx_order_transactions_order_product ON order_transactions(order_id, product_id);
 CREATE INDEX IF NOT EXISTS idx_order_transactions_order_listing ON order_transactions(order_id, listing_id);
+-- Metrics fetch: product_id = ANY(...) entity filter, index-only lookup of matching order_ids
+CREATE INDEX IF NOT EXISTS idx_order_transactions_product_order ON order_transactions(product_id, order_id);
 
 -- 3. ORDER_REFUNDS TABLE
 CREATE INDEX IF NOT EXISTS idx_order_refunds_order_id ON order_refunds(order_id);
@@ -1,22 +1,42 @@
-from collections import defaultdict
-from dataclasses import dataclass
-from datetime import datetime, timedelta
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Optional, Tuple, Union
 import asyncio
 import argparse
-import json
+import hashlib
 import logging
 import os
-from functools import lru_cache
+import re
+import struct
+import time
+from operator import itemgetter
+from types import MappingProxyType
 
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 from tqdm.asyncio import tqdm as atqdm
+
+from sku_normalize import SKU_PREFIXES, normalize_sku, normalize_sku_series
 from prisma import Prisma
 from prisma.enums import PeriodType
 import math
 
+try:
+    import pyarrow  # optional, enables the Parquet cache for the CSV loaders
+    import pyarrow.parquet as pq
+    PARQUET_CACHE_AVAILABLE = True
+except ImportError:
+    PARQUET_CACHE_AVAILABLE = False
+
+try:
+    import numbagg  # optional, compiled quantile kernels (faster than np.quantile on short arrays)
+    NUMBAGG_AVAILABLE = True
+except ImportError:
+    NUMBAGG_AVAILABLE = False
+
 # --- Configuration ---
 # Configure logging to write to file instead of console to prevent tqdm interference
 logging.basicConfig(
@@ -46,12 +66,564 @@ logger.addHandler(tqdm_handler)
 
 
 # --- Data Structures ---
-@dataclass
+@dataclass(slots=True)
 class DateRange:
     """Represents a start and end date for a time period."""
     start_date: datetime
     end_date: datetime
+    # Derived once at construction; read for every SQL filter, bucket search and period key
+    start_ts: int = field(init=False, repr=False, compare=False)
+    end_ts: int = field(init=False, repr=False, compare=False)
+    period_key: str = field(init=False, repr=False, compare=False)
+    start_day: date = field(init=False, repr=False, compare=False)
+    end_day: date = field(init=False, repr=False, compare=False)
+    days: int = field(init=False, repr=False, compare=False)  # Whole days spanned, plus one (end inclusive)
+
+    def __post_init__(self):
+        self.start_ts = int(self.start_date.timestamp())
+        self.end_ts = int(self.end_date.timestamp())
+        self.start_day = self.start_date.date()
+        self.end_day = self.end_date.date()
+        self.period_key = f"{self.start_day.isoformat()}_to_{self.end_day.isoformat()}"
+        self.days = (self.end_date - self.start_date).days + 1
+
+    def cache_key(self, period_type: str) -> Tuple[str, date, date]:
+        """Metrics store key of this range (same as _period_cache_key, without re-deriving dates)."""
+        return (period_type, self.start_day, self.end_day)
+
+
+@dataclass(slots=True)
+class PeriodMetrics:
+    """
+    Additive per-period totals used when rolling SKU/listing metrics up.
+    
+    Slotted so the accumulator is a compact struct instead of a ~100-key dict
+    that would otherwise be copied for every pair of summed reports.
+    """
+    # Revenue
+    gross_revenue: float = 0.0
+    total_revenue: float = 0.0
+    product_revenue: float = 0.0
+    total_shipping_charged: float = 0.0
+    total_tax_collected: float = 0.0
+    total_vat_collected: float = 0.0
+    total_gift_wrap_revenue: float = 0.0
+    total_discounts_given: float = 0.0
+    # Etsy fees
+    etsy_transaction_fees: float = 0.0
+    etsy_processing_fees: float = 0.0
+    total_etsy_fees: float = 0.0
+    net_revenue: float = 0.0
+    net_revenue_after_refunds: float = 0.0
+    # Shipping, duty & tax
+    actual_shipping_cost: float = 0.0
+    shipping_profit: float = 0.0
+    duty_amount: float = 0.0
+    tax_amount: float = 0.0
+    fedex_processing_fee: float = 0.0
+    # Costs & profit
+    total_cost: float = 0.0
+    total_cost_with_shipping: float = 0.0
+    contribution_margin: float = 0.0
+    gross_profit: float = 0.0
+    net_profit: float = 0.0
+    # Orders & items
+    total_orders: int = 0
+    total_items: int = 0
+    total_quantity_sold: int = 0
+    shipped_orders: int = 0
+    gift_orders: int = 0
+    # Refunds
+    total_refund_amount: float = 0.0
+    total_refund_count: int = 0
+    orders_with_refunds: int = 0
+    etsy_fees_retained_on_refunds: float = 0.0
+    # Customers & inventory
+    cancelled_orders: int = 0
+    unique_customers: int = 0
+    repeat_customers: int = 0
+    total_inventory: int = 0
+    active_variants: int = 0
+    # Cost tracking
+    items_with_direct_cost: int = 0
+    items_with_fallback_cost: int = 0
+    items_missing_cost: int = 0
+    # Ad spend summed from child products/listings
+    total_ad_spend: float = 0.0
+
+    @classmethod
+    def from_sum(cls, metrics_list: List[Dict]) -> "PeriodMetrics":
+        """
+        Sum the additive fields of many metrics dicts in one vectorized call.
+        
+        Reports are stacked into an (n_reports, n_fields) matrix and reduced
+        with a single np.sum(axis=0) instead of adding field by field.
+        """
+        try:
+            # Producers emit every additive field, so one C-level itemgetter per report
+            rows = [_get_additive_fields(m) for m in metrics_list]
+        except KeyError:
+            rows = [[m.get(name, 0) for name in _ADDITIVE_FIELDS] for m in metrics_list]
+        matrix = np.array(rows, dtype=np.float64)
+        return cls.from_array(matrix.sum(axis=0))
+
+    @classmethod
+    def from_array(cls, sums: np.ndarray) -> "PeriodMetrics":
+        """Build totals from a vector of additive field sums (in _ADDITIVE_FIELDS order)."""
+        return cls(*cls.dict_from_array(sums).values())
+
+    @staticmethod
+    def dict_from_array(sums: np.ndarray) -> Dict:
+        """
+        Turn a vector of additive field sums straight into a metrics dict.
+        
+        Skips building the struct when the totals only get merged into a report;
+        count fields are rounded back to ints by position.
+        """
+        values = sums.tolist()
+        for i in _PERIOD_METRICS_INT_INDEX:
+            values[i] = int(round(values[i]))
+        return dict(zip(_ADDITIVE_FIELDS, values))
+
+    def as_dict(self) -> Dict:
+        """Return the accumulated totals as a plain metrics dict."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass
+class PeriodRollup:
+    """
+    Running shop-level totals for one period, folded from listing metrics as
+    each listing report is produced instead of keeping every listing's dict.
+    
+    Only listings with complete cost data are summed; the rest are counted.
+    """
+    first: Optional[Dict] = None  # First included report (source of non-additive fields)
+    sums: Optional[np.ndarray] = None  # Additive field sums in _ADDITIVE_FIELDS order
+    sources: Counter = field(default_factory=Counter)
+    has_all_sources: bool = True
+    customer_orders: List[np.ndarray] = field(default_factory=list)  # Unioned once, in Phase 3
+    has_all_customers: bool = True
+    order_time_counts: Optional[np.ndarray] = None  # Summed _order_time_counts histograms
+    has_all_time_counts: bool = True
+    included: int = 0
+    skipped: int = 0
+
+    def add(self, metrics: Dict) -> None:
+        """Fold one listing report into the running totals."""
+        if not metrics.get('has_complete_cost_data', False):
+            self.skipped += 1
+            return
+        
+        try:
+            row = np.array(_get_additive_fields(metrics), dtype=np.float64)
+        except KeyError:
+            row = np.array([metrics.get(name, 0) for name in _ADDITIVE_FIELDS], dtype=np.float64)
+        
+        if self.first is None:
+            self.first = metrics
+            self.sums = row
+        else:
+            self.sums += row
+        self.included += 1
+        
+        if 'cost_data_sources' in metrics:
+            self.sources.update(metrics['cost_data_sources'])
+        else:
+            self.has_all_sources = False
+        
+        customer_orders = metrics.get('customer_orders')
+        if customer_orders is not None:
+            self.customer_orders.append(customer_orders)
+        else:
+            self.has_all_customers = False
+        
+        time_counts = metrics.get('order_time_counts')
+        if time_counts is None:
+            self.has_all_time_counts = False
+        elif self.order_time_counts is None:
+            self.order_time_counts = time_counts.copy()
+        else:
+            self.order_time_counts += time_counts
+
+
+class SkuMetricsStore:
+    """
+    Phase 1 SKU metrics, laid out column-wise for listing aggregation.
+    
+    Additive fields of every (SKU, period) report live in one
+    (n_skus, n_periods, n_fields) float64 array, so rolling child SKUs up into
+    a listing is a fancy-indexed sum over it instead of stacking per-report
+    dicts. The non-additive remainder of each report is kept as a values tuple
+    against a shared key tuple (reports of one producer have the same keys),
+    which is a fraction of the size of a ~50-key dict per report.
+    """
+    # Per (SKU, period) state
+    MISSING, NO_ORDERS, PRESENT = 0, 1, 2
+    # cost_data_sources counters, kept as a per-report vector for summing
+    SOURCE_KEYS = ('direct', 'sibling_same_period', 'sibling_historical', 'missing')
+
+    def __init__(self, period_keys: List[Tuple[str, date, date]], capacity: int = 0):
+        self.period_index = {key: i for i, key in enumerate(dict.fromkeys(period_keys))}
+        self.sku_index: Dict[str, int] = {}
+        self.normalized_index: Dict[str, str] = {}  # normalized SKU -> stored SKU (DB-loaded reports)
+        shape = (max(capacity, 1), len(self.period_index))
+        self.sums = np.zeros((*shape, len(_ADDITIVE_FIELDS)), dtype=np.float64)
+        self.state = np.zeros(shape, dtype=np.int8)
+        self.sources = np.zeros((*shape, len(self.SOURCE_KEYS)), dtype=np.int64)
+        self.has_sources = np.zeros(shape, dtype=bool)
+        self.extras: Dict[Tuple[int, int], Tuple[Tuple[str, ...], Tuple]] = {}  # -> (keys, values)
+        self._extra_keys: Dict[Tuple[str, ...], Tuple[str, ...]] = {}  # Interned key tuples
+        self.customer_orders: Dict[Tuple[int, int], np.ndarray] = {}  # (buyer, order) pairs per report
+        self.order_time_counts: Dict[Tuple[int, int], np.ndarray] = {}  # _order_time_counts per report
+
+    def __len__(self) -> int:
+        return len(self.sku_index)
+
+    def add_sku(self, sku: str) -> int:
+        """Return the row of a SKU, allocating one on first sight."""
+        row = self.sku_index.get(sku)
+        if row is None:
+            row = self.sku_index[sku] = len(self.sku_index)
+            if row == len(self.state):
+                # Double the arrays so appends stay amortized O(1)
+                self.sums = np.concatenate([self.sums, np.zeros_like(self.sums)])
+                self.state = np.concatenate([self.state, np.zeros_like(self.state)])
+                self.sources = np.concatenate([self.sources, np.zeros_like(self.sources)])
+                self.has_sources = np.concatenate([self.has_sources, np.zeros_like(self.has_sources)])
+        return row
+
+    def put(self, sku: str, period_key: Tuple[str, date, date], metrics: Optional[Dict]) -> None:
+        """Store one SKU report; None marks a period calculated with no orders."""
+        row = self.add_sku(sku)
+        col = self.period_index.get(period_key)
+        if col is None:
+            return  # Not a period the listing phase asks for
+        
+        if metrics is None:
+            self.state[row, col] = self.NO_ORDERS
+            self.extras.pop((row, col), None)
+            self.customer_orders.pop((row, col), None)
+            self.order_time_counts.pop((row, col), None)
+            return
+        
+        try:
+            self.sums[row, col] = _get_additive_fields(metrics)
+        except KeyError:
+            self.sums[row, col] = [metrics.get(name, 0) for name in _ADDITIVE_FIELDS]
+        self.state[row, col] = self.PRESENT
+        self.has_sources[row, col] = 'cost_data_sources' in metrics
+        if self.has_sources[row, col]:
+            sources = metrics['cost_data_sources'] or {}
+            self.sources[row, col] = [sources.get(key, 0) for key in self.SOURCE_KEYS]
+        customer_orders = metrics.get('customer_orders')
+        if customer_orders is not None:
+            self.customer_orders[(row, col)] = customer_orders
+        else:
+            self.customer_orders.pop((row, col), None)  # e.g. loaded from the database
+        time_counts = metrics.get('order_time_counts')
+        if time_counts is not None:
+            self.order_time_counts[(row, col)] = time_counts
+        else:
+            self.order_time_counts.pop((row, col), None)
+        keys = tuple(k for k in metrics if k not in _ADDITIVE_FIELD_SET and k not in _IN_MEMORY_ARRAY_KEYS)
+        keys = self._extra_keys.setdefault(keys, keys)
+        self.extras[(row, col)] = (keys, tuple(map(metrics.__getitem__, keys)))
+
+    def extra(self, row: int, col: int) -> Dict:
+        """Non-additive fields of one stored report, as a fresh dict."""
+        keys, values = self.extras[(row, col)]
+        return dict(zip(keys, values))
+
+    def resolve(self, sku_pairs: List[Tuple[str, str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Map (sku, normalized_sku) pairs to store rows once per listing.
+        
+        A SKU's own row is used where it has a report for a period, else its
+        normalized-index match. Returns (chosen, no_orders) for every period
+        at once: chosen is an (n_skus, n_periods) matrix of report rows (-1 =
+        no report, so zero-order and missing SKUs never reach the aggregator)
+        and no_orders flags periods where every SKU was calculated without orders.
+        """
+        rows_get = self.sku_index.get
+        nidx_get = self.normalized_index.get
+        rows = np.full(len(sku_pairs), -1, dtype=np.int64)
+        fallback = np.full(len(sku_pairs), -1, dtype=np.int64)
+        for i, (sku, normalized_sku) in enumerate(sku_pairs):
+            row = rows_get(sku)
+            if row is not None:
+                rows[i] = row
+            store_sku = nidx_get(normalized_sku)
+            if store_sku is not None:
+                row = rows_get(store_sku)
+                if row is not None:
+                    fallback[i] = row
+        
+        states = self._states(rows)
+        chosen = np.where(
+            states == self.PRESENT, rows[:, None],
+            np.where(self._states(fallback) == self.PRESENT, fallback[:, None], -1)
+        )
+        if len(rows):
+            entry_rows = np.where(rows >= 0, rows, fallback)
+            no_orders = (self._states(entry_rows) == self.NO_ORDERS).all(axis=0)
+        else:
+            no_orders = np.zeros(len(self.period_index), dtype=bool)
+        return chosen, no_orders
+
+    def _states(self, rows: np.ndarray) -> np.ndarray:
+        """(len(rows), n_periods) states of the given rows (MISSING for -1 rows)."""
+        return np.where((rows >= 0)[:, None], self.state[rows], self.MISSING)
+
+    def matched_rows(self, sku_rows: Tuple[np.ndarray, np.ndarray],
+                     period_key: Tuple[str, date, date]) -> Tuple[Optional[int], np.ndarray]:
+        """Return (period column, rows with a report for it), in child SKU order."""
+        col = self.period_index.get(period_key)
+        if col is None:
+            return col, np.empty(0, dtype=np.int64)
+        
+        chosen = sku_rows[0][:, col]
+        return col, chosen[chosen >= 0]
 
+    def all_no_orders(self, sku_rows: Tuple[np.ndarray, np.ndarray],
+                      period_key: Tuple[str, date, date]) -> bool:
+        """True if every SKU was calculated for the period and had zero orders."""
+        col = self.period_index.get(period_key)
+        return col is not None and bool(sku_rows[1][col])
+
+    def summed_sources(self, rows: np.ndarray, col: int) -> Optional[Dict]:
+        """Summed cost_data_sources of the given reports (None unless every one has them)."""
+        if not self.has_sources[rows, col].all():
+            return None
+        return dict(zip(self.SOURCE_KEYS, self.sources[rows, col].sum(axis=0).tolist()))
+
+    def merged_customers(self, rows: np.ndarray, col: int) -> Optional[Tuple[np.ndarray, int, int]]:
+        """Distinct customers over the given reports (None unless every one has its pairs)."""
+        customer_orders = self.customer_orders
+        parts = [customer_orders.get((row, col)) for row in rows.tolist()]
+        if any(part is None for part in parts):
+            return None
+        return _merge_customer_orders(parts)
+
+    def summed_time_counts(self, rows: np.ndarray, col: int) -> Optional[np.ndarray]:
+        """Summed order-time histograms of the given reports (None unless every one has its histogram)."""
+        order_time_counts = self.order_time_counts
+        parts = [order_time_counts.get((row, col)) for row in rows.tolist()]
+        if any(part is None for part in parts):
+            return None
+        return np.sum(parts, axis=0)
+
+    def report(self, row: int, col: int) -> Dict:
+        """Rebuild the full metrics dict of one stored report."""
+        metrics = self.extra(row, col)
+        metrics.update(PeriodMetrics.dict_from_array(self.sums[row, col]))
+        if (row, col) in self.customer_orders:
+            metrics['customer_orders'] = self.customer_orders[(row, col)]
+        if (row, col) in self.order_time_counts:
+            metrics['order_time_counts'] = self.order_time_counts[(row, col)]
+        return metrics
+
+    def periods_of(self, sku: str) -> List[Tuple[str, date, date]]:
+        """Period keys stored (with or without orders) for a SKU."""
+        row = self.sku_index.get(sku)
+        if row is None:
+            return []
+        return [key for key, col in self.period_index.items() if self.state[row, col] != self.MISSING]
+
+
+# --- Aggregation Constants ---
+# Fields summed when rolling SKU/listing metrics up, in PeriodMetrics order
+_ADDITIVE_FIELDS = PeriodMetrics.__slots__
+_get_additive_fields = itemgetter(*_ADDITIVE_FIELDS)
+_ADDITIVE_FIELD_SET = frozenset(_ADDITIVE_FIELDS)
+# int4send() layout for report fingerprints (4 big-endian bytes)
+_PACK_INT4 = struct.Struct('>i').pack
+# Per-report arrays kept in memory for roll-ups (never report columns)
+_IN_MEMORY_ARRAY_KEYS = frozenset(('customer_orders', 'order_time_counts'))
+
+
+
+def _merge_customer_orders(parts: List[np.ndarray]) -> Tuple[np.ndarray, int, int]:
+    """
+    Union the (buyer_id, order_id) pairs of several reports.
+    
+    A customer who bought several SKUs/listings is counted once, and an order
+    shared by two SKUs once. Returns (pairs, unique_customers, repeat_customers)
+    with the same definitions as the per-period metrics.
+    """
+    pairs = np.concatenate(parts)
+    _, first = np.unique(pairs[:, 1], return_index=True)
+    pairs = pairs[first]
+    unique_customers = int(np.unique(pairs[:, 0]).size)
+    return pairs, unique_customers, len(pairs) - unique_customers
+
+
+# {UTC quarter hour: local UTC offset in seconds}. Zone offsets and DST switches
+# fall on quarter hours, so one localtime() per quarter covers every second in it
+_LOCAL_UTC_OFFSETS: Dict[int, int] = {}
+# Bucket ranges of an order-time histogram: months [0, 12), weekdays [12, 19), hours [19, 43)
+_ORDER_TIME_SPLITS = (12, 19)
+
+
+def _local_epoch_seconds(timestamps: np.ndarray) -> np.ndarray:
+    """Shift epoch seconds by the local UTC offset, so calendar fields read as datetime.fromtimestamp's."""
+    quarters, inverse = np.unique(timestamps // 900, return_inverse=True)
+    offsets = []
+    for quarter in quarters.tolist():
+        offset = _LOCAL_UTC_OFFSETS.get(quarter)
+        if offset is None:
+            offset = _LOCAL_UTC_OFFSETS[quarter] = time.localtime(quarter * 900).tm_gmtoff
+        offsets.append(offset)
+    return timestamps + np.array(offsets, dtype=np.int64)[inverse]
+
+
+def _order_time_counts(timestamps: np.ndarray) -> np.ndarray:
+    """Orders per local month, weekday and hour, as one 43-bucket bincount histogram."""
+    local = _local_epoch_seconds(timestamps)
+    months = local.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64) % 12
+    # 1970-01-01 was a Thursday; Monday = 0 like datetime.weekday()
+    weekdays = (local // 86400 + 3) % 7
+    hours = local % 86400 // 3600
+    return np.bincount(np.concatenate((months, weekdays + 12, hours + 19)), minlength=43)
+
+
+def _order_time_peaks(counts: Optional[np.ndarray]) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """(peak_month, peak_day_of_week, peak_hour) of an order-time histogram; argmax picks the busiest bucket."""
+    if counts is None or not counts.any():
+        return None, None, None
+    months, weekdays, hours = np.split(counts, _ORDER_TIME_SPLITS)
+    return int(months.argmax()) + 1, int(weekdays.argmax()), int(hours.argmax())
+
+
+# Count fields of PeriodMetrics that must stay integers after vectorized summing
+_PERIOD_METRICS_INT_FIELDS = frozenset(f.name for f in fields(PeriodMetrics) if f.type is int)
+# ... and their positions in an additive-sums vector
+_PERIOD_METRICS_INT_INDEX = tuple(
+    i for i, name in enumerate(_ADDITIVE_FIELDS) if name in _PERIOD_METRICS_INT_FIELDS
+)
+
+# Derived rates recomputed after summing metrics, in the same order as the
+# numerator/denominator arrays built in _finalize_metrics
+_DERIVED_RATE_KEYS = (
+    # Revenue-based rates
+    'discount_rate', 'gross_margin', 'net_margin', 'return_on_revenue',
+    'etsy_fee_rate', 'take_home_rate', 'refund_rate_by_value',
+    # Cost-based ratios
+    'markup_ratio',
+    # Order-based averages
+    'average_order_value', 'items_per_order', 'cost_per_order',
+    'refund_rate_by_order', 'order_refund_rate',
+    # Item-based averages
+    'revenue_per_item', 'profit_per_item', 'avg_cost_per_item',
+    # Customer-based metrics
+    'revenue_per_customer', 'orders_per_customer', 'profit_per_customer',
+)
+
+
+def _camel_case(snake_str: str) -> str:
+    """Convert snake_case to camelCase."""
+    components = snake_str.split('_')
+    return components[0] + ''.join(x.title() for x in components[1:])
+
+
+# ShopReport columns written by save_shop_report, as metric keys. Numeric fields
+# are sanitized (None/NaN/Infinity -> 0); raw fields are saved as-is.
+_SHOP_REPORT_NUMERIC_KEYS = (
+    'period_days', 'gross_revenue', 'total_revenue', 'product_revenue',
+    'total_shipping_revenue', 'total_shipping_charged', 'actual_shipping_cost',
+    'shipping_profit', 'duty_amount', 'tax_amount', 'fedex_processing_fee',
+    'total_tax_collected', 'total_vat_collected', 'total_gift_wrap_revenue',
+    'total_discounts_given', 'etsy_transaction_fees', 'etsy_processing_fees',
+    'total_etsy_fees', 'etsy_fee_rate', 'net_revenue',
+    'net_revenue_after_refunds', 'take_home_rate', 'discount_rate',
+    'contribution_margin', 'total_cost', 'total_cost_with_shipping',
+    'avg_cost_per_item', 'cost_per_order', 'gross_profit', 'gross_margin',
+    'net_profit', 'net_margin', 'return_on_revenue', 'markup_ratio',
+    'total_orders', 'total_items', 'total_quantity_sold', 'unique_skus',
+    'average_order_value', 'median_order_value', 'percentile_75_order_value',
+    'percentile_25_order_value', 'order_value_std', 'items_per_order',
+    'revenue_per_item', 'profit_per_item', 'unique_customers',
+    'repeat_customers', 'customer_retention_rate', 'revenue_per_customer',
+    'orders_per_customer', 'profit_per_customer', 'shipped_orders',
+    'shipping_rate', 'gift_orders', 'gift_rate',
+    'avg_time_between_orders_hours', 'orders_per_day', 'revenue_per_day',
+    'total_refund_amount', 'total_refund_count', 'orders_with_refunds',
+    'etsy_fees_retained_on_refunds', 'refund_rate_by_order',
+    'refund_rate_by_value', 'order_refund_rate', 'cancelled_orders',
+    'cancellation_rate', 'completion_rate', 'payment_method_diversity',
+    'customer_lifetime_value', 'payback_period_days',
+    'customer_acquisition_cost', 'price_elasticity', 'seasonality_index',
+    'total_inventory', 'avg_price', 'price_range', 'active_variants',
+    'inventory_turnover', 'stockout_risk',
+)
+_SHOP_REPORT_RAW_KEYS = (
+    'primary_payment_method', 'peak_month', 'peak_day_of_week', 'peak_hour',
+)
+
+# ListingReport / ProductReport numeric columns: the shop ones plus their own.
+# Both reuse the shop report's raw (passthrough) fields.
+_LISTING_REPORT_NUMERIC_KEYS = (
+    *_SHOP_REPORT_NUMERIC_KEYS,
+    'listing_views', 'listing_favorites', 'conversion_rate',
+    'favorite_to_order_rate', 'view_to_favorite_rate', 'revenue_per_view',
+    'profit_per_view', 'cost_per_acquisition', 'shop_avg_views',
+    'shop_avg_favorites', 'views_vs_shop_avg', 'favorites_vs_shop_avg',
+    'total_ad_spend', 'ad_spend_rate', 'roas',
+)
+_PRODUCT_REPORT_NUMERIC_KEYS = (
+    *_SHOP_REPORT_NUMERIC_KEYS,
+    'total_ad_spend', 'ad_spend_rate', 'roas',
+)
+
+# Decimal places metrics are stored with. Metrics dicts keep full-precision
+# floats (so rollups sum unrounded values); _round_metrics applies these once
+# when a report is saved.
+_METRIC_DECIMALS = {
+    **dict.fromkeys((
+        'gross_revenue', 'total_revenue', 'product_revenue', 'total_shipping_charged',
+        'total_tax_collected', 'total_vat_collected', 'total_gift_wrap_revenue',
+        'total_discounts_given', 'etsy_transaction_fees', 'etsy_processing_fees',
+        'total_etsy_fees', 'net_revenue', 'net_revenue_after_refunds',
+        'actual_shipping_cost', 'shipping_profit', 'duty_amount', 'tax_amount',
+        'fedex_processing_fee', 'total_cost', 'total_cost_with_shipping',
+        'avg_cost_per_item', 'cost_per_order', 'contribution_margin', 'gross_profit',
+        'net_profit', 'total_ad_spend', 'roas', 'average_order_value',
+        'median_order_value', 'percentile_75_order_value', 'percentile_25_order_value',
+        'order_value_std', 'items_per_order', 'revenue_per_item', 'profit_per_item',
+        'revenue_per_customer', 'orders_per_customer', 'profit_per_customer',
+        'avg_time_between_orders_hours', 'orders_per_day', 'revenue_per_day',
+        'total_refund_amount', 'etsy_fees_retained_on_refunds',
+        'customer_lifetime_value', 'customer_acquisition_cost', 'cost_coverage_percent',
+    ), 2),
+    **dict.fromkeys((
+        'etsy_fee_rate', 'take_home_rate', 'discount_rate', 'gross_margin',
+        'net_margin', 'return_on_revenue', 'markup_ratio', 'ad_spend_rate',
+        'customer_retention_rate', 'shipping_rate', 'gift_rate',
+        'refund_rate_by_order', 'refund_rate_by_value', 'order_refund_rate',
+        'cancellation_rate', 'completion_rate', 'price_elasticity',
+        'inventory_turnover', 'stockout_risk',
+    ), 4),
+    'payback_period_days': 1,
+}
+_METRIC_DECIMAL_KEYS = tuple(_METRIC_DECIMALS)
+_METRIC_DECIMAL_NDIGITS = tuple(_METRIC_DECIMALS.values())
+
+# snake_case -> camelCase translation for every known metric key, built once at
+# import; _snake_to_camel adds any other key the first time it is seen
+_SNAKE_TO_CAMEL = {
+    key: _camel_case(key)
+    for key in (*_ADDITIVE_FIELDS, *_DERIVED_RATE_KEYS, *_LISTING_REPORT_NUMERIC_KEYS,
+                *_PRODUCT_REPORT_NUMERIC_KEYS, *_SHOP_REPORT_RAW_KEYS)
+}
+# camelCase column names, in the same order as the keys above
+_SHOP_REPORT_NUMERIC_COLUMNS = tuple(_SNAKE_TO_CAMEL[key] for key in _SHOP_REPORT_NUMERIC_KEYS)
+_SHOP_REPORT_RAW_COLUMNS = tuple(_SNAKE_TO_CAMEL[key] for key in _SHOP_REPORT_RAW_KEYS)
+_LISTING_REPORT_NUMERIC_COLUMNS = tuple(_SNAKE_TO_CAMEL[key] for key in _LISTING_REPORT_NUMERIC_KEYS)
+_PRODUCT_REPORT_NUMERIC_COLUMNS = tuple(_SNAKE_TO_CAMEL[key] for key in _PRODUCT_REPORT_NUMERIC_KEYS)
+# Prisma compound-unique names used as the upsert `where` key of each report table
+_SHOP_WHERE_KEY = "periodType_periodStart_periodEnd"
+_LISTING_WHERE_KEY = "listingId_periodType_periodStart_periodEnd"
+_PRODUCT_WHERE_KEY = "sku_periodType_periodStart_periodEnd"
 
 # --- Main Analytics Class (ULTRA OPTIMIZED) ---
 class EcommerceAnalyticsOptimized:
@@ -67,6 +639,147 @@ class EcommerceAnalyticsOptimized:
     - Vectorized calculations with NumPy
     """
 
+    # Turkish month names used in cost.csv column headers
+    _COST_MONTH_NAMES = {
+        1: "OCAK", 2: "SUBAT", 3: "MART", 4: "NISAN", 5: "MAYIS", 6: "HAZIRAN",
+        7: "TEMMUZ", 8: "AGUSTOS", 9: "EYLUL", 10: "EKIM", 11: "KASIM", 12: "ARALIK",
+    }
+    _COST_PREFIXES = ("US", "EU", "AU")
+    # Dated cost column header: a market prefix followed (anywhere later) by a month name
+    _COST_COL_RE = re.compile(
+        rf"^({'|'.join(_COST_PREFIXES)}).*?({'|'.join(_COST_MONTH_NAMES.values())})"
+    )
+    # Year in a cost column header: "US MAYIS 2025", "US MART 25", "US 2024 NISAN"
+    _COST_COLUMN_YEAR_RE = re.compile(r'\b(20\d{2}|2\d)\b')
+    # Parquet cache key: bump the schema version when a loader changes the frames it caches;
+    # the prefix hash rebuilds _normalized_sku whenever sku_normalize.SKU_PREFIXES changes
+    _FRAME_CACHE_SCHEMA_VERSION = 1
+    _FRAME_CACHE_KEY_FIELD = b'frame_cache_key'
+    _FRAME_CACHE_KEY = (
+        f"v{_FRAME_CACHE_SCHEMA_VERSION}-"
+        f"{hashlib.sha1('|'.join(SKU_PREFIXES).encode()).hexdigest()[:12]}"
+    ).encode()
+    # Orders per page of the metrics fetch (keyset-paginated on created_timestamp, order_id)
+    _METRIC_PAGE_SIZE = 5000
+    # Report type -> Prisma model used by save_reports_bulk
+    _REPORT_MODELS = {"shop": "shopreport", "listing": "listingreport", "product": "productreport"}
+    # Report type -> (table, key columns, value columns written by the payload builders)
+    _REPORT_TABLES = {
+        "shop": ("shop_reports", ("periodType", "periodStart", "periodEnd"),
+                 (*_SHOP_REPORT_NUMERIC_COLUMNS, *_SHOP_REPORT_RAW_COLUMNS)),
+        "listing": ("listing_reports", ("listingId", "periodType", "periodStart", "periodEnd"),
+                    (*_LISTING_REPORT_NUMERIC_COLUMNS, *_SHOP_REPORT_RAW_COLUMNS)),
+        "product": ("product_reports", ("sku", "periodType", "periodStart", "periodEnd"),
+                    (*_PRODUCT_REPORT_NUMERIC_COLUMNS, *_SHOP_REPORT_RAW_COLUMNS)),
+    }
+    # Report type -> numeric payload columns (cleaned of None/NaN/Infinity before saving)
+    _REPORT_NUMERIC_COLUMNS = {
+        "shop": _SHOP_REPORT_NUMERIC_COLUMNS,
+        "listing": _LISTING_REPORT_NUMERIC_COLUMNS,
+        "product": _PRODUCT_REPORT_NUMERIC_COLUMNS,
+    }
+    # Report fields whose database column is @map-ped to snake_case
+    _REPORT_MAPPED_COLUMNS = {
+        "percentile75OrderValue": "percentile_75_order_value",
+        "percentile25OrderValue": "percentile_25_order_value",
+        "adSpendRate": "ad_spend_rate",
+        "totalAdSpend": "total_ad_spend",
+    }
+    # SQL array type of each report column in the unnest() bulk upsert (float8[] otherwise)
+    _REPORT_COLUMN_TYPES = {
+        "periodType": 'text[]::"PeriodType"[]',
+        "periodStart": "timestamp[]",
+        "periodEnd": "timestamp[]",
+        "listingId": "bigint[]",
+        "sku": "text[]",
+        "primaryPaymentMethod": "text[]",
+        **dict.fromkeys((
+            "periodDays", "totalOrders", "totalItems", "totalQuantitySold", "uniqueSkus",
+            "uniqueCustomers", "repeatCustomers", "shippedOrders", "giftOrders",
+            "totalRefundCount", "ordersWithRefunds", "cancelledOrders", "paymentMethodDiversity",
+            "peakMonth", "peakDayOfWeek", "peakHour", "totalInventory", "activeVariants",
+            "listingViews", "listingFavorites",
+        ), "int[]"),
+    }
+    # Built once per report type by _bulk_report_upsert_query
+    _BULK_REPORT_QUERIES = {}
+    # Built once per report type by _report_fingerprint_layout
+    _REPORT_FINGERPRINT_LAYOUTS = {}
+    # Upserts sent per statement (one round trip) by save_reports_bulk
+    _REPORT_FLUSH_SIZE = 1000
+    # Report batches waiting for the background writers before producers block
+    _REPORT_QUEUE_SIZE = 16
+    # Errors of one exception type logged with a full traceback before _log_error drops it
+    _ERROR_TRACEBACKS_PER_TYPE = 3
+    # Report period type names -> Prisma enum (shared by every save path)
+    _PERIOD_TYPE_MAP = {
+        "yearly": PeriodType.YEARLY,
+        "monthly": PeriodType.MONTHLY,
+        "weekly": PeriodType.WEEKLY,
+    }
+    # PeriodType member -> the enum label Postgres expects, resolved once instead of per row
+    _PERIOD_TYPE_LABELS = {enum: getattr(enum, 'value', str(enum)) for enum in _PERIOD_TYPE_MAP.values()}
+    # Zero-valued metrics for periods without orders; _empty_metrics copies this
+    # (a C-level dict copy) instead of rebuilding the literal on every call
+    _EMPTY_METRICS_TEMPLATE = MappingProxyType({
+        "period_start": None,
+        "period_end": None,
+        "period_days": 0,
+        # Revenue
+        "gross_revenue": 0, "total_revenue": 0, "product_revenue": 0, 
+        "total_shipping_charged": 0, "total_tax_collected": 0, "total_vat_collected": 0, 
+        "total_gift_wrap_revenue": 0, "total_discounts_given": 0,
+        # Etsy fees
+        "etsy_transaction_fees": 0, "etsy_processing_fees": 0, "total_etsy_fees": 0, "etsy_fee_rate": 0,
+        # Net revenue
+        "net_revenue": 0, "net_revenue_after_refunds": 0, "take_home_rate": 0, "discount_rate": 0,
+        # Shipping costs
+        "actual_shipping_cost": 0, "shipping_profit": 0, "duty_amount": 0, "tax_amount": 0, "fedex_processing_fee": 0,
+        # Costs & Profit
+        "total_cost": 0, "total_cost_with_shipping": 0, "avg_cost_per_item": 0, "cost_per_order": 0, 
+        "contribution_margin": 0, "gross_profit": 0, "gross_margin": 0, 
+        "net_profit": 0, "net_margin": 0, "return_on_revenue": 0, "markup_ratio": 0,
+        # Orders
+        "total_orders": 0, "total_items": 0, "total_quantity_sold": 0, "unique_skus": 0,
+        "average_order_value": 0, "median_order_value": 0, "percentile_75_order_value": 0,
+        "percentile_25_order_value": 0, "order_value_std": 0, "items_per_order": 0,
+        "revenue_per_item": 0, "profit_per_item": 0,
+        # Customers
+        "unique_customers": 0, "repeat_customers": 0, "customer_retention_rate": 0,
+        "revenue_per_customer": 0, "orders_per_customer": 0, "profit_per_customer": 0,
+        # Operations
+        "shipped_orders": 0, "shipping_rate": 0, "gift_orders": 0, "gift_rate": 0,
+        "avg_time_between_orders_hours": 0, "orders_per_day": 0, "revenue_per_day": 0,
+        # Refunds
+        "total_refund_amount": 0, "total_refund_count": 0, "orders_with_refunds": 0,
+        "etsy_fees_retained_on_refunds": 0,
+        "refund_rate_by_order": 0, "refund_rate_by_value": 0, "order_refund_rate": 0,
+        # Cancellations
+        "cancelled_orders": 0, "cancellation_rate": 0, "completion_rate": 0,
+        # Payment
+        "primary_payment_method": None, "payment_method_diversity": 0,
+        # Temporal
+        "peak_month": None, "peak_day_of_week": None, "peak_hour": None, "seasonality_index": 0,
+        # Inventory
+        "total_inventory": 0, "avg_price": 0, "price_range": 0, "active_variants": 0,
+        "inventory_turnover": 0, "stockout_risk": 0,
+        # Business
+        "customer_lifetime_value": 0, "payback_period_days": 0, "customer_acquisition_cost": 0,
+        "price_elasticity": 0,
+        # Cost data quality
+        "has_complete_cost_data": False,
+        "cost_coverage_percent": 0,
+        "cost_data_sources": None,  # Fresh dict per report (mutable)
+        "items_with_direct_cost": 0,
+        "items_with_fallback_cost": 0,
+        "items_missing_cost": 0,
+    })
+    # Inventory fields for SKUs/listings missing from _inventory_cache (read-only,
+    # so lookups can return it without allocating a default dict per miss)
+    _INVENTORY_DEFAULT = MappingProxyType({
+        "total_inventory": 0, "avg_price": 0, "price_range": 0, "active_variants": 0
+    })
+
     def __init__(self, cost_csv_path: str, max_concurrent: int = 10, batch_size: int = 100,
                  etsy_transaction_fee_rate: float = 0.065,  # 6.5% Etsy transaction fee
                  etsy_processing_fee_rate: float = 0.03,     # 3% + $0.25 payment processing
@@ -77,41 +790,63 @@ class EcommerceAnalyticsOptimized:
                  us_fedex_csv_path: str = "us_fedex_desi_and_price.csv"):
         # Initialize Prisma with optimized connection settings
         self.prisma = Prisma(http={'timeout': 1000.0})  # Will use DATABASE_URL from environment
-        self.cost_data = self._load_cost_data(cost_csv_path)
         self.max_concurrent = max_concurrent  # Parallel operations limit (safe for file descriptors)
+        # Separate lane for report writes (~1/3 of the slots) so bulk saves neither
+        # queue behind metric reads nor pile up unbounded; reads get the rest
+        self._db_write_slots = max(1, max_concurrent // 3)
+        self._write_semaphore = asyncio.Semaphore(self._db_write_slots)
+        self._report_queue: Optional[asyncio.Queue] = None  # Set while report writers run
+        self._report_writers: List[asyncio.Task] = []
         self.batch_size = batch_size  # Bulk insert batch size (increased from 50)
         
         # Connection health tracking
         self._last_connection_check = 0  # Timestamp of last connection health check
         self._connection_check_interval = 30  # Check connection every 30 seconds max
         
-        # Load shipping-related CSVs
-        self.desi_data = self._load_desi_data(desi_csv_path)
-        self.fedex_zones_data = self._load_fedex_zones(fedex_zones_csv_path)
-        self.fedex_pricing_data = self._load_fedex_pricing(fedex_pricing_csv_path)
-        self.us_fedex_data = self._load_us_fedex_data(us_fedex_csv_path)
+        # Load cost and shipping-related CSVs in parallel (read_csv releases the GIL while parsing;
+        # each loader only touches its own frame and index attributes)
+        loaders = [
+            (self._load_cost_data, cost_csv_path),
+            (self._load_desi_data, desi_csv_path),
+            (self._load_fedex_zones, fedex_zones_csv_path),
+            (self._load_fedex_pricing, fedex_pricing_csv_path),
+            (self._load_us_fedex_data, us_fedex_csv_path),
+        ]
+        with ThreadPoolExecutor(max_workers=len(loaders)) as executor:
+            futures = [executor.submit(loader, path) for loader, path in loaders]
+        results = [future.result() for future in futures]
+        # Each loader returns (frame, status line or None); the status lines are printed
+        # here, in loader order, so worker threads never interleave output
+        for _, status in results:
+            if status:
+                print(status)
+        (self.cost_data, self.desi_data, self.fedex_zones_data,
+         self.fedex_pricing_data, self.us_fedex_data) = [df for df, _ in results]
         
         # Create OTTOKOD to SKU mapping from cost.csv for lookups
         # Build BOTH raw and normalized mappings to handle prefix mismatches
         self.ottokod_to_sku = {}
         self.sku_to_ottokod = {}  # Raw SKU -> OTTOKOD
         self.sku_to_ottokod_normalized = {}  # Normalized SKU -> OTTOKOD for fallback
+        self._ottokods_by_normalized_sku = defaultdict(list)  # Normalized SKU -> every OTTOKOD in row order
         if not self.cost_data.empty and 'OTTOKOD' in self.cost_data.columns and 'SKU' in self.cost_data.columns:
-            for _, row in self.cost_data.iterrows():
-                ottokod = row.get('OTTOKOD')
-                sku = row.get('SKU')
-                if pd.notna(ottokod) and pd.notna(sku):
-                    sku_clean = str(sku).strip()
-                    ottokod_clean = str(ottokod).strip()
-                    
-                    # Store raw mapping
-                    self.ottokod_to_sku[ottokod_clean] = sku_clean
-                    self.sku_to_ottokod[sku_clean] = ottokod_clean
-                    
-                    # Store normalized mapping for fallback lookups
-                    normalized_sku = self._normalize_sku_for_comparison(sku_clean)
-                    if normalized_sku:
-                        self.sku_to_ottokod_normalized[normalized_sku] = ottokod_clean
+            # Build the mappings column-wise instead of iterating rows
+            mapped = self.cost_data[['OTTOKOD', 'SKU', '_normalized_sku']].dropna(subset=['OTTOKOD', 'SKU'])
+            ottokods = mapped['OTTOKOD'].astype(str).str.strip().tolist()
+            skus = mapped['SKU'].astype(str).str.strip().tolist()
+            
+            # Store raw mappings
+            self.ottokod_to_sku = dict(zip(ottokods, skus))
+            self.sku_to_ottokod = dict(zip(skus, ottokods))
+            
+            # Store normalized mapping for fallback lookups (already computed on load)
+            self.sku_to_ottokod_normalized = {
+                normalized_sku: ottokod
+                for normalized_sku, ottokod in zip(mapped['_normalized_sku'].tolist(), ottokods)
+                if normalized_sku
+            }
+            for normalized_sku, ottokod in zip(mapped['_normalized_sku'].tolist(), ottokods):
+                self._ottokods_by_normalized_sku[normalized_sku].append(ottokod)
         
         # Etsy fee structure (configurable)
         self.etsy_transaction_fee_rate = etsy_transaction_fee_rate
@@ -125,6 +860,7 @@ class EcommerceAnalyticsOptimized:
         self._cost_fallback_warnings_shown = set()  # Track when using fallback costs
         self._skipped_products_no_cost = set()  # Track SKUs skipped due to missing cost data
         self._skipped_count = 0  # Count of reports skipped due to missing costs
+        self._error_counts = Counter()  # Per-SKU/listing/report errors by exception type
         
         # NEW: Track listing processing statistics
         self._listings_skipped_no_cost = set()  # Listings skipped due to missing cost data
@@ -139,9 +875,15 @@ class EcommerceAnalyticsOptimized:
         
         # Cache for frequently accessed data
         self._cost_cache = {}
-        self._sku_to_products = {}  # SKU -> list of product_ids
-        self._listing_to_products = {}  # listing_id -> list of product_ids (for aggregating child products)
+        self._sku_date_cost_cache = {}  # {(sku, year, month): cost}
+        self._desi_cache = {}  # {sku: desi}
+        self._us_shipping_cache = {}  # {sku: shipping_costs_dict}
+        self._sku_to_products = {}  # SKU -> set of product_ids
+        self._listing_to_products = {}  # listing_id -> set of product_ids (for aggregating child products)
+        self._sku_names = ()  # SKUs of _sku_to_products in mapping order, frozen after preload
+        self._product_to_sku_indices = {}  # product_id -> ascending positions in _sku_names
         self._listing_cache = {}  # listing_id -> listing data
+        self._metrics_inflight = {}  # (ranges, period_type, listing_id, sku) -> running metrics task
         
         # NEW: Bulk cost cache for batch processing (speeds up cost lookups by 10x)
         self._bulk_cost_cache = {}  # {(sku, year, month): cost}
@@ -151,169 +893,318 @@ class EcommerceAnalyticsOptimized:
         # Pre-computed data store
         self._aggregated_orders = None  # Will hold pre-aggregated order data
         self._inventory_cache = {}  # Inventory data cache
+        
+        # Listings folded into shop rollups (for the listings_included count)
+        self._rolled_up_listing_ids = set()
+        
+        # Fingerprints of report rows already stored: {report_type: {row key: hash}}
+        self._report_fingerprints = {}
+
+    def _read_frame_cache(self, csv_path: str) -> Optional[pd.DataFrame]:
+        """Return the normalized frame cached next to a CSV, if it is newer than the CSV and was built by this code."""
+        if not PARQUET_CACHE_AVAILABLE:
+            return None
+        cache_path = csv_path + '.parquet'
+        try:
+            if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(csv_path):
+                # Footer-only read: stale normalizer/schema -> rebuild from the CSV
+                metadata = pq.read_schema(cache_path).metadata or {}
+                if metadata.get(self._FRAME_CACHE_KEY_FIELD) == self._FRAME_CACHE_KEY:
+                    return pd.read_parquet(cache_path)
+                logger.info(f"🔄 Rebuilding Parquet cache {cache_path} (normalizer or schema changed)")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable Parquet cache {cache_path}: {e}")
+        return None
+
+    def _write_frame_cache(self, csv_path: str, df: pd.DataFrame):
+        """Cache a normalized CSV frame as Parquet so warm starts skip CSV parsing."""
+        if not PARQUET_CACHE_AVAILABLE:
+            return
+        try:
+            table = pyarrow.Table.from_pandas(df)
+            metadata = {**(table.schema.metadata or {}), self._FRAME_CACHE_KEY_FIELD: self._FRAME_CACHE_KEY}
+            pq.write_table(table.replace_schema_metadata(metadata), csv_path + '.parquet', compression='zstd')
+        except Exception as e:
+            logger.warning(f"Could not write Parquet cache for {csv_path}: {e}")
 
-    def _load_cost_data(self, csv_path: str) -> pd.DataFrame:
+    def _load_cost_data(self, csv_path: str) -> Tuple[pd.DataFrame, Optional[str]]:
         """Load and process cost data from the provided CSV file."""
+        self._cost_records = []  # cost.csv rows as plain dicts, in file order, for row scans
+        self._cost_by_sku = {}  # {normalized_sku: {column: value}} for O(1) row lookups
+        self._latest_cost_by_sku = {}  # {normalized_sku: (cost, column)} most recent dated cost
+        self._dated_cost_columns = []  # [(year, column)] most recent first, for the latest-cost fallback
+        self._cost_columns_set = frozenset()  # Column names present in cost.csv
+        self._candidate_columns_cache = {}  # {(year, month): existing cost columns in lookup order}
         try:
             if not os.path.exists(csv_path):
                 logger.warning(f"Cost CSV not found: {csv_path}")
-                return pd.DataFrame()
-            
-            df = pd.read_csv(csv_path, encoding='utf-8-sig')
-            df.columns = df.columns.str.strip()
+                return pd.DataFrame(), None
             
-            if 'SKU' not in df.columns:
-                logger.error(f"SKU column not found in {csv_path}")
-                return pd.DataFrame()
-            
-            df = df.dropna(subset=['SKU'])
-            
-            # Add normalized SKU column for fast bidirectional matching
-            df['_normalized_sku'] = df['SKU'].apply(lambda x: self._normalize_sku_for_comparison(str(x)) if pd.notna(x) else '')
+            df = self._read_frame_cache(csv_path)
+            if df is None:
+                df = pd.read_csv(csv_path, encoding='utf-8-sig')
+                df.columns = df.columns.str.strip()
+                
+                if 'SKU' not in df.columns:
+                    logger.error(f"SKU column not found in {csv_path}")
+                    return pd.DataFrame(), None
+                
+                df = df.dropna(subset=['SKU'])
+                
+                # Add normalized SKU column for fast bidirectional matching
+                df['_normalized_sku'] = normalize_sku_series(df['SKU'])
+                
+                # Identifier columns as category (cost columns stay float64 - float32 would round the costs)
+                for col in ('SKU', 'OTTOKOD'):
+                    if col in df.columns:
+                        df[col] = df[col].astype('category')
+                self._write_frame_cache(csv_path, df)
+            
+            self._cost_columns_set = frozenset(df.columns)
+            
+            # Resolve which column name formats exist for every plausible period up front,
+            # so the hot cost getters never build candidate strings
+            for year in range(2020, 2031):
+                for month in self._COST_MONTH_NAMES:
+                    self._candidate_columns(year, month)
+            
+            # Parse cost column headers once: (year, column) sorted most recent first
+            dated_columns = []
+            for col in df.columns:
+                if self._COST_COL_RE.match(col):
+                    year_match = self._COST_COLUMN_YEAR_RE.search(col)
+                    if year_match:
+                        col_year = int(year_match.group(1))
+                        if col_year < 100:  # 2-digit year
+                            col_year += 2000
+                        dated_columns.append((col_year, col))
+            self._dated_cost_columns = sorted(dated_columns, reverse=True)
+            
+            # Materialize rows as dicts once; scans iterate these instead of iterrows() Series
+            self._cost_records = df.to_dict('records')
+            
+            # Index rows by normalized SKU once (first row wins, same as the old boolean-mask lookup)
+            for row in self._cost_records:
+                self._cost_by_sku.setdefault(row['_normalized_sku'], row)
+            
+            # Resolve each indexed row's most recent cost once, so the date fallback is a dict read
+            self._latest_cost_by_sku = {
+                normalized_sku: self._most_recent_cost(row)
+                for normalized_sku, row in self._cost_by_sku.items()
+            }
             
-            print(f"✓ Loaded cost data: {len(df)} SKUs")
-            return df
+            return df, f"✓ Loaded cost data: {len(df)} SKUs"
         except Exception as e:
             logger.error(f"Error loading cost data: {e}")
-            return pd.DataFrame()
+            return pd.DataFrame(), None
 
-    def _load_desi_data(self, csv_path: str) -> pd.DataFrame:
+    def _load_desi_data(self, csv_path: str) -> Tuple[pd.DataFrame, Optional[str]]:
         """Load product weight (desi) data from CSV."""
+        self._desi_by_ottokod = {}  # {ottokod: desi} for O(1) weight lookups
         try:
             if not os.path.exists(csv_path):
                 logger.warning(f"Desi CSV not found: {csv_path}")
-                return pd.DataFrame()
+                return pd.DataFrame(), None
             
-            df = pd.read_csv(csv_path, sep=';', encoding='utf-8-sig')
-            df.columns = df.columns.str.strip()
-            
-            # Normalize decimal separator (Turkish uses comma)
-            if 'DESİ' in df.columns:
-                df['DESİ'] = df['DESİ'].astype(str).str.replace(',', '.').astype(float)
-            
-            print(f"✓ Loaded desi data: {len(df)} products")
-            return df
+            df = self._read_frame_cache(csv_path)
+            if df is None:
+                df = pd.read_csv(csv_path, sep=';', encoding='utf-8-sig')
+                df.columns = df.columns.str.strip()
+                
+                # Normalize decimal separator (Turkish uses comma)
+                if 'DESİ' in df.columns:
+                    df['DESİ'] = df['DESİ'].astype(str).str.replace(',', '.').astype(float)
+                self._write_frame_cache(csv_path, df)
+            
+            # Index weights by stripped OTTOKOD once (first row wins, same as the old boolean-mask lookup)
+            if 'OTTOKOD' in df.columns and 'DESİ' in df.columns:
+                indexed = df.dropna(subset=['OTTOKOD'])
+                for ottokod, desi in zip(indexed['OTTOKOD'].astype(str).str.strip(), indexed['DESİ']):
+                    self._desi_by_ottokod.setdefault(ottokod, desi)
+            
+            return df, f"✓ Loaded desi data: {len(df)} products"
         except Exception as e:
             logger.error(f"Error loading desi data: {e}")
-            return pd.DataFrame()
+            return pd.DataFrame(), None
 
-    def _load_fedex_zones(self, csv_path: str) -> pd.DataFrame:
+    def _load_fedex_zones(self, csv_path: str) -> Tuple[pd.DataFrame, Optional[str]]:
         """Load country to FedEx zone mapping."""
+        self._zone_by_country = {}  # {COUNTRY_CODE: zone} for O(1) zone lookups
         try:
             if not os.path.exists(csv_path):
                 logger.warning(f"FedEx zones CSV not found: {csv_path}")
-                return pd.DataFrame()
-            
-            df = pd.read_csv(csv_path, sep=';', encoding='utf-8-sig')
-            df.columns = df.columns.str.strip()
-            
-            # Skip header row if first column is "FEDEX"
-            if not df.empty and str(df.iloc[0, 0]).strip().upper() == 'FEDEX':
-                df = df.iloc[1:].reset_index(drop=True)
-            
-            # Check if dataframe is empty after skipping header
-            if df.empty:
-                logger.warning("FedEx zones CSV is empty after skipping header")
-                return pd.DataFrame()
-            
-            # Rename columns for easier access
-            if len(df.columns) >= 3:
-                df.columns = ['Country', 'Country_Code', 'Zone']
+                return pd.DataFrame(), None
+            
+            df = self._read_frame_cache(csv_path)
+            if df is None:
+                # Skip the "FEDEX" title row by sniffing the raw first line, so read_csv
+                # takes the real header directly (no row slice / reset_index copies)
+                with open(csv_path, 'rb') as f:
+                    first_line = f.readline().decode('utf-8-sig', errors='ignore')
+                skip_rows = 1 if first_line.split(';', 1)[0].strip().upper() == 'FEDEX' else 0
+                
+                df = pd.read_csv(csv_path, sep=';', encoding='utf-8-sig', skiprows=skip_rows)
+                df.columns = df.columns.str.strip()
+                
+                # Check if dataframe is empty after skipping header
+                if df.empty:
+                    logger.warning("FedEx zones CSV is empty after skipping header")
+                    return pd.DataFrame(), None
+                
+                # Rename columns for easier access
+                if len(df.columns) >= 3:
+                    df.columns = ['Country', 'Country_Code', 'Zone']
+                self._write_frame_cache(csv_path, df)
+            
+            # Index zones by upper-cased country code once (first row wins)
+            if 'Country_Code' in df.columns:
+                indexed = df.dropna(subset=['Country_Code'])
+                for code, zone in zip(indexed['Country_Code'].astype(str).str.upper(), indexed['Zone']):
+                    if code in self._zone_by_country:
+                        continue
+                    try:
+                        self._zone_by_country[code] = int(zone)
+                    except (ValueError, TypeError):
+                        self._zone_by_country[code] = 8  # Unparseable zone falls back to Zone 8
             
-            print(f"✓ Loaded FedEx zones: {len(df)} countries")
-            return df
+            return df, f"✓ Loaded FedEx zones: {len(df)} countries"
         except Exception as e:
             logger.error(f"Error loading FedEx zones: {e}", exc_info=True)
-            return pd.DataFrame()
+            return pd.DataFrame(), None
 
-    def _load_fedex_pricing(self, csv_path: str) -> pd.DataFrame:
+    def _load_fedex_pricing(self, csv_path: str) -> Tuple[pd.DataFrame, Optional[str]]:
         """Load FedEx pricing matrix (weight x zone)."""
+        self._fedex_tiers = np.empty(0)  # Sorted weight tiers for np.searchsorted
+        self._fedex_prices = np.empty((0, 0))  # [tier_idx, zone_idx] price matrix
+        self._fedex_zone_index = {}  # {"<zone>.Bölge": zone_idx}
         try:
             if not os.path.exists(csv_path):
                 logger.warning(f"FedEx pricing CSV not found: {csv_path}")
-                return pd.DataFrame()
-            
-            # Read CSV and check if first row is a title row (contains "FEDEX" in first column)
-            df_check = pd.read_csv(csv_path, sep=';', encoding='utf-8-sig', nrows=1)
-            skip_rows = 1 if 'FEDEX' in str(df_check.columns[0]).upper() else 0
-            
-            # Read the actual data with proper header
-            df = pd.read_csv(csv_path, sep=';', encoding='utf-8-sig', skiprows=skip_rows)
-            df.columns = df.columns.str.strip()
-            
-            # Check if dataframe is empty
-            if df.empty:
-                logger.warning("FedEx pricing CSV is empty")
-                return pd.DataFrame()
-            
-            # Rename first column to English - check for various possible column names
-            first_col = df.columns[0]
-            if 'Ağırlık' in df.columns or 'ağırlık' in first_col.lower() or 'agirlik' in first_col.lower():
-                df.rename(columns={first_col: 'Weight'}, inplace=True)
-            elif first_col not in ['Weight', 'weight']:
-                # If first column is not already named Weight, assume it's the weight column
-                logger.warning(f"First column '{first_col}' doesn't match expected names, renaming to 'Weight'")
-                df.rename(columns={first_col: 'Weight'}, inplace=True)
-            
-            # Normalize decimal separator and weight column
-            if 'Weight' in df.columns:
-                df['Weight'] = df['Weight'].astype(str).str.replace(',', '.').str.replace(' kg', '').str.strip().astype(float)
-            else:
-                logger.error("Weight column not found in FedEx pricing data after renaming")
-                return pd.DataFrame()
-            
-            # Normalize all zone columns (1.Bölge through 15.Bölge)
-            for col in df.columns:
-                if 'Bölge' in col or 'Bolge' in col or col != 'Weight':
-                    try:
-                        df[col] = df[col].astype(str).str.replace(',', '.').str.strip().astype(float)
-                    except:
-                        pass  # Skip non-numeric columns
-            
-            print(f"✓ Loaded FedEx pricing matrix: {len(df)} weight tiers")
-            return df
+                return pd.DataFrame(), None
+            
+            df = self._read_frame_cache(csv_path)
+            if df is None:
+                # Check if first row is a title row (contains "FEDEX" in first column)
+                # by sniffing the raw first line instead of parsing the CSV twice
+                with open(csv_path, 'rb') as f:
+                    first_line = f.readline().decode('utf-8-sig', errors='ignore')
+                skip_rows = 1 if 'FEDEX' in first_line.split(';', 1)[0].upper() else 0
+                
+                # Read the actual data with proper header
+                df = pd.read_csv(csv_path, sep=';', encoding='utf-8-sig', skiprows=skip_rows)
+                df.columns = df.columns.str.strip()
+                
+                # Check if dataframe is empty
+                if df.empty:
+                    logger.warning("FedEx pricing CSV is empty")
+                    return pd.DataFrame(), None
+                
+                # Rename first column to English - check for various possible column names
+                first_col = df.columns[0]
+                if 'Ağırlık' in df.columns or 'ağırlık' in first_col.lower() or 'agirlik' in first_col.lower():
+                    df.rename(columns={first_col: 'Weight'}, inplace=True)
+                elif first_col not in ['Weight', 'weight']:
+                    # If first column is not already named Weight, assume it's the weight column
+                    logger.warning(f"First column '{first_col}' doesn't match expected names, renaming to 'Weight'")
+                    df.rename(columns={first_col: 'Weight'}, inplace=True)
+                
+                # Normalize decimal separator and weight column
+                if 'Weight' in df.columns:
+                    df['Weight'] = df['Weight'].astype(str).str.replace(',', '.').str.replace(' kg', '').str.strip().astype(float)
+                else:
+                    logger.error("Weight column not found in FedEx pricing data after renaming")
+                    return pd.DataFrame(), None
+                
+                # Normalize all zone columns (1.Bölge through 15.Bölge)
+                for col in df.columns:
+                    if 'Bölge' in col or 'Bolge' in col or col != 'Weight':
+                        try:
+                            df[col] = df[col].astype(str).str.replace(',', '.').str.strip().astype(float)
+                        except:
+                            pass  # Skip non-numeric columns
+                self._write_frame_cache(csv_path, df)
+            
+            # Precompute the sorted tier array and price matrix once
+            # (stable sort keeps the first row for duplicate tiers, as the old mask lookup did)
+            ordered = df.sort_values('Weight', kind='stable')
+            zone_cols = [col for col in ordered.columns if col.endswith('.Bölge')]
+            self._fedex_tiers = ordered['Weight'].to_numpy(dtype=float)
+            if zone_cols:
+                prices = ordered[zone_cols].apply(pd.to_numeric, errors='coerce')
+                # Unparseable cells price at 0.0; genuinely empty cells stay NaN
+                prices = prices.mask(prices.isna() & ordered[zone_cols].notna(), 0.0)
+                self._fedex_prices = prices.to_numpy(dtype=float)
+                self._fedex_zone_index = {col: idx for idx, col in enumerate(zone_cols)}
+            
+            return df, f"✓ Loaded FedEx pricing matrix: {len(df)} weight tiers"
         except Exception as e:
             logger.error(f"Error loading FedEx pricing: {e}", exc_info=True)
-            return pd.DataFrame()
+            return pd.DataFrame(), None
 
-    def _load_us_fedex_data(self, csv_path: str) -> pd.DataFrame:
+    def _load_us_fedex_data(self, csv_path: str) -> Tuple[pd.DataFrame, Optional[str]]:
         """Load US-specific FedEx data with duties and taxes."""
+        self._us_by_sku = {}  # {sku: shipping_costs_dict}
+        self._us_by_normalized_sku = {}  # {normalized_sku: shipping_costs_dict}
+        self._us_by_ottokod = {}  # {ottokod: shipping_costs_dict} for OTTOKOD-only CSVs
         try:
             if not os.path.exists(csv_path):
                 logger.warning(f"US FedEx CSV not found: {csv_path}")
-                return pd.DataFrame()
-            
-            df = pd.read_csv(csv_path, sep=';', encoding='utf-8-sig')
-            df.columns = df.columns.str.strip()
-            
-            # Normalize numeric columns (Turkish uses comma for decimals)
-            numeric_columns = ['DESİ-KG', 'INVOICE ÜRÜN BEDELİ', 'US FEDEX KARGO ÜCRETİ', 
-                             'FEDEX İŞLEM ÜCRETİ', 'DUTY OTAN', 'DUTY', 'VERGİ ORANI', 'VERGİ']
-            for col in numeric_columns:
-                if col in df.columns:
-                    # Handle range values like "4.5 & 8.5" by taking the first value or average
-                    def parse_numeric(val):
-                        val_str = str(val).replace(',', '.').replace('$', '').replace('%', '').strip()
-                        if '&' in val_str:
-                            # Handle range: take the average of the two values
-                            parts = val_str.split('&')
-                            try:
-                                values = [float(p.strip()) for p in parts]
-                                return sum(values) / len(values)
-                            except:
-                                return 0.0
-                        try:
-                            return float(val_str)
-                        except:
-                            return 0.0
+                return pd.DataFrame(), None
+            
+            df = self._read_frame_cache(csv_path)
+            if df is None:
+                df = pd.read_csv(csv_path, sep=';', encoding='utf-8-sig')
+                df.columns = df.columns.str.strip()
+                
+                # Normalize numeric columns (Turkish uses comma for decimals)
+                numeric_columns = ['DESİ-KG', 'INVOICE ÜRÜN BEDELİ', 'US FEDEX KARGO ÜCRETİ', 
+                                 'FEDEX İŞLEM ÜCRETİ', 'DUTY OTAN', 'DUTY', 'VERGİ ORANI', 'VERGİ']
+                for col in numeric_columns:
+                    if col in df.columns:
+                        cleaned = (df[col].astype(str)
+                                   .str.replace(',', '.', regex=False)
+                                   .str.replace('$', '', regex=False)
+                                   .str.replace('%', '', regex=False)
+                                   .str.strip())
+                        parsed = pd.to_numeric(cleaned, errors='coerce')
                     
-                    df[col] = df[col].apply(parse_numeric)
+                        # Handle range values like "4.5 & 8.5" by taking the average of the parts
+                        is_range = cleaned.str.contains('&', regex=False)
+                        if is_range.any():
+                            parts = cleaned[is_range].str.split('&', expand=True)
+                            part_values = parts.apply(lambda p: pd.to_numeric(p.str.strip(), errors='coerce'))
+                            bad_part = (part_values.isna() & parts.notna()).any(axis=1)
+                            parsed[is_range] = part_values.mean(axis=1).mask(bad_part, 0.0)
+                    
+                        # Unparseable values become 0.0
+                        df[col] = parsed.mask(parsed.isna() & df[col].notna() & ~is_range, 0.0)
+                
+                # Missing cells become 0.0 too, so shipping extraction never sees NaN
+                present_columns = [col for col in numeric_columns if col in df.columns]
+                df[present_columns] = df[present_columns].fillna(0.0)
+                
+                # Identifier columns as category
+                for col in ('SKU', 'OTTOKOD'):
+                    if col in df.columns:
+                        df[col] = df[col].astype('category')
+                self._write_frame_cache(csv_path, df)
+            
+            # Index extracted shipping costs by key once (first row wins, same as the old DataFrame scans)
+            key_col = 'SKU' if 'SKU' in df.columns else 'OTTOKOD' if 'OTTOKOD' in df.columns else None
+            if key_col:
+                for row in df.dropna(subset=[key_col]).to_dict('records'):
+                    key = str(row[key_col]).strip()
+                    costs = self._extract_shipping_costs_from_row(row)
+                    if key_col == 'SKU':
+                        self._us_by_sku.setdefault(key, costs)
+                        self._us_by_normalized_sku.setdefault(self._normalize_sku_for_comparison(key), costs)
+                    else:
+                        self._us_by_ottokod.setdefault(key, costs)
             
-            print(f"✓ Loaded US FedEx data: {len(df)} products")
-            return df
+            return df, f"✓ Loaded US FedEx data: {len(df)} products"
         except Exception as e:
             logger.error(f"Error loading US FedEx data: {e}")
-            return pd.DataFrame()
+            return pd.DataFrame(), None
 
     def _save_checkpoint(self, checkpoint_data: Dict):
         """Removed - not needed in ultra-fast mode."""
@@ -327,6 +1218,17 @@ class EcommerceAnalyticsOptimized:
         """Removed - not needed in ultra-fast mode."""
         pass
 
+    @staticmethod
+    def _period_cache_key(period_type: str, start_date: datetime, end_date: datetime) -> Tuple[str, date, date]:
+        """
+        Key used by the in-memory SKU/listing metrics stores.
+        
+        A (period_type, start, end) tuple hashes faster than the formatted
+        "{period_type}_{YYYY-MM-DD}_to_{YYYY-MM-DD}" string; dates (not
+        datetimes) keep DB-loaded and generated periods comparable.
+        """
+        return (period_type, start_date.date(), end_date.date())
+
     @staticmethod
     def _normalize_sku_for_comparison(sku: str) -> str:
         """
@@ -339,39 +1241,8 @@ class EcommerceAnalyticsOptimized:
             "DELETED-OT-Remote-Organizer" → "remote-organizer"
             "ot-test-sku" → "test-sku" (handles lowercase prefixes)
         """
-        if not sku:
-            return sku
-        
-        # Common prefixes to strip (in order of precedence)
-        prefixes_to_remove = [
-            "DELETED-",
-            "OT-",
-            "ZSTK-",
-            "MG-",
-            "LND-",
-            "EU-",
-            "US-",
-            "UK-",
-            "CA-",  # Canada
-            "AU-",  # Australia
-            "JP-",  # Japan
-        ]
-        
-        normalized_sku = sku.strip()
-        
-        # Keep stripping prefixes until none match (handles multiple prefixes)
-        # Compare case-insensitively by checking uppercase version
-        changed = True
-        while changed:
-            changed = False
-            for prefix in prefixes_to_remove:
-                if normalized_sku.upper().startswith(prefix):
-                    normalized_sku = normalized_sku[len(prefix):]
-                    changed = True
-                    break
-        
-        # Convert to lowercase for case-insensitive comparison
-        return normalized_sku.lower()
+        # Shared with the diagnostic scripts (sku_normalize.SKU_PREFIXES)
+        return normalize_sku(sku)
 
     def _sku_exists_in_cost_csv(self, sku: str) -> bool:
         """Check if SKU exists in cost CSV at all using normalized comparison."""
@@ -380,8 +1251,8 @@ class EcommerceAnalyticsOptimized:
         
         normalized_lookup_sku = self._normalize_sku_for_comparison(sku)
         
-        # Fast lookup using pre-computed normalized column
-        return normalized_lookup_sku in self.cost_data['_normalized_sku'].values
+        # O(1) lookup in the normalized SKU index
+        return normalized_lookup_sku in self._cost_by_sku
 
     def _get_cost_from_variant_skus(self, sku: str, year: int, month: int) -> float:
         """
@@ -418,7 +1289,7 @@ class EcommerceAnalyticsOptimized:
         
         # Find EXACT matching variants (same base including size/material)
         matching_variants = []
-        for _, row in self.cost_data.iterrows():
+        for row in self._cost_records:
             csv_sku = str(row.get('SKU', '')).strip()
             if not csv_sku:
                 continue
@@ -454,7 +1325,7 @@ class EcommerceAnalyticsOptimized:
             normalized_generic = self._normalize_sku_for_comparison(generic_base)
             
             # Find any SKU that starts with this generic base
-            for _, row in self.cost_data.iterrows():
+            for row in self._cost_records:
                 csv_sku = str(row.get('SKU', '')).strip()
                 if not csv_sku:
                     continue
@@ -475,75 +1346,116 @@ class EcommerceAnalyticsOptimized:
     
     def _get_cost_from_row(self, cost_row, year: int, month: int) -> float:
         """Extract cost from a cost.csv row for the given year/month."""
-        month_names = {
-            1: "OCAK", 2: "SUBAT", 3: "MART", 4: "NISAN", 5: "MAYIS", 6: "HAZIRAN",
-            7: "TEMMUZ", 8: "AGUSTOS", 9: "EYLUL", 10: "EKIM", 11: "KASIM", 12: "ARALIK",
-        }
-        month_name = month_names.get(month)
-        if not month_name:
+        if month not in self._COST_MONTH_NAMES:
             return 0.0
-
-        prefixes = ["US", "EU", "AU"]
-        year_2digit = year % 100
-        
-        # Try all possible column name formats
-        for prefix in prefixes:
-            possible_columns = [
-                f"{prefix} {month_name} {year}",
-                f"{prefix} {month_name} {year_2digit}",
-                f"{prefix} {year} {month_name}",
-                f"{prefix} {year_2digit} {month_name}",
-                f"{prefix} {month_name}{year_2digit}",
-                f"{prefix}{year_2digit} {month_name}",
-                f"{prefix} {month_name}",
-            ]
-            
-            all_columns = []
-            for col in possible_columns:
-                all_columns.extend([col, f"{col} CALISMA", f"{col} ÇALIŞMA"])
-
-            for col in all_columns:
-                value = cost_row.get(col)
-                if pd.notna(value):
-                    try:
-                        cost = float(value)
-                        if cost > 0:
-                            return cost
-                    except (ValueError, TypeError):
-                        continue
         
-        # Fallback: try to find most recent cost for this row
-        all_cost_columns = []
-        for prefix in prefixes:
-            for col in cost_row.index if hasattr(cost_row, 'index') else cost_row.keys():
-                if col.startswith(prefix) and any(mn in col for mn in month_names.values()):
-                    all_cost_columns.append(col)
-        
-        dated_costs = []
-        for col in all_cost_columns:
-            value = cost_row.get(col) if hasattr(cost_row, 'get') else cost_row[col]
+        # Only the column name formats that actually exist in cost.csv
+        for col in self._candidate_columns(year, month):
+            value = cost_row.get(col)
             if pd.notna(value):
                 try:
                     cost = float(value)
                     if cost > 0:
-                        import re
-                        year_match = re.search(r'\b(20\d{2}|2\d)\b', col)
-                        if year_match:
-                            col_year = int(year_match.group(1))
-                            if col_year < 100:
-                                col_year += 2000
-                            dated_costs.append((col_year, cost, col))
+                        return cost
                 except (ValueError, TypeError):
                     continue
         
-        if dated_costs:
-            dated_costs.sort(reverse=True)
-            return dated_costs[0][1]
+        # Fallback: try to find most recent cost for this row
+        most_recent_cost, _ = self._most_recent_cost(cost_row)
+        return most_recent_cost
+
+    def _most_recent_cost(self, cost_row) -> Tuple[float, Optional[str]]:
+        """
+        Find the most recent positive cost in a cost.csv row.
+        
+        Walks the dated columns parsed at load time (most recent year first);
+        within the most recent year that has a cost, the highest cost wins.
         
-        return 0.0
+        Returns:
+            (cost, column) or (0.0, None) if the row has no dated cost
+        """
+        best = None
+        best_year = None
+        for col_year, col in self._dated_cost_columns:
+            if best_year is not None and col_year < best_year:
+                break
+            value = cost_row.get(col)
+            if pd.notna(value):
+                try:
+                    cost = float(value)
+                except (ValueError, TypeError):
+                    continue
+                if cost > 0 and (best is None or (cost, col) > best):
+                    best = (cost, col)
+                    best_year = col_year
+        
+        return best if best else (0.0, None)
+
+    def _resolve_cost_columns(self, prefix: str, year: int, month: int) -> Tuple[str, ...]:
+        """
+        Cost columns that exist in cost.csv for a prefix/year/month, in lookup order.
+        
+        Your CSV has VERY inconsistent formats across different years!
+        Examples from your CSV:
+          - "US MAYIS 2025" (full year with space)
+          - "US MART 25" (2-digit year with space)
+          - "US 2024 NISAN" (year first with space)
+          - "US ARALIK 24" (2-digit year with space)
+        All format variations are generated and intersected with the real
+        columns, so lookups skip missing names.
+        """
+        month_name = self._COST_MONTH_NAMES.get(month)
+        if not month_name:
+            return ()
+        
+        year_2digit = year % 100  # e.g., 2025 -> 25
+        possible_columns = [
+            # Format 1: "US MAYIS 2025" (full 4-digit year after month)
+            f"{prefix} {month_name} {year}",
+            # Format 2: "US MART 25" (2-digit year after month with space)
+            f"{prefix} {month_name} {year_2digit}",
+            # Format 3: "US 2024 NISAN" (full year before month)
+            f"{prefix} {year} {month_name}",
+            # Format 4: "US 25 MART" (2-digit year before month)
+            f"{prefix} {year_2digit} {month_name}",
+            # Format 5: "US MART25" (2-digit year after month, no space)
+            f"{prefix} {month_name}{year_2digit}",
+            # Format 6: "US25 MART" (2-digit year after prefix, no space)
+            f"{prefix}{year_2digit} {month_name}",
+            # Format 7: Just month (no year at all)
+            f"{prefix} {month_name}",
+        ]
+        
+        # Try all columns with and without CALISMA/ÇALIŞMA suffix
+        candidates = []
+        for col in possible_columns:
+            candidates.extend([col, f"{col} CALISMA", f"{col} ÇALIŞMA"])
+        
+        return tuple(col for col in candidates if col in self._cost_columns_set)
+
+    def _candidate_columns(self, year: int, month: int) -> Tuple[str, ...]:
+        """Cost columns that exist for a year/month across all prefixes (precomputed for 2020-2030)."""
+        cached = self._candidate_columns_cache.get((year, month))
+        if cached is not None:
+            return cached
+        
+        if month not in self._COST_MONTH_NAMES:
+            return ()
+        
+        columns = tuple(col for prefix in self._COST_PREFIXES
+                        for col in self._resolve_cost_columns(prefix, year, month))
+        self._candidate_columns_cache[(year, month)] = columns
+        return columns
 
-    @lru_cache(maxsize=10000)
     def get_cost_for_sku_date(self, sku: str, year: int, month: int) -> float:
+        """Get cost for a specific SKU at a specific date (memoized per SKU/year/month)."""
+        key = (sku, year, month)
+        cost = self._sku_date_cost_cache.get(key)
+        if cost is None:
+            cost = self._sku_date_cost_cache[key] = self._lookup_cost_for_sku_date(sku, year, month)
+        return cost
+
+    def _lookup_cost_for_sku_date(self, sku: str, year: int, month: int) -> float:
         """Get cost for a specific SKU at a specific date with bidirectional normalized matching."""
         if not sku or self.cost_data.empty:
             return 0.0
@@ -554,106 +1466,34 @@ class EcommerceAnalyticsOptimized:
         if cache_key in self._bulk_cost_cache:
             return self._bulk_cost_cache[cache_key]
         
-        # Normalize the lookup SKU
-        normalized_lookup_sku = self._normalize_sku_for_comparison(sku)
-        
-        # Fast lookup using pre-computed normalized column
-        matching_rows = self.cost_data[self.cost_data['_normalized_sku'] == normalized_lookup_sku]
+        # O(1) lookup in the normalized SKU index built at load time
+        sku_row = self._cost_by_sku.get(normalized_lookup_sku)
         
-        if matching_rows.empty:
+        if sku_row is None:
             # VARIANT FALLBACK: Try to find sibling SKUs (same base product, different color/variant)
             # Example: OT-PU-L-KeyboardPad-White → find OT-PU-L-KeyboardPad-Black, Brown, etc.
             variant_cost = self._get_cost_from_variant_skus(sku, year, month)
             if variant_cost > 0:
                 return variant_cost
             return 0.0
-        
-        sku_row = matching_rows.iloc[0:1]
 
-        month_names = {
-            1: "OCAK", 2: "SUBAT", 3: "MART", 4: "NISAN", 5: "MAYIS", 6: "HAZIRAN",
-            7: "TEMMUZ", 8: "AGUSTOS", 9: "EYLUL", 10: "EKIM", 11: "KASIM", 12: "ARALIK",
-        }
-        month_name = month_names.get(month)
-        if not month_name:
+        if month not in self._COST_MONTH_NAMES:
             return 0.0
-
-        prefixes = ["US", "EU", "AU"]
-        year_2digit = year % 100  # e.g., 2025 -> 25
-        
-        # Try exact date match first with ALL possible format variations
-        # Your CSV has VERY inconsistent formats across different years!
-        # Examples from your CSV:
-        #   - "US MAYIS 2025" (full year with space)
-        #   - "US MART 25" (2-digit year with space)
-        #   - "US 2024 NISAN" (year first with space)
-        #   - "US ARALIK 24" (2-digit year with space)
-        for prefix in prefixes:
-            possible_columns = [
-                # Format 1: "US MAYIS 2025" (full 4-digit year after month)
-                f"{prefix} {month_name} {year}",
-                # Format 2: "US MART 25" (2-digit year after month with space)
-                f"{prefix} {month_name} {year_2digit}",
-                # Format 3: "US 2024 NISAN" (full year before month)
-                f"{prefix} {year} {month_name}",
-                # Format 4: "US 25 MART" (2-digit year before month)
-                f"{prefix} {year_2digit} {month_name}",
-                # Format 5: "US MART25" (2-digit year after month, no space)
-                f"{prefix} {month_name}{year_2digit}",
-                # Format 6: "US25 MART" (2-digit year after prefix, no space)
-                f"{prefix}{year_2digit} {month_name}",
-                # Format 7: Just month (no year at all)
-                f"{prefix} {month_name}",
-            ]
-            
-            # Try all columns with and without CALISMA/ÇALIŞMA suffix
-            all_columns = []
-            for col in possible_columns:
-                all_columns.extend([col, f"{col} CALISMA", f"{col} ÇALIŞMA"])
-
-            for col in all_columns:
-                if col in sku_row.columns:
-                    value = sku_row[col].values[0]
-                    if pd.notna(value):
-                        try:
-                            return float(value)
-                        except (ValueError, TypeError):
-                            continue
         
-        # FALLBACK: If exact date not found, try to find the most recent cost
-        # This is especially useful for new years (e.g., 2025) where costs haven't been updated yet
-        # We'll use the latest available cost from previous periods
-        all_cost_columns = []
-        for prefix in prefixes:
-            # Look for any cost columns for this prefix
-            for col in sku_row.columns:
-                if col.startswith(prefix) and any(mn in col for mn in month_names.values()):
-                    all_cost_columns.append(col)
-        
-        # Try to extract dates from column names and sort by most recent
-        dated_costs = []
-        for col in all_cost_columns:
-            value = sku_row[col].values[0]
+        # Try exact date match first - only columns that actually exist in cost.csv
+        for col in self._candidate_columns(year, month):
+            value = sku_row[col]
             if pd.notna(value):
                 try:
-                    cost = float(value)
-                    if cost > 0:
-                        # Try to extract year from column name
-                        import re
-                        year_match = re.search(r'\b(20\d{2}|2\d)\b', col)
-                        if year_match:
-                            col_year = int(year_match.group(1))
-                            if col_year < 100:  # 2-digit year
-                                col_year += 2000
-                            dated_costs.append((col_year, cost, col))
+                    return float(value)
                 except (ValueError, TypeError):
                     continue
         
-        # Use the most recent cost if available
-        if dated_costs:
-            dated_costs.sort(reverse=True)  # Sort by year, most recent first
-            most_recent_cost = dated_costs[0][1]
-            most_recent_col = dated_costs[0][2]
+        # FALLBACK: If exact date not found, try to find the most recent cost
+        # This is especially useful for new years (e.g., 2025) where costs haven't been updated yet
+        # We'll use the latest available cost from previous periods (resolved per SKU at load)
+        most_recent_cost, most_recent_col = self._latest_cost_by_sku[normalized_lookup_sku]
+        if most_recent_col:
             
             # Only log fallback usage periodically to avoid spam
             fallback_key = f"{sku}_{year}_{month}"
@@ -948,8 +1788,14 @@ class EcommerceAnalyticsOptimized:
         
         return 0.0
 
-    @lru_cache(maxsize=5000)
     def get_desi_for_sku(self, sku: str) -> float:
+        """Get product weight (desi) for SKU (memoized per SKU)."""
+        desi = self._desi_cache.get(sku)
+        if desi is None:
+            desi = self._desi_cache[sku] = self._lookup_desi_for_sku(sku)
+        return desi
+
+    def _lookup_desi_for_sku(self, sku: str) -> float:
         """
         Get product weight (desi) for SKU.
         
@@ -963,68 +1809,52 @@ class EcommerceAnalyticsOptimized:
         if self.desi_data.empty or not sku:
             return 0.5  # Default to 0.5 kg if not found
         
+        desi_by_ottokod = self._desi_by_ottokod
+        
         # Approach 1: Try exact SKU match first (fast path)
         ottokod = self.sku_to_ottokod.get(sku)
-        if ottokod and 'OTTOKOD' in self.desi_data.columns:
-            desi_row = self.desi_data[self.desi_data['OTTOKOD'].str.strip() == str(ottokod).strip()]
-            if not desi_row.empty:
-                try:
-                    return float(desi_row.iloc[0]['DESİ'])
-                except:
-                    pass
+        if ottokod and str(ottokod).strip() in desi_by_ottokod:
+            return float(desi_by_ottokod[str(ottokod).strip()])
         
         # Approach 2: Try normalized SKU -> OTTOKOD lookup (handles prefix mismatches)
         normalized_sku = self._normalize_sku_for_comparison(sku)
         if normalized_sku:
             ottokod = self.sku_to_ottokod_normalized.get(normalized_sku)
-            if ottokod and 'OTTOKOD' in self.desi_data.columns:
-                desi_row = self.desi_data[self.desi_data['OTTOKOD'].str.strip() == str(ottokod).strip()]
-                if not desi_row.empty:
-                    try:
-                        return float(desi_row.iloc[0]['DESİ'])
-                    except:
-                        pass
-        
-        # Approach 3: Fallback - try iterating through cost.csv to find normalized match
-        # Then use that row's OTTOKOD to look up in desi_data
-        if 'OTTOKOD' in self.desi_data.columns and not self.cost_data.empty:
-            if 'SKU' in self.cost_data.columns:
-                for _, cost_row in self.cost_data.iterrows():
-                    csv_sku = str(cost_row.get('SKU', '')).strip()
-                    if self._normalize_sku_for_comparison(csv_sku) == normalized_sku:
-                        # Found matching SKU in cost.csv, get its OTTOKOD
-                        ottokod = cost_row.get('OTTOKOD')
-                        if pd.notna(ottokod):
-                            ottokod_clean = str(ottokod).strip()
-                            desi_row = self.desi_data[self.desi_data['OTTOKOD'].str.strip() == ottokod_clean]
-                            if not desi_row.empty:
-                                try:
-                                    return float(desi_row.iloc[0]['DESİ'])
-                                except:
-                                    pass
+            if ottokod and str(ottokod).strip() in desi_by_ottokod:
+                return float(desi_by_ottokod[str(ottokod).strip()])
+        
+        # Approach 3: Fallback - any cost.csv row with the same normalized SKU,
+        # then use that row's OTTOKOD to look up in desi_data
+        for ottokod in self._ottokods_by_normalized_sku.get(normalized_sku, ()):
+            if ottokod in desi_by_ottokod:
+                return float(desi_by_ottokod[ottokod])
         
         return 0.5  # Default weight if all approaches fail
 
-    @lru_cache(maxsize=200)
     def get_zone_for_country(self, country_code: str) -> int:
         """Get FedEx zone number for a country code."""
         if self.fedex_zones_data.empty or not country_code:
             return 8  # Default to Zone 8 (US) if not found
         
-        # Match by country code using renamed column
-        zone_row = self.fedex_zones_data[
-            self.fedex_zones_data['Country_Code'].str.upper() == country_code.upper()
-        ]
-        
-        if zone_row.empty:
-            return 8  # Default to Zone 8
-        
-        try:
-            return int(zone_row.iloc[0]['Zone'])
-        except:
-            return 8
+        return self._zone_by_country.get(country_code.upper(), 8)
+
+    def get_fedex_prices(self, weights, zones) -> np.ndarray:
+        """Vectorized get_fedex_price for parallel sequences of weights (kg) and zones."""
+        weights = np.asarray(weights, dtype=float)
+        prices = np.zeros(len(weights))
+        if self.fedex_pricing_data.empty or not len(self._fedex_tiers) or not len(weights):
+            return prices
+        
+        # Map each distinct zone to its price-matrix column once (-1 = no such zone column)
+        unique_zones, inverse = np.unique(np.asarray(zones), return_inverse=True)
+        zone_idx = np.array([self._fedex_zone_index.get(f"{zone}.Bölge", -1) for zone in unique_zones])[inverse]
+        
+        # Round weights up to their tier (max tier if over) and gather all prices at once
+        tier_idx = np.searchsorted(self._fedex_tiers, weights).clip(0, len(self._fedex_tiers) - 1)
+        known = zone_idx >= 0
+        prices[known] = self._fedex_prices[tier_idx[known], zone_idx[known]]
+        return prices
 
-    @lru_cache(maxsize=1000)
     def get_fedex_price(self, weight_kg: float, zone: int) -> float:
         """Get FedEx shipping price for weight and zone from pricing matrix."""
         if self.fedex_pricing_data.empty:
@@ -1035,37 +1865,23 @@ class EcommerceAnalyticsOptimized:
             logger.warning("Weight column not found in FedEx pricing data")
             return 0.0
         
-        # Round weight up to nearest tier
-        weight_tiers = sorted(self.fedex_pricing_data['Weight'].unique())
-        actual_tier = weight_kg
-        for tier in weight_tiers:
-            if weight_kg <= tier:
-                actual_tier = tier
-                break
-        else:
-            actual_tier = weight_tiers[-1]  # Use max tier if over
-        
-        # Get price for this weight tier
-        price_row = self.fedex_pricing_data[
-            self.fedex_pricing_data['Weight'] == actual_tier
-        ]
-        
-        if price_row.empty:
-            return 0.0
-        
         # Column name for zone (e.g., "1.Bölge" for zone 1)
-        zone_col = f"{zone}.Bölge"
-        
-        if zone_col not in price_row.columns:
+        zone_idx = self._fedex_zone_index.get(f"{zone}.Bölge")
+        if zone_idx is None or not len(self._fedex_tiers):
             return 0.0
         
-        try:
-            return float(price_row.iloc[0][zone_col])
-        except:
-            return 0.0
+        # Round weight up to nearest tier (binary search), use max tier if over
+        tier_idx = min(int(np.searchsorted(self._fedex_tiers, weight_kg)), len(self._fedex_tiers) - 1)
+        return float(self._fedex_prices[tier_idx, zone_idx])
 
-    @lru_cache(maxsize=5000)
     def get_us_shipping_costs(self, sku: str) -> Dict[str, float]:
+        """Get US-specific shipping costs including duties and taxes (memoized per SKU)."""
+        costs = self._us_shipping_cache.get(sku)
+        if costs is None:
+            costs = self._us_shipping_cache[sku] = self._lookup_us_shipping_costs(sku)
+        return costs
+
+    def _lookup_us_shipping_costs(self, sku: str) -> Dict[str, float]:
         """
         Get US-specific shipping costs including duties and taxes.
         Returns dict with: fedex_charge, processing_fee, duty_rate, duty_amount, tax_rate, tax_amount
@@ -1074,7 +1890,7 @@ class EcommerceAnalyticsOptimized:
         1. Exact SKU match in cache
         2. OTTOKOD mapping (exact)
         3. Normalized SKU match in cache
-        4. Direct DataFrame lookup with normalization
+        4. Load-time SKU/OTTOKOD indexes with normalization
         """
         default_result = {
             'fedex_charge': 0.0, 'processing_fee': 0.0,
@@ -1106,40 +1922,27 @@ class EcommerceAnalyticsOptimized:
             original_sku = self._bulk_shipping_cache_normalized[normalized_sku]
             return self._bulk_shipping_cache[original_sku]
         
-        # Fallback: Direct search in DataFrame (slower, but catches edge cases)
-        if not self.us_fedex_data.empty:
-            # Check if CSV has SKU or OTTOKOD column
-            if 'SKU' in self.us_fedex_data.columns:
-                # Try exact SKU match
-                row = self.us_fedex_data[self.us_fedex_data['SKU'].str.strip() == str(sku).strip()]
-                if not row.empty:
-                    return self._extract_shipping_costs_from_row(row.iloc[0])
-                
-                # Try normalized SKU match
-                for _, csv_row in self.us_fedex_data.iterrows():
-                    csv_sku = str(csv_row.get('SKU', '')).strip()
-                    if self._normalize_sku_for_comparison(csv_sku) == normalized_sku:
-                        return self._extract_shipping_costs_from_row(csv_row)
-            
-            elif 'OTTOKOD' in self.us_fedex_data.columns:
-                # If CSV only has OTTOKOD, look up via mapping
-                if ottokod:
-                    row = self.us_fedex_data[self.us_fedex_data['OTTOKOD'].str.strip() == str(ottokod).strip()]
-                    if not row.empty:
-                        return self._extract_shipping_costs_from_row(row.iloc[0])
+        # Fallback: indexes built from the US FedEx CSV at load (catches whitespace/prefix edge cases)
+        costs = self._us_by_sku.get(str(sku).strip()) or self._us_by_normalized_sku.get(normalized_sku)
+        if costs:
+            return costs
+        
+        # If CSV only has OTTOKOD, look up via mapping
+        if ottokod and str(ottokod).strip() in self._us_by_ottokod:
+            return self._us_by_ottokod[str(ottokod).strip()]
         
         # Return default if not found
         return default_result
     
     def _extract_shipping_costs_from_row(self, row) -> Dict[str, float]:
-        """Extract shipping cost data from a DataFrame row."""
+        """Extract shipping cost data from a US FedEx row (numeric columns are NaN-free after load)."""
         return {
-            'fedex_charge': float(row.get('US FEDEX KARGO ÜCRETİ', 0) or 0),
-            'processing_fee': float(row.get('FEDEX İŞLEM ÜCRETİ', 0) or 0),
-            'duty_rate': float(row.get('DUTY OTAN', 0) or 0) / 100,
-            'duty_amount': float(row.get('DUTY', 0) or 0),
-            'tax_rate': float(row.get('VERGİ ORANI', 0) or 0) / 100,
-            'tax_amount': float(row.get('VERGİ', 0) or 0)
+            'fedex_charge': float(row.get('US FEDEX KARGO ÜCRETİ', 0.0)),
+            'processing_fee': float(row.get('FEDEX İŞLEM ÜCRETİ', 0.0)),
+            'duty_rate': float(row.get('DUTY OTAN', 0.0)) / 100,
+            'duty_amount': float(row.get('DUTY', 0.0)),
+            'tax_rate': float(row.get('VERGİ ORANI', 0.0)) / 100,
+            'tax_amount': float(row.get('VERGİ', 0.0))
         }
 
     def calculate_duty_and_tax(self, invoice_price: float, duty_rate: float, tax_rate: float) -> Dict[str, float]:
@@ -1192,8 +1995,6 @@ class EcommerceAnalyticsOptimized:
         Ensure database connection is healthy, reconnect if needed.
         Uses timestamp-based throttling to avoid excessive connection checks.
         """
-        import time
-        
         # Check if we recently verified the connection (within last 30 seconds)
         current_time = time.time()
         if current_time - self._last_connection_check < self._connection_check_interval:
@@ -1423,8 +2224,10 @@ class EcommerceAnalyticsOptimized:
                 "DELETE FROM product_reports"
             ]
             
-            for query in delete_queries:
-                await self.prisma.execute_raw(query)
+            # Run the deletes in one transaction so a failure can't leave a partial wipe
+            async with self.prisma.tx() as tx:
+                for query in delete_queries:
+                    await tx.execute_raw(query)
             
             print(f"\n✅ Successfully deleted all report data!")
             print(f"   ✓ Deleted {shop_count:,} shop reports")
@@ -1443,13 +2246,12 @@ class EcommerceAnalyticsOptimized:
         # Use tqdm.write for output to avoid progress bar interference
         tqdm.write("\n⚡ Pre-loading data...")
         
-        # Run all pre-loading tasks in parallel
-        await asyncio.gather(
-            self._preload_sku_mappings(),
-            self._preload_inventory_data(),
-            self._preload_bulk_costs(),  # NEW: Pre-load all costs
-            return_exceptions=True
-        )
+        # Run all pre-loading tasks in parallel; a failure cancels the rest and surfaces
+        # instead of leaving the hot paths on empty mappings
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(self._preload_sku_mappings())
+            tg.create_task(self._preload_inventory_data())
+            tg.create_task(self._preload_bulk_costs())  # NEW: Pre-load all costs
         
         tqdm.write("✅ Pre-loading complete!\n")
     
@@ -1458,19 +2260,11 @@ class EcommerceAnalyticsOptimized:
         try:
             # Pre-cache all shipping costs (US-specific) with normalized index
             if not self.us_fedex_data.empty:
-                for _, row in self.us_fedex_data.iterrows():
+                for row in self.us_fedex_data.to_dict('records'):
                     sku = row.get('SKU')
                     if pd.notna(sku):
                         sku_str = str(sku).strip()
-                        shipping_data = {
-                            'fedex_charge': float(row.get('US FEDEX KARGO ÜCRETİ', 0) or 0),
-                            'processing_fee': float(row.get('FEDEX İŞLEM ÜCRETİ', 0) or 0),
-                            'duty_rate': float(row.get('DUTY OTAN', 0) or 0) / 100,
-                            'duty_amount': float(row.get('DUTY', 0) or 0),
-                            'tax_rate': float(row.get('VERGİ ORANI', 0) or 0) / 100,
-                            'tax_amount': float(row.get('VERGİ', 0) or 0)
-                        }
-                        self._bulk_shipping_cache[sku_str] = shipping_data
+                        self._bulk_shipping_cache[sku_str] = self._extract_shipping_costs_from_row(row)
                         
                         # Build normalized index for fast O(1) lookups
                         normalized_sku = self._normalize_sku_for_comparison(sku_str)
@@ -1485,7 +2279,7 @@ class EcommerceAnalyticsOptimized:
                 }
                 
                 # Extract all year-month columns from cost data
-                for _, row in self.cost_data.iterrows():
+                for row in self._cost_records:
                     sku = row.get('SKU')
                     if pd.isna(sku):
                         continue
@@ -1509,7 +2303,7 @@ class EcommerceAnalyticsOptimized:
                                 ]
                                 
                                 for col in possible_columns:
-                                    if col in row.index:
+                                    if col in row:
                                         value = row[col]
                                         if pd.notna(value):
                                             try:
@@ -1527,34 +2321,48 @@ class EcommerceAnalyticsOptimized:
             tqdm.write(f"  ✓ Pre-cached {len(self._bulk_shipping_cache)} shipping entries")
         except Exception as e:
             logger.error(f"Error pre-loading bulk costs: {e}")
+            raise  # Let _preload_all_data's TaskGroup cancel the other loaders
 
     async def _preload_sku_mappings(self):
         """Pre-load SKU to product_id mappings and listing to product_id mappings for faster lookups."""
         try:
-            # Use raw query instead of ORM with select (not supported in Prisma Python)
-            result = await self.prisma.query_raw(
+            # Let Postgres group the rows so Python loops once per SKU / listing, not per row
+            # (the DELETED- prefix is stripped in SQL so both spellings land in one group)
+            sku_groups = await self.prisma.query_raw(
+                """
+                SELECT
+                    CASE WHEN sku LIKE 'DELETED-%' THEN REPLACE(sku, 'DELETED-', '') ELSE sku END AS sku,
+                    array_agg(DISTINCT product_id) AS product_ids
+                FROM listing_products
+                WHERE is_deleted = false AND sku IS NOT NULL
+                GROUP BY 1
+                """
+            )
+            listing_groups = await self.prisma.query_raw(
                 """
-                SELECT sku, product_id, listing_id
+                SELECT listing_id, array_agg(DISTINCT product_id) AS product_ids
                 FROM listing_products
                 WHERE is_deleted = false AND sku IS NOT NULL
+                GROUP BY listing_id
                 """
             )
             
-            for row in result:
-                sku = row['sku']
-                product_id = row['product_id']
-                listing_id = row['listing_id']
-                
-                # SKU to product_id mapping
-                normalized_sku = sku.replace("DELETED-", "") if sku.startswith("DELETED-") else sku
-                if normalized_sku not in self._sku_to_products:
-                    self._sku_to_products[normalized_sku] = []
-                self._sku_to_products[normalized_sku].append(product_id)
-                
-                # Listing to product_ids mapping (for aggregating child products)
-                if listing_id not in self._listing_to_products:
-                    self._listing_to_products[listing_id] = []
-                self._listing_to_products[listing_id].append(product_id)
+            # SKU to product_id mapping
+            for row in sku_groups:
+                self._sku_to_products[row['sku']] = {int(pid) for pid in row['product_ids']}
+            
+            # Listing to product_ids mapping (for aggregating child products)
+            for row in listing_groups:
+                self._listing_to_products[int(row['listing_id'])] = {int(pid) for pid in row['product_ids']}
+            
+            # Inverse index so a listing's child SKUs come from its product_ids
+            # directly instead of scanning every SKU's product set per listing
+            self._sku_names = tuple(self._sku_to_products)
+            product_to_sku_indices = defaultdict(list)
+            for i, product_ids in enumerate(self._sku_to_products.values()):
+                for product_id in product_ids:
+                    product_to_sku_indices[product_id].append(i)
+            self._product_to_sku_indices = dict(product_to_sku_indices)
             
             tqdm.write(f"  ✓ Loaded {len(self._sku_to_products)} SKU mappings")
             
@@ -1564,42 +2372,18 @@ class EcommerceAnalyticsOptimized:
                 tqdm.write(f"  → Sample SKUs in mapping: {sample_skus}")
         except Exception as e:
             logger.error(f"Error pre-loading SKU mappings: {e}")
+            raise  # Let _preload_all_data's TaskGroup cancel the other loaders
 
     async def _preload_inventory_data(self):
         """Pre-load all inventory data for instant access."""
         try:
-            # Get inventory by SKU
+            # Inventory by SKU and by listing in ONE scan of product_offerings:
+            # GROUPING(lp.sku) = 0 marks the per-SKU rows, otherwise the row is per-listing
             result = await self.prisma.query_raw(
                 """
                 SELECT 
+                    GROUPING(lp.sku) as sku_grouping,
                     lp.sku,
-                    SUM(po.quantity) as total_inventory,
-                    AVG(po.price) as avg_price,
-                    MAX(po.price) - MIN(po.price) as price_range,
-                    COUNT(DISTINCT po.id) as active_variants
-                FROM product_offerings po
-                INNER JOIN listing_products lp ON po.listing_product_id = lp.id
-                WHERE po.is_enabled = true 
-                AND po.is_deleted = false
-                AND lp.sku IS NOT NULL
-                GROUP BY lp.sku
-                """
-            )
-            
-            for row in result:
-                sku = row['sku']
-                normalized_sku = sku.replace("DELETED-", "") if sku.startswith("DELETED-") else sku
-                self._inventory_cache[f"sku_{normalized_sku}"] = {
-                    "total_inventory": int(row['total_inventory'] or 0),
-                    "avg_price": round(float(row['avg_price'] or 0), 2),
-                    "price_range": round(float(row['price_range'] or 0), 2),
-                    "active_variants": int(row['active_variants'] or 0)
-                }
-            
-            # Get inventory by listing
-            result = await self.prisma.query_raw(
-                """
-                SELECT 
                     lp.listing_id,
                     SUM(po.quantity) as total_inventory,
                     AVG(po.price) as avg_price,
@@ -1609,24 +2393,32 @@ class EcommerceAnalyticsOptimized:
                 INNER JOIN listing_products lp ON po.listing_product_id = lp.id
                 WHERE po.is_enabled = true 
                 AND po.is_deleted = false
-                GROUP BY lp.listing_id
+                GROUP BY GROUPING SETS ((lp.sku), (lp.listing_id))
                 """
             )
             
             for row in result:
-                listing_id = row['listing_id']
-                self._inventory_cache[f"listing_{listing_id}"] = {
+                inventory = {
                     "total_inventory": int(row['total_inventory'] or 0),
                     "avg_price": round(float(row['avg_price'] or 0), 2),
                     "price_range": round(float(row['price_range'] or 0), 2),
                     "active_variants": int(row['active_variants'] or 0)
                 }
+                if row['sku_grouping'] == 0:
+                    sku = row['sku']
+                    if sku is None:
+                        continue  # Products without a SKU only count towards their listing
+                    normalized_sku = sku.replace("DELETED-", "") if sku.startswith("DELETED-") else sku
+                    self._inventory_cache[f"sku_{normalized_sku}"] = inventory
+                else:
+                    self._inventory_cache[f"listing_{row['listing_id']}"] = inventory
             
             tqdm.write(f"  ✓ Loaded inventory cache")
         except Exception as e:
             logger.error(f"Error pre-loading inventory: {e}")
+            raise  # Let _preload_all_data's TaskGroup cancel the other loaders
 
-    async def _load_product_reports_into_cache(self, sku_metrics_store: Dict, periods: Dict):
+    async def _load_product_reports_into_cache(self, sku_metrics_store: SkuMetricsStore, periods: Dict):
         """
         Load existing product reports from database into cache for listing aggregation.
         This is MUCH faster than recalculating everything from scratch.
@@ -1746,36 +2538,40 @@ class EcommerceAnalyticsOptimized:
             
             # Build a normalized SKU lookup index for fast O(1) lookups
             # Maps: normalized_sku -> original_sku_from_database
-            normalized_sku_index = {}
+            normalized_sku_index = sku_metrics_store.normalized_index
+            period_bounds = {}  # (period_type, start, end) as read -> parsed period and cache key
             
             # Convert database records to metrics dict format
             for report in all_product_reports:
                 sku = report['sku']
                 
                 # Initialize SKU in cache if not exists
-                if sku not in sku_metrics_store:
-                    sku_metrics_store[sku] = {}
+                sku_metrics_store.add_sku(sku)
                 
                 # Build reverse index: normalized SKU -> database SKU
                 normalized_sku = self._normalize_sku_for_comparison(sku)
                 if normalized_sku and normalized_sku not in normalized_sku_index:
                     normalized_sku_index[normalized_sku] = sku
                 
-                # Convert PeriodType to string (from raw SQL result)
-                period_type = report['period_type'].lower()  # "YEARLY" -> "yearly"
-                
-                # Parse date strings to datetime objects if needed
-                from datetime import datetime
-                period_start = report['period_start']
-                period_end = report['period_end']
-                if isinstance(period_start, str):
-                    period_start = datetime.fromisoformat(period_start.replace('Z', '+00:00'))
-                if isinstance(period_end, str):
-                    period_end = datetime.fromisoformat(period_end.replace('Z', '+00:00'))
-                
-                # Create period_key in same format as calculate_metrics_batch
-                period_key = f"{period_start.strftime('%Y-%m-%d')}_to_{period_end.strftime('%Y-%m-%d')}"
-                full_key = f"{period_type}_{period_key}"
+                # Parse each distinct period once: its datetimes and cache key are shared
+                # by every report of the period instead of being rebuilt per row
+                raw_period = (report['period_type'], report['period_start'], report['period_end'])
+                period = period_bounds.get(raw_period)
+                if period is None:
+                    # Convert PeriodType to string (from raw SQL result)
+                    period_type = raw_period[0].lower()  # "YEARLY" -> "yearly"
+                    
+                    # Parse date strings to datetime objects if needed
+                    period_start, period_end = raw_period[1], raw_period[2]
+                    if isinstance(period_start, str):
+                        period_start = datetime.fromisoformat(period_start.replace('Z', '+00:00'))
+                    if isinstance(period_end, str):
+                        period_end = datetime.fromisoformat(period_end.replace('Z', '+00:00'))
+                    
+                    # Create cache key in same format as the generation phases
+                    full_key = self._period_cache_key(period_type, period_start, period_end)
+                    period = period_bounds[raw_period] = (period_type, period_start, period_end, full_key)
+                period_type, period_start, period_end, full_key = period
                 
                 # Convert database record to metrics dict (snake_case from SQL)
                 metrics = {
@@ -1826,13 +2622,9 @@ class EcommerceAnalyticsOptimized:
                 }
                 
                 # Store in cache
-                sku_metrics_store[sku][full_key] = metrics
+                sku_metrics_store.put(sku, full_key, metrics)
             
-            # Store the normalized index for fast lookups during aggregation
-            # This allows O(1) lookup instead of O(n) search through all SKUs
-            sku_metrics_store['_normalized_index'] = normalized_sku_index
-            
-            tqdm.write(f"  ✓ Loaded {len(sku_metrics_store) - 1} SKUs into cache for aggregation")
+            tqdm.write(f"  ✓ Loaded {len(sku_metrics_store)} SKUs into cache for aggregation")
             tqdm.write(f"  ✓ Built normalized SKU index with {len(normalized_sku_index)} entries")
             
         except Exception as e:
@@ -1840,7 +2632,7 @@ class EcommerceAnalyticsOptimized:
             tqdm.write(f"  ⚠️ Warning: Could not load product reports from database")
             tqdm.write(f"     Error: {e}")
 
-    async def _load_listing_reports_into_cache(self, listing_metrics_store: Dict, periods: Dict):
+    async def _load_listing_reports_into_cache(self, listing_rollup_store: Dict, periods: Dict):
         """
         Load existing listing reports from database into cache for shop aggregation.
         This is MUCH faster than recalculating everything from scratch.
@@ -1860,8 +2652,6 @@ class EcommerceAnalyticsOptimized:
                 listing_id = report.listingId
                 
                 # Initialize listing in cache if not exists
-                if listing_id not in listing_metrics_store:
-                    listing_metrics_store[listing_id] = {}
                 
                 # Convert PeriodType to string (handle both enum and string)
                 if hasattr(report.periodType, 'value'):
@@ -1869,9 +2659,8 @@ class EcommerceAnalyticsOptimized:
                 else:
                     period_type = str(report.periodType).lower()  # Already string
                 
-                # Create period_key in same format as calculate_metrics_batch
-                period_key = f"{report.periodStart.strftime('%Y-%m-%d')}_to_{report.periodEnd.strftime('%Y-%m-%d')}"
-                full_key = f"{period_type}_{period_key}"
+                # Create cache key in same format as the generation phases
+                full_key = self._period_cache_key(period_type, report.periodStart, report.periodEnd)
                 
                 # Convert database record to metrics dict
                 metrics = {
@@ -1924,9 +2713,9 @@ class EcommerceAnalyticsOptimized:
                 }
                 
                 # Store in cache
-                listing_metrics_store[listing_id][full_key] = metrics
+                self._cache_listing_metrics(listing_rollup_store, listing_id, full_key, metrics)
             
-            tqdm.write(f"  ✓ Loaded {len(listing_metrics_store)} listings into cache for aggregation")
+            tqdm.write(f"  ✓ Loaded {len(self._rolled_up_listing_ids)} listings into cache for aggregation")
             
         except Exception as e:
             logger.error(f"Error loading listing reports into cache: {e}", exc_info=True)
@@ -1965,29 +2754,27 @@ class EcommerceAnalyticsOptimized:
             year_end = min(datetime(year, 12, 31, 23, 59, 59), end_date)
             periods["yearly"].append(DateRange(year_start, year_end))
         
-        # Monthly periods
-        current = datetime(start_date.year, start_date.month, 1)
-        while current <= end_date:
-            try:
-                next_month = current.month % 12 + 1
-                next_year = current.year + (1 if next_month == 1 else 0)
-                month_end = datetime(next_year, next_month, 1) - timedelta(seconds=1)
-                month_start = max(current, start_date)
-                month_end = min(month_end, end_date)
-                periods["monthly"].append(DateRange(month_start, month_end))
-                current = datetime(next_year, next_month, 1)
-            except Exception as e:
-                logger.error(f"Error generating monthly period: {e}")
-                break
+        # Period boundaries are generated in bulk with NumPy (naive wall-clock datetime64,
+        # same arithmetic as datetime) and clamped to [start_date, end_date]
+        start64 = np.datetime64(start_date, 'us')
+        end64 = np.datetime64(end_date, 'us')
+        one_second = np.timedelta64(1, 's')
         
-        # Weekly periods
-        current = start_date - timedelta(days=start_date.weekday())
-        while current <= end_date:
-            week_end = current + timedelta(days=6, hours=23, minutes=59, seconds=59)
-            week_start = max(current, start_date)
-            week_end = min(week_end, end_date)
+        # Monthly periods
+        month_starts = np.arange(np.datetime64(start_date, 'M'), np.datetime64(end_date, 'M') + 1)
+        month_ends = (month_starts + 1).astype('datetime64[us]') - one_second
+        month_starts = month_starts.astype('datetime64[us]')
+        for month_start, month_end in zip(np.maximum(month_starts, start64).tolist(),
+                                          np.minimum(month_ends, end64).tolist()):
+            periods["monthly"].append(DateRange(month_start, month_end))
+        
+        # Weekly periods (weeks start on Monday)
+        first_week = np.datetime64(start_date - timedelta(days=start_date.weekday()), 'us')
+        week_starts = np.arange(first_week, end64 + 1, np.timedelta64(7, 'D'))
+        week_ends = week_starts + np.timedelta64(7, 'D') - one_second
+        for week_start, week_end in zip(np.maximum(week_starts, start64).tolist(),
+                                        np.minimum(week_ends, end64).tolist()):
             periods["weekly"].append(DateRange(week_start, week_end))
-            current += timedelta(weeks=1)
             
         return periods
 
@@ -2024,8 +2811,39 @@ class EcommerceAnalyticsOptimized:
             logger.error(f"Error getting SKUs: {e}")
             return []
 
+    async def refresh_listings_view(self) -> bool:
+        """Refresh the optional listings_with_transactions view so get_all_listings sees new listings."""
+        try:
+            await self._ensure_connection()
+            await self.prisma.execute_raw("REFRESH MATERIALIZED VIEW CONCURRENTLY listings_with_transactions")
+            return True
+        except Exception as e:
+            logger.debug(f"Could not refresh listings_with_transactions (missing view?): {e}")
+            return False
+
     async def get_all_listings(self) -> List[int]:
         """Get all unique listing IDs that have transactions (using optimized raw SQL)."""
+        try:
+            # Prefer the optional listings_with_transactions materialized view
+            # (add_listings_with_transactions_view.sql): an index scan instead of a
+            # DISTINCT over the whole order_transactions table. Only trusted when it
+            # has seen the newest order; a stale or empty view falls through below
+            result = await self.prisma.query_raw(
+                """
+                SELECT listing_id
+                FROM listings_with_transactions
+                WHERE (SELECT MAX(last_seen_ts) FROM listings_with_transactions)
+                   >= (SELECT MAX(created_timestamp) FROM orders)
+                ORDER BY listing_id
+                """
+            )
+            listings = [row['listing_id'] for row in result if row.get('listing_id')]
+            if listings:
+                return listings
+            logger.warning("⚠️  listings_with_transactions is stale or empty, using DISTINCT query")
+        except Exception as e:
+            logger.debug(f"listings_with_transactions view not available, using DISTINCT query: {e}")
+        
         try:
             # Use raw SQL for better performance with distinct
             result = await self.prisma.query_raw(
@@ -2055,14 +2873,12 @@ class EcommerceAnalyticsOptimized:
         try:
             # Check cache first
             if listing_id in self._listing_to_products:
-                # Get SKUs from cached product IDs
+                # Get SKUs from cached product IDs (first mapped SKU per product)
                 skus = []
                 for product_id in self._listing_to_products[listing_id]:
-                    # Find SKU from reverse lookup
-                    for sku, prod_ids in self._sku_to_products.items():
-                        if product_id in prod_ids:
-                            skus.append(sku)
-                            break
+                    indices = self._product_to_sku_indices.get(product_id)
+                    if indices:
+                        skus.append(self._sku_names[indices[0]])
                 if skus:
                     return skus
             
@@ -2103,267 +2919,458 @@ class EcommerceAnalyticsOptimized:
         """
         ⚡ ULTRA-OPTIMIZED: Calculate metrics for multiple periods in ONE database query.
         Uses vectorized NumPy operations for maximum performance.
+        
+        Identical calls that overlap (e.g. sibling SKUs pricing their share of the
+        same listing's ad spend) share one running query; joiners get copies.
+        """
+        key = (tuple((dr.start_date, dr.end_date) for dr in date_ranges), period_type, listing_id, sku)
+        task = self._metrics_inflight.get(key)
+        joined = task is not None
+        if not joined:
+            task = asyncio.ensure_future(self._calculate_metrics_for_ranges(
+                date_ranges, [period_type] * len(date_ranges), listing_id=listing_id, sku=sku
+            ))
+            self._metrics_inflight[key] = task
+            task.add_done_callback(lambda _: self._metrics_inflight.pop(key, None))
+        
+        # Shielded so one cancelled caller doesn't cancel the query for the others
+        metrics_list = await asyncio.shield(task)
+        if joined:
+            metrics_list = [metrics.copy() for metrics in metrics_list]
+        return {
+            dr.period_key: metrics
+            for dr, metrics in zip(date_ranges, metrics_list)
+        }
+
+    async def calculate_metrics_for_periods(
+        self,
+        periods: Dict[str, List[DateRange]],
+        listing_id: Optional[int] = None,
+        sku: Optional[str] = None
+    ) -> Dict[str, Dict[str, Dict]]:
         """
+        Calculate metrics for every period type of one entity in ONE database query.
+        Returns {period_type: {period_key: metrics}}, same inner shape as calculate_metrics_batch.
+        """
+        flat = [(period_type, dr) for period_type, date_ranges in periods.items() for dr in date_ranges]
+        metrics_list = await self._calculate_metrics_for_ranges(
+            [dr for _, dr in flat], [period_type for period_type, _ in flat], listing_id=listing_id, sku=sku
+        )
+        all_metrics = {period_type: {} for period_type in periods}
+        for (period_type, dr), metrics in zip(flat, metrics_list):
+            period_key = dr.period_key
+            all_metrics[period_type][period_key] = metrics
+        return all_metrics
+
+    async def calculate_metrics_for_skus(
+        self,
+        skus: List[str],
+        periods: Dict[str, List[DateRange]]
+    ) -> Dict[str, Dict[str, Dict[str, Dict]]]:
+        """
+        Calculate metrics for many SKUs in ONE database query (instead of one query per SKU).
+        Returns {sku: {period_type: {period_key: metrics}}}, same per-SKU shape as calculate_metrics_for_periods.
+        """
+        flat = [(period_type, dr) for period_type, date_ranges in periods.items() for dr in date_ranges]
+        date_ranges = [dr for _, dr in flat]
+        period_types = [period_type for period_type, _ in flat]
+        results = {sku: {period_type: {} for period_type in periods} for sku in skus}
+        
+        # Map every product_id back to the SKUs it belongs to
+        skus_by_product = defaultdict(list)
+        for sku in skus:
+            for pid in self._sku_to_products.get(sku, []):
+                skus_by_product[pid].append(sku)
+        if not date_ranges or not skus_by_product:
+            return results  # Unknown SKUs: no periods at all
+        
+        raw_results = await self._fetch_metric_rows(
+            date_ranges, ("ot.product_id = ANY({}::bigint[])", list(skus_by_product)), with_product_ids=True
+        )
+        
+        # Split each order's transactions per SKU, mirroring the single-SKU query:
+        # an order belongs to a SKU if any of its products matched, and only
+        # matched transactions that carry a SKU are kept
+        rows_by_sku = defaultdict(list)
+        for row in raw_results:
+            txns_by_sku = defaultdict(list)
+            for txn in row['transactions']:
+                for sku in skus_by_product.get(txn.get('product_id'), ()):
+                    txns_by_sku[sku].append(txn)
+            for sku, txns in txns_by_sku.items():
+                rows_by_sku[sku].append({**row, 'transactions': [txn for txn in txns if txn.get('sku') is not None]})
+        
+        for sku in skus:
+            if not self._sku_to_products.get(sku):
+                continue
+            metrics_list = await self._metrics_from_raw_rows(rows_by_sku.get(sku, []), date_ranges, period_types, sku=sku)
+            for (period_type, dr), metrics in zip(flat, metrics_list):
+                period_key = dr.period_key
+                results[sku][period_type][period_key] = metrics
+        return results
+
+    async def _calculate_metrics_for_ranges(
+        self,
+        date_ranges: List[DateRange],
+        period_types: List[str],
+        listing_id: Optional[int] = None,
+        sku: Optional[str] = None
+    ) -> List[Dict]:
+        """Run the batch query for all date ranges and return metrics aligned with date_ranges."""
         try:
             if not date_ranges:
-                return {}
-            
-            # Ensure database connection is healthy before expensive query
-            await self._ensure_connection()
-            
-            # Build time range filter
-            time_conditions = []
-            for dr in date_ranges:
-                start_ts = int(dr.start_date.timestamp())
-                end_ts = int(dr.end_date.timestamp())
-                time_conditions.append(f"(o.created_timestamp BETWEEN {start_ts} AND {end_ts})")
-            
-            time_filter = " OR ".join(time_conditions)
+                return []
             
-            # Build entity filter
-            entity_filter = ""
+            # Build entity filter: (condition with a {} placeholder, bound parameter)
+            entity_filter = None
             if sku:
                 # For SKU: get all product_ids for this SKU
                 product_ids = self._sku_to_products.get(sku, [])
                 if not product_ids:
-                    return {}
-                product_ids_str = ','.join(str(pid) for pid in product_ids)
-                entity_filter = f"AND ot.product_id IN ({product_ids_str})"
+                    return []  # Unknown SKU: no periods at all
+                entity_filter = ("ot.product_id = ANY({}::bigint[])", [int(pid) for pid in product_ids])
             elif listing_id:
                 # For listing: get all product_ids that belong to this listing (child products)
                 product_ids = self._listing_to_products.get(listing_id, [])
                 if not product_ids:
                     # Fallback: if no products found, try filtering by listing_id directly
-                    entity_filter = f"AND ot.listing_id = {listing_id}"
+                    entity_filter = ("ot.listing_id = {}::bigint", int(listing_id))
                 else:
                     # Filter by all product_ids that belong to this listing
-                    product_ids_str = ','.join(str(pid) for pid in product_ids)
-                    entity_filter = f"AND ot.product_id IN ({product_ids_str})"
-            
-            # ONE MEGA-QUERY with optimized joins and aggregations
-            # Add query hints to help PostgreSQL optimizer
-            query = f"""
-                WITH order_data AS (
-                    SELECT 
-                        o.order_id,
-                        o.created_timestamp,
-                        o.grand_total,
-                        o.grand_total_currency_code,
-                        o.total_shipping_cost,
-                        o.total_tax_cost,
-                        o.total_vat_cost,
-                        o.discount_amt,
-                        o.gift_wrap_price,
-                        o.item_count,
-                        o.buyer_user_id,
-                        o.is_shipped,
-                        o.is_gift,
-                        o.status,
-                        o.payment_method,
-                        o.country
-                    FROM orders o
-                    WHERE ({time_filter})
-                    {f"AND EXISTS (SELECT 1 FROM order_transactions ot WHERE ot.order_id = o.order_id {entity_filter})" if entity_filter else ""}
-                ),
-                transaction_data AS (
-                    SELECT 
-                        ot.order_id,
-                        ot.sku,
-                        ot.quantity,
-                        ot.price,
-                        ot.listing_id
-                    FROM order_transactions ot
-                    INNER JOIN order_data od ON ot.order_id = od.order_id
-                    {f"WHERE {entity_filter[4:]}" if entity_filter else ""}
-                ),
-                refund_data AS (
-                    SELECT 
-                        r.order_id,
-                        SUM(r.amount) as refund_amount,
-                        COUNT(*) as refund_count
-                    FROM order_refunds r
-                    INNER JOIN order_data od ON r.order_id = od.order_id
-                    GROUP BY r.order_id
-                )
+                    entity_filter = ("ot.product_id = ANY({}::bigint[])", [int(pid) for pid in product_ids])
+            
+            raw_results = await self._fetch_metric_rows(date_ranges, entity_filter)
+            return await self._metrics_from_raw_rows(raw_results, date_ranges, period_types, sku, listing_id)
+            
+        except Exception as e:
+            self._log_error(f"Error in batch calculation: {e}", e)
+            # Return empty metrics for all periods on error
+            return [self._empty_metrics(sku=sku, listing_id=listing_id, date_range=dr) for dr in date_ranges]
+
+    async def _fetch_metric_rows(self, date_ranges: List[DateRange],
+                                 entity_filter: Optional[Tuple[str, object]] = None,
+                                 with_product_ids: bool = False) -> List[Dict]:
+        """
+        Run the orders mega-query for the union of date_ranges (with retries); [] on repeated timeouts.
+        
+        entity_filter is a (condition, value) pair such as ("ot.product_id = ANY({}::bigint[])", ids);
+        the {} is replaced by a bind placeholder, so the SQL text (and its plan) does not vary per entity.
+        """
+        # Ensure database connection is healthy before expensive query
+        await self._ensure_connection()
+        
+        # Build time range filter - merge overlapping/adjacent ranges first, since
+        # yearly, monthly and weekly periods of one entity cover the same timestamps
+        merged_ranges = []
+        for start_ts, end_ts in sorted((dr.start_ts, dr.end_ts) for dr in date_ranges):
+            if merged_ranges and start_ts <= merged_ranges[-1][1] + 1:
+                merged_ranges[-1][1] = max(merged_ranges[-1][1], end_ts)
+            else:
+                merged_ranges.append([start_ts, end_ts])
+        
+        # Bound parameters: $1/$2 are the overall window (index range scan); when the merged
+        # ranges leave gaps, $3/$4 carry them as arrays and an EXISTS over unnest() keeps only
+        # orders inside one of them
+        order_params = [merged_ranges[0][0], merged_ranges[-1][1]]
+        time_filter = "o.created_timestamp BETWEEN $1::bigint AND $2::bigint"
+        if len(merged_ranges) > 1:
+            order_params += [[start_ts for start_ts, _ in merged_ranges], [end_ts for _, end_ts in merged_ranges]]
+            time_filter += (
+                " AND EXISTS (SELECT 1 FROM unnest($3::bigint[], $4::bigint[]) AS periods(start_ts, end_ts)"
+                " WHERE o.created_timestamp BETWEEN periods.start_ts AND periods.end_ts)"
+            )
+        order_entity_filter = ""
+        if entity_filter:
+            order_params.append(entity_filter[1])
+            order_entity_filter = entity_filter[0].format(f'${len(order_params)}')
+        # Keyset pagination: (created_timestamp, order_id) of the last row of the previous page
+        key_ts_param, key_id_param = len(order_params) + 1, len(order_params) + 2
+        
+        # Entity filter as a pre-deduplicated order-id set joined to orders (hash join)
+        # instead of a correlated EXISTS probed per order
+        matching_orders_cte = f"""
+            matching_orders AS (
+                SELECT DISTINCT ot.order_id
+                FROM order_transactions ot
+                WHERE {order_entity_filter}
+            ),""" if entity_filter else ""
+        
+        # ONE MEGA-QUERY for orders (+ refunds), then one flat rowset for their transactions,
+        # fetched page by page so no single response holds every order of a large window
+        # Add query hints to help PostgreSQL optimizer
+        order_query = f"""
+            WITH {matching_orders_cte}
+            order_data AS (
                 SELECT 
-                    od.*,
-                    COALESCE(rd.refund_amount, 0) as refund_amount,
-                    COALESCE(rd.refund_count, 0) as refund_count,
-                    COALESCE(
-                        json_agg(
-                            json_build_object(
-                                'sku', td.sku,
-                                'quantity', td.quantity,
-                                'price', td.price,
-                                'listing_id', td.listing_id
-                            )
-                        ) FILTER (WHERE td.sku IS NOT NULL),
-                        '[]'::json
-                    ) as transactions
-                FROM order_data od
-                LEFT JOIN refund_data rd ON od.order_id = rd.order_id
-                LEFT JOIN transaction_data td ON od.order_id = td.order_id
-                GROUP BY od.order_id, od.created_timestamp, od.grand_total, od.grand_total_currency_code,
-                         od.total_shipping_cost, od.total_tax_cost, od.total_vat_cost, od.discount_amt,
-                         od.gift_wrap_price, od.item_count, od.buyer_user_id, od.is_shipped, od.is_gift,
-                         od.status, od.payment_method, od.country, rd.refund_amount, rd.refund_count
-            """
+                    o.order_id,
+                    o.created_timestamp,
+                    o.grand_total,
+                    o.grand_total_currency_code,
+                    o.total_shipping_cost,
+                    o.total_tax_cost,
+                    o.total_vat_cost,
+                    o.discount_amt,
+                    o.gift_wrap_price,
+                    o.item_count,
+                    o.buyer_user_id,
+                    o.is_shipped,
+                    o.is_gift,
+                    o.status,
+                    o.payment_method,
+                    o.country
+                FROM orders o
+                {"INNER JOIN matching_orders mo ON mo.order_id = o.order_id" if entity_filter else ""}
+                WHERE ({time_filter})
+                AND (o.created_timestamp, o.order_id) > (${key_ts_param}::bigint, ${key_id_param}::bigint)
+                ORDER BY o.created_timestamp, o.order_id
+                LIMIT {self._METRIC_PAGE_SIZE}
+            ),
+            refund_data AS (
+                SELECT 
+                    r.order_id,
+                    SUM(r.amount) as refund_amount,
+                    COUNT(*) as refund_count
+                FROM order_refunds r
+                INNER JOIN order_data od ON r.order_id = od.order_id
+                GROUP BY r.order_id
+            ),
+            currency_data AS (
+                SELECT array_agg(DISTINCT COALESCE(grand_total_currency_code, 'USD')) as currencies
+                FROM order_data
+            )
+            SELECT 
+                od.*,
+                cd.currencies,
+                COALESCE(rd.refund_amount, 0) as refund_amount,
+                COALESCE(rd.refund_count, 0) as refund_count
+            FROM order_data od
+            LEFT JOIN refund_data rd ON od.order_id = rd.order_id
+            CROSS JOIN currency_data cd
+            ORDER BY od.created_timestamp, od.order_id
+        """
+        
+        # Multi-entity queries keep product_id (and product rows without a SKU) so the
+        # caller can split each order's transactions per entity afterwards
+        product_id_field = ", ot.product_id" if with_product_ids else ""
+        sku_filter = "" if with_product_ids else "AND ot.sku IS NOT NULL"
+        txn_entity_filter = f"AND {entity_filter[0].format('$2')}" if entity_filter else ""
+        txn_query = f"""
+            SELECT ot.order_id, ot.sku, ot.quantity, ot.price, ot.listing_id{product_id_field}
+            FROM order_transactions ot
+            WHERE ot.order_id = ANY($1::bigint[])
+            {txn_entity_filter}
+            {sku_filter}
+        """
+        
+        raw_results = []
+        currencies = set()
+        last_key = (-1, -1)
+        while True:
+            page = await self._query_raw_with_retry(order_query, *order_params, *last_key)
+            if page is None:
+                return []  # Timed out: skip this batch
+            if not page:
+                break
             
-            # Execute the mega-query with retry logic for timeouts and connection errors
-            max_retries = 5
-            for attempt in range(max_retries):
-                try:
-                    # Ensure connection before each attempt
-                    await self._ensure_connection()
-                    raw_results = await self.prisma.query_raw(query)
-                    break  # Success, exit retry loop
-                except Exception as query_error:
-                    error_msg = str(query_error)
-                    error_type = type(query_error).__name__
+            # Cancelled orders only count towards cancellation metrics, so their line items are
+            # skipped; multi-entity fetches still need them to assign orders to entities
+            txn_params = [[int(row['order_id']) for row in page
+                           if with_product_ids or row['status'] not in ('cancelled', 'canceled')]]
+            if entity_filter:
+                txn_params.append(entity_filter[1])
+            txn_rows = await self._query_raw_with_retry(txn_query, *txn_params) if txn_params[0] else []
+            if txn_rows is None:
+                return []  # Timed out: skip the batch like a timed-out order query
+            transactions_by_order = defaultdict(list)
+            for txn in txn_rows:
+                transactions_by_order[txn.pop('order_id')].append(txn)
+            
+            currencies.update(page[0].get('currencies') or ())
+            for row in page:
+                row.pop('currencies', None)
+                row['transactions'] = transactions_by_order.get(row['order_id'], [])
+            raw_results.extend(page)
+            
+            if len(page) < self._METRIC_PAGE_SIZE:
+                break
+            last_key = (int(page[-1]['created_timestamp']), int(page[-1]['order_id']))
+        
+        # Distinct currencies across all pages (read by _calculate_metrics_from_rows)
+        for row in raw_results:
+            row['n_currencies'] = len(currencies)
+        return raw_results
+
+    async def _query_raw_with_retry(self, query: str, *args) -> Optional[List[Dict]]:
+        """Run a raw query with retry logic for timeouts and connection errors; None on repeated timeouts."""
+        max_retries = 5
+        for attempt in range(max_retries):
+            try:
+                # Ensure connection before each attempt
+                await self._ensure_connection()
+                return await self.prisma.query_raw(query, *args)
+            except Exception as query_error:
+                error_msg = str(query_error)
+                error_type = type(query_error).__name__
+                
+                # Check for connection errors (comprehensive detection)
+                is_connection_error = (
+                    # Prisma-specific errors
+                    "Can't reach database server" in error_msg or
+                    "ClientNotConnectedError" in error_type or
+                    "not connected" in error_msg.lower() or
+                    "already connected" in error_msg.lower() or
                     
-                    # Check for connection errors (comprehensive detection)
-                    is_connection_error = (
-                        # Prisma-specific errors
-                        "Can't reach database server" in error_msg or
-                        "ClientNotConnectedError" in error_type or
-                        "not connected" in error_msg.lower() or
-                        "already connected" in error_msg.lower() or
-                        
-                        # PostgreSQL errors
-                        "Connection" in error_msg or
-                        "Closed" in error_msg or
-                        "connection refused" in error_msg.lower() or
-                        "connection reset" in error_msg.lower() or
-                        "connection timed out" in error_msg.lower() or
-                        "connection lost" in error_msg.lower() or
-                        "connection aborted" in error_msg.lower() or
-                        "connection closed" in error_msg.lower() or
-                        "broken pipe" in error_msg.lower() or
+                    # PostgreSQL errors
+                    "Connection" in error_msg or
+                    "Closed" in error_msg or
+                    "connection refused" in error_msg.lower() or
+                    "connection reset" in error_msg.lower() or
+                    "connection timed out" in error_msg.lower() or
+                    "connection lost" in error_msg.lower() or
+                    "connection aborted" in error_msg.lower() or
+                    "connection closed" in error_msg.lower() or
+                    "broken pipe" in error_msg.lower() or
+                    
+                    # Network errors
+                    "ConnectError" in error_type or  # httpcore.ConnectError
+                    "NetworkError" in error_type or
+                    "TimeoutError" in error_type or
+                    "OSError" in error_type or
+                    "socket" in error_msg.lower() or
+                    "All connection attempts failed" in error_msg or
+                    
+                    # Server errors
+                    "server closed the connection" in error_msg.lower() or
+                    "server is not responding" in error_msg.lower() or
+                    "too many connections" in error_msg.lower() or
+                    "pool exhausted" in error_msg.lower() or
+                    
+                    # SSL/TLS errors
+                    "ssl" in error_msg.lower() or
+                    "tls" in error_msg.lower() or
+                    "certificate" in error_msg.lower()
+                )
+                
+                if is_connection_error:
+                    if attempt < max_retries - 1:
+                        logger.warning(
+                            f"Database connection error: {error_type} (attempt {attempt + 1}/{max_retries}), "
+                            f"reconnecting in {2 ** attempt}s..."
+                        )
+                        await asyncio.sleep(2 ** attempt)  # Exponential backoff: 1s, 2s, 4s, 8s, 16s
                         
-                        # Network errors
-                        "ConnectError" in error_type or  # httpcore.ConnectError
-                        "NetworkError" in error_type or
-                        "TimeoutError" in error_type or
-                        "OSError" in error_type or
-                        "socket" in error_msg.lower() or
-                        "All connection attempts failed" in error_msg or
+                        # Force reconnection
+                        try:
+                            # First, disconnect if currently connected
+                            if self.prisma.is_connected():
+                                await self.prisma.disconnect()
+                                logger.debug("Disconnected stale connection")
+                        except Exception as disconnect_error:
+                            logger.debug(f"Error during disconnect: {disconnect_error}")
                         
-                        # Server errors
-                        "server closed the connection" in error_msg.lower() or
-                        "server is not responding" in error_msg.lower() or
-                        "too many connections" in error_msg.lower() or
-                        "pool exhausted" in error_msg.lower() or
+                        # Now reconnect (only if not already connected)
+                        try:
+                            if not self.prisma.is_connected():
+                                await self.prisma.connect()
+                                await self.prisma.execute_raw("SET statement_timeout = '300000'")
+                                self._last_connection_check = 0  # Reset check timestamp
+                                logger.info("✓ Reconnected to database")
+                            else:
+                                logger.debug("Connection already established, skipping reconnect")
+                        except Exception as reconnect_error:
+                            logger.error(f"Reconnection failed: {reconnect_error}")
                         
-                        # SSL/TLS errors
-                        "ssl" in error_msg.lower() or
-                        "tls" in error_msg.lower() or
-                        "certificate" in error_msg.lower()
-                    )
-                    
-                    if is_connection_error:
-                        if attempt < max_retries - 1:
-                            logger.warning(
-                                f"Database connection error: {error_type} (attempt {attempt + 1}/{max_retries}), "
-                                f"reconnecting in {2 ** attempt}s..."
-                            )
-                            await asyncio.sleep(2 ** attempt)  # Exponential backoff: 1s, 2s, 4s, 8s, 16s
-                            
-                            # Force reconnection
-                            try:
-                                # First, disconnect if currently connected
-                                if self.prisma.is_connected():
-                                    await self.prisma.disconnect()
-                                    logger.debug("Disconnected stale connection")
-                            except Exception as disconnect_error:
-                                logger.debug(f"Error during disconnect: {disconnect_error}")
-                            
-                            # Now reconnect (only if not already connected)
-                            try:
-                                if not self.prisma.is_connected():
-                                    await self.prisma.connect()
-                                    await self.prisma.execute_raw("SET statement_timeout = '300000'")
-                                    self._last_connection_check = 0  # Reset check timestamp
-                                    logger.info("✓ Reconnected to database")
-                                else:
-                                    logger.debug("Connection already established, skipping reconnect")
-                            except Exception as reconnect_error:
-                                logger.error(f"Reconnection failed: {reconnect_error}")
-                            
-                            continue
-                        else:
-                            logger.error(f"Database connection failed after {max_retries} attempts")
-                            raise
-                    
-                    # Check for timeouts
-                    elif "statement timeout" in error_msg.lower():
-                        if attempt < max_retries - 1:
-                            logger.warning(f"Query timeout (attempt {attempt + 1}/{max_retries}), retrying...")
-                            await asyncio.sleep(1)
-                            continue
-                        else:
-                            logger.error(f"Query timed out after {max_retries} attempts. Skipping this batch.")
-                            empty_results = {}
-                            for dr in date_ranges:
-                                period_key = f"{dr.start_date.strftime('%Y-%m-%d')}_to_{dr.end_date.strftime('%Y-%m-%d')}"
-                                empty_results[period_key] = await self._empty_metrics(sku=sku, listing_id=listing_id, date_range=dr)
-                            return empty_results
+                        continue
                     else:
-                        logger.error(f"SQL Query failed: {query_error}")
-                        logger.error(f"Query was: {query[:500]}...")  # Log first 500 chars of query
-                        raise  # Re-raise to be caught by outer exception handler
-            
-            if not raw_results:
-                # Return empty metrics for all periods
-                empty_results = {}
-                for dr in date_ranges:
-                    period_key = f"{dr.start_date.strftime('%Y-%m-%d')}_to_{dr.end_date.strftime('%Y-%m-%d')}"
-                    empty_results[period_key] = await self._empty_metrics(sku=sku, listing_id=listing_id, date_range=dr)
-                return empty_results
-            
-            # Group results by period using vectorized operations
-            period_results = {}
-            period_keys = {}
-            
-            # Create period key mapping
-            for dr in date_ranges:
-                period_key = f"{dr.start_date.strftime('%Y-%m-%d')}_to_{dr.end_date.strftime('%Y-%m-%d')}"
-                period_results[period_key] = []
-                period_keys[period_key] = dr
-            
-            # Convert to numpy for fast filtering
-            timestamps = np.array([row['created_timestamp'] for row in raw_results])
-            
-            for period_key, dr in period_keys.items():
-                start_ts = int(dr.start_date.timestamp())
-                end_ts = int(dr.end_date.timestamp())
-                mask = (timestamps >= start_ts) & (timestamps <= end_ts)
-                indices = np.where(mask)[0]
-                period_results[period_key] = [raw_results[i] for i in indices]
-            
-            # Calculate metrics for each period in parallel
-            tasks = []
-            ordered_keys = []
-            for period_key, rows in period_results.items():
-                dr = period_keys[period_key]
-                tasks.append(self._calculate_metrics_from_rows(rows, dr, period_type, sku, listing_id))
-                ordered_keys.append(period_key)
-            
-            results = await asyncio.gather(*tasks)
-            
-            all_metrics = {}
-            for period_key, metrics in zip(ordered_keys, results):
-                all_metrics[period_key] = metrics
-            
-            return all_metrics
-            
-        except Exception as e:
-            logger.error(f"Error in batch calculation: {e}", exc_info=True)
-            # Return empty metrics for all periods on error
-            empty_results = {}
-            for dr in date_ranges:
-                period_key = f"{dr.start_date.strftime('%Y-%m-%d')}_to_{dr.end_date.strftime('%Y-%m-%d')}"
-                empty_results[period_key] = await self._empty_metrics(sku=sku, listing_id=listing_id, date_range=dr)
-            return empty_results
+                        logger.error(f"Database connection failed after {max_retries} attempts")
+                        raise
+                
+                # Check for timeouts
+                elif "statement timeout" in error_msg.lower():
+                    if attempt < max_retries - 1:
+                        logger.warning(f"Query timeout (attempt {attempt + 1}/{max_retries}), retrying...")
+                        await asyncio.sleep(1)
+                        continue
+                    else:
+                        logger.error(f"Query timed out after {max_retries} attempts. Skipping this batch.")
+                        return None
+                else:
+                    logger.error(f"SQL Query failed: {query_error}")
+                    logger.error(f"Query was: {query[:500]}...")  # Log first 500 chars of query
+                    raise  # Re-raise to be caught by outer exception handler
+
+    async def _metrics_from_raw_rows(
+        self,
+        raw_results: List[Dict],
+        date_ranges: List[DateRange],
+        period_types: List[str],
+        sku: Optional[str] = None,
+        listing_id: Optional[int] = None
+    ) -> List[Dict]:
+        """Bucket mega-query rows into date_ranges and calculate each period's metrics."""
+        if not raw_results:
+            # Return empty metrics for all periods
+            return [self._empty_metrics(sku=sku, listing_id=listing_id, date_range=dr) for dr in date_ranges]
+        
+        # Rows arrive ordered by timestamp from _fetch_metric_rows (sort defensively if not),
+        # then bucket every period with a binary search
+        # (one searchsorted per bound instead of a boolean mask per period)
+        timestamps = np.fromiter((row['created_timestamp'] for row in raw_results),
+                                 dtype=np.int64, count=len(raw_results))
+        if np.all(timestamps[1:] >= timestamps[:-1]):
+            sorted_rows = raw_results
+        else:
+            order = np.argsort(timestamps, kind='stable')
+            timestamps = timestamps[order]
+            sorted_rows = [raw_results[i] for i in order]
+        
+        starts = np.fromiter((dr.start_ts for dr in date_ranges), dtype=np.int64, count=len(date_ranges))
+        ends = np.fromiter((dr.end_ts for dr in date_ranges), dtype=np.int64, count=len(date_ranges))
+        lo = np.searchsorted(timestamps, starts, side='left')
+        hi = np.searchsorted(timestamps, ends, side='right')
+        
+        # Each row falls in one period of every type (yearly, monthly, weekly), so its
+        # numeric fields are projected once here and each period gets a slice
+        row_fields = self._project_order_fields(sorted_rows)
+        
+        # Periods without orders are filled synchronously; only periods with rows
+        # (which may still await ad spend / cost fallbacks) are scheduled as coroutines
+        results = [None] * len(date_ranges)
+        pending = []
+        for i, (dr, period_type, left, right) in enumerate(zip(date_ranges, period_types, lo.tolist(), hi.tolist())):
+            if left == right:
+                results[i] = self._empty_metrics(sku=sku, listing_id=listing_id, date_range=dr)
+            else:
+                pending.append((i, self._calculate_metrics_from_rows(
+                    sorted_rows[left:right], dr, period_type, sku, listing_id, row_fields[left:right]
+                )))
+        if pending:
+            for (i, _), metrics in zip(pending, await asyncio.gather(*(coro for _, coro in pending))):
+                results[i] = metrics
+        return results
+
+    def _project_order_fields(self, rows: List[Dict]) -> np.ndarray:
+        """
+        Project order rows into an (n_rows, 12) float array, one column per field:
+        grand_total, shipping, tax, vat, discount, gift_wrap, refund_amount,
+        item_count, refund_count, created_timestamp, is_shipped, is_gift.
+        """
+        return np.fromiter(
+            ((float(row.get('grand_total') or 0),
+              float(row.get('total_shipping_cost') or 0),
+              float(row.get('total_tax_cost') or 0),
+              float(row.get('total_vat_cost') or 0),
+              float(row.get('discount_amt') or 0),
+              float(row.get('gift_wrap_price') or 0),
+              float(row.get('refund_amount') or 0),
+              int(row.get('item_count') or 0),
+              int(row.get('refund_count') or 0),
+              row['created_timestamp'],
+              bool(row.get('is_shipped', False)),
+              bool(row.get('is_gift', False)))
+             for row in rows),
+            dtype=np.dtype((np.float64, 12)), count=len(rows)
+        )
 
     async def _calculate_metrics_from_rows(
         self, 
@@ -2371,57 +3378,60 @@ class EcommerceAnalyticsOptimized:
         date_range: DateRange,
         period_type: str = "monthly",
         sku: Optional[str] = None,
-        listing_id: Optional[int] = None
+        listing_id: Optional[int] = None,
+        row_fields: Optional[np.ndarray] = None
     ) -> Dict:
-        """⚡ Calculate metrics from pre-fetched raw data rows using vectorized operations."""
+        """
+        ⚡ Calculate metrics from pre-fetched raw data rows using vectorized operations.
+        
+        row_fields is the rows' _project_order_fields array when the caller already
+        built it (shared across overlapping periods); otherwise it is built here.
+        """
         if not rows:
-            return await self._empty_metrics(sku=sku, listing_id=listing_id, date_range=date_range)
+            return self._empty_metrics(sku=sku, listing_id=listing_id, date_range=date_range)
         
-        # Extract order-level data using list comprehensions (fast)
-        orders_dict = {}
-        for row in rows:
+        # Project completed orders straight into columns (struct-of-arrays): the row
+        # index of each order for the numeric array below, and only the few per-order
+        # objects the later loops read. Cancelled orders are only counted (their line
+        # items, totals and customers never enter the metrics)
+        cancelled_statuses = {'cancelled', 'canceled'}
+        seen_order_ids = set()
+        cancelled_order_ids = set()
+        order_rows = []
+        order_ids = []
+        order_buyer_ids = []
+        order_payment_methods = []
+        order_countries = []
+        order_transactions = []
+        for row_idx, row in enumerate(rows):
             order_id = row['order_id']
-            if order_id not in orders_dict:
-                # Parse transactions JSON
-                transactions = row.get('transactions', [])
-                if isinstance(transactions, str):
-                    transactions = json.loads(transactions)
-                
-                orders_dict[order_id] = {
-                    'grand_total': float(row.get('grand_total') or 0),
-                    'shipping': float(row.get('total_shipping_cost') or 0),
-                    'tax': float(row.get('total_tax_cost') or 0),
-                    'vat': float(row.get('total_vat_cost') or 0),
-                    'discount': float(row.get('discount_amt') or 0),
-                    'gift_wrap': float(row.get('gift_wrap_price') or 0),
-                    'item_count': int(row.get('item_count') or 0),
-                    'buyer_id': row.get('buyer_user_id'),
-                    'is_shipped': row.get('is_shipped', False),
-                    'is_gift': row.get('is_gift', False),
-                    'status': row.get('status'),
-                    'payment_method': row.get('payment_method'),
-                    'refund_amount': float(row.get('refund_amount') or 0),
-                    'refund_count': int(row.get('refund_count') or 0),
-                    'created_timestamp': row['created_timestamp'],
-                    'country': row.get('country'),
-                    'transactions': [t for t in transactions if t]
-                }
-        
-        orders = list(orders_dict.values())
+            if order_id in seen_order_ids or order_id in cancelled_order_ids:
+                continue
+            if row.get('status') in cancelled_statuses:
+                cancelled_order_ids.add(order_id)
+                continue
+            
+            seen_order_ids.add(order_id)
+            order_rows.append(row_idx)
+            order_ids.append(order_id)
+            order_buyer_ids.append(row.get('buyer_user_id') or 0)
+            order_payment_methods.append(row.get('payment_method'))
+            order_countries.append(row.get('country'))
+            order_transactions.append([t for t in row.get('transactions', []) if t])
         
-        # Vectorized filtering
-        cancelled_statuses = {'cancelled', 'canceled'}
-        completed_orders = [o for o in orders if o['status'] not in cancelled_statuses]
+        total_orders = len(order_rows)
+        all_order_count = total_orders + len(cancelled_order_ids)
         
-        if not completed_orders:
-            return await self._empty_metrics(sku=sku, listing_id=listing_id, date_range=date_range)
+        if not order_rows:
+            return self._empty_metrics(sku=sku, listing_id=listing_id, date_range=date_range)
         
         # ===== CURRENCY VALIDATION (CRITICAL FOR ACCURACY) =====
-        # Check if all orders are in the same currency
+        # Check if all orders are in the same currency. The query counts distinct currencies
+        # over everything it fetched, so the per-period scan only runs when that count is > 1
         currencies_in_orders = set()
-        for row in rows:
-            currency = row.get('grand_total_currency_code') or 'USD'
-            currencies_in_orders.add(currency)
+        n_currencies = rows[0].get('n_currencies')
+        if n_currencies is None or int(n_currencies) > 1:
+            currencies_in_orders = {row.get('grand_total_currency_code') or 'USD' for row in rows}
         
         if len(currencies_in_orders) > 1:
             period_key = f"{date_range.start_date}_{date_range.end_date}"
@@ -2431,26 +3441,30 @@ class EcommerceAnalyticsOptimized:
                 logger.error(f"⚠️⚠️⚠️ Financial calculations will be INACCURATE without currency conversion!")
                 logger.error(f"⚠️⚠️⚠️ Period: {date_range.start_date} to {date_range.end_date}")
         
-        # Use NumPy for fast aggregations
-        grand_totals = np.array([o['grand_total'] for o in completed_orders])
-        shipping_costs = np.array([o['shipping'] for o in completed_orders])
-        tax_costs = np.array([o['tax'] for o in completed_orders])
-        vat_costs = np.array([o['vat'] for o in completed_orders])
-        discounts = np.array([o['discount'] for o in completed_orders])
-        gift_wraps = np.array([o['gift_wrap'] for o in completed_orders])
-        item_counts = np.array([o['item_count'] for o in completed_orders])
+        # Use NumPy for fast aggregations: one (n_orders, 12) array of the completed
+        # orders (see _project_order_fields for the columns), then one view per field
+        if row_fields is None:
+            order_fields = self._project_order_fields([rows[i] for i in order_rows])
+        elif total_orders == len(rows):
+            order_fields = row_fields
+        else:
+            order_fields = row_fields[order_rows]
+        grand_totals = order_fields[:, 0]
+        refund_counts = order_fields[:, 8]
+        order_timestamps = order_fields[:, 9].astype(np.int64)
+        
+        # Every per-order total in one streaming pass over the array (column sums)
+        (gross_revenue, total_shipping_charged, total_tax_collected, total_vat_collected,
+         total_discounts_given, total_gift_wrap_revenue, total_refund_amount,
+         total_items, total_refund_count, _, shipped_count, gift_order_count) = order_fields.sum(axis=0).tolist()
+        total_items, total_refund_count = int(total_items), int(total_refund_count)
+        shipped_count, gift_order_count = int(shipped_count), int(gift_order_count)
         
         # ===== CORRECTED ETSY FINANCIAL CALCULATIONS =====
         
-        # 1. GROSS REVENUE (what buyers paid)
-        gross_revenue = float(np.sum(grand_totals))
-        
-        # 2. REVENUE COMPONENTS (already included in grand_total)
-        total_shipping_charged = float(np.sum(shipping_costs))
-        total_tax_collected = float(np.sum(tax_costs))
-        total_vat_collected = float(np.sum(vat_costs))
-        total_discounts_given = float(np.sum(discounts))
-        total_gift_wrap_revenue = float(np.sum(gift_wraps))
+        # 1. GROSS REVENUE (what buyers paid): gross_revenue
+        # 2. REVENUE COMPONENTS (already included in grand_total): total_shipping_charged,
+        #    total_tax_collected, total_vat_collected, total_discounts_given, total_gift_wrap_revenue
         
         # 3. CALCULATE ETSY FEES (these are NOT in the database, so we estimate)
         # Note: grand_total = subtotal + shipping + tax + vat + gift_wrap - discounts
@@ -2462,7 +3476,7 @@ class EcommerceAnalyticsOptimized:
         
         # Etsy Payment Processing Fee: 3% + $0.25 per order
         etsy_processing_fees = (taxable_amount * self.etsy_processing_fee_rate) + \
-                               (len(completed_orders) * self.etsy_processing_fee_fixed)
+                               (total_orders * self.etsy_processing_fee_fixed)
         
         # Total Etsy fees
         total_etsy_fees = etsy_transaction_fees + etsy_processing_fees
@@ -2476,9 +3490,6 @@ class EcommerceAnalyticsOptimized:
         product_revenue = net_revenue_from_sales - total_shipping_charged - total_gift_wrap_revenue
         
         # Cost calculation with NEW fallback strategy and tracking
-        total_cost = 0.0
-        total_quantity_sold = 0
-        total_quantity_with_cost = 0  # Track items that have known costs
         unique_skus = set()
         
         # Track cost data sources for reporting
@@ -2489,27 +3500,27 @@ class EcommerceAnalyticsOptimized:
             "missing": 0
         }
         
-        # Pre-compute costs for all year-month combinations in this period
-        year_month_set = {(date_range.start_date.year, date_range.start_date.month)}
-        if date_range.end_date.year != date_range.start_date.year or date_range.end_date.month != date_range.start_date.month:
-            current = date_range.start_date
-            while current <= date_range.end_date:
-                year_month_set.add((current.year, current.month))
-                if current.month == 12:
-                    current = datetime(current.year + 1, 1, 1)
-                else:
-                    current = datetime(current.year, current.month + 1, 1)
-        
-        for order in completed_orders:
-            order_date = datetime.fromtimestamp(order['created_timestamp'])
-            year, month = order_date.year, order_date.month
-            
-            for txn in order['transactions']:
+        # Flatten line items into parallel arrays, keyed by distinct (sku, year, month, listing)
+        # so each cost is resolved once and the totals become one vectorized multiply/sum
+        # Year/month of every order from one searchsorted against the period's local
+        # month starts, instead of a datetime.fromtimestamp per order
+        period_months = []
+        current = datetime(date_range.start_date.year, date_range.start_date.month, 1)
+        while current <= date_range.end_date:
+            period_months.append((current.year, current.month, int(current.timestamp())))
+            current = datetime(current.year + current.month // 12, current.month % 12 + 1, 1)
+        month_start_ts = np.array([ts for _, _, ts in period_months], dtype=np.int64)
+        order_month_idx = np.maximum(np.searchsorted(month_start_ts, order_timestamps, side='right') - 1, 0)
+        
+        cost_keys = {}
+        txn_key_idx = []
+        txn_quantities = []
+        for transactions, month_idx in zip(order_transactions, order_month_idx.tolist()):
+            year, month, _ = period_months[month_idx]
+            
+            for txn in transactions:
                 if not txn or not txn.get('sku'):
                     continue
-                    
-                sku_val = txn['sku']
-                quantity = int(txn.get('quantity', 0))
                 
                 # Determine listing_id for fallback strategy
                 # If we're calculating SKU-level metrics, we need to find the listing for this SKU
@@ -2518,38 +3529,52 @@ class EcommerceAnalyticsOptimized:
                     # For SKU reports, try to get listing_id from transaction data or lookup
                     txn_listing_id = txn.get('listing_id')  # Transactions have listing_id
                 
-                # Use NEW smart cost lookup with fallback
-                cost, source = await self.get_cost_with_fallback(sku_val, year, month, txn_listing_id)
-                
-                # Log warning for missing cost data (periodically to avoid spam)
-                if cost == 0:
-                    warning_key = f"{sku_val}_{year}_{month}"
-                    if warning_key not in self._cost_fallback_warnings_shown:
-                        self._cost_fallback_warnings_shown.add(warning_key)
-                        # Log every 10th missing cost to avoid spam
-                        if len(self._cost_fallback_warnings_shown) % 10 == 1:
-                            logger.warning(
-                                f"⚠️ No cost found for SKU '{sku_val}' ({year}-{month:02d}). "
-                                f"This will result in 0 total_cost for reports. "
-                                f"Please add cost data to cost.csv for this SKU."
-                            )
-                
-                # Track cost source (local)
-                cost_sources[source] += quantity
-                
-                # Track cost source (global statistics)
-                self._cost_fallback_stats[source] += quantity
-                
-                if cost > 0:  # Only count items with valid cost data
-                    total_cost += cost * quantity
-                    total_quantity_with_cost += quantity
-                
-                total_quantity_sold += quantity
-                
-                # Use proper normalization for consistent SKU tracking
-                normalized_sku = self._normalize_sku_for_comparison(sku_val)
-                if normalized_sku:  # Only add if normalization succeeded
-                    unique_skus.add(normalized_sku)
+                txn_key_idx.append(cost_keys.setdefault((txn['sku'], year, month, txn_listing_id), len(cost_keys)))
+                txn_quantities.append(int(txn.get('quantity', 0)))
+        
+        key_costs = np.zeros(len(cost_keys), dtype=np.float64)
+        key_sources = []
+        for i, (sku_val, year, month, txn_listing_id) in enumerate(cost_keys):
+            # Use NEW smart cost lookup with fallback
+            cost, source = await self.get_cost_with_fallback(sku_val, year, month, txn_listing_id)
+            
+            # Log warning for missing cost data (periodically to avoid spam)
+            if cost == 0:
+                warning_key = f"{sku_val}_{year}_{month}"
+                if warning_key not in self._cost_fallback_warnings_shown:
+                    self._cost_fallback_warnings_shown.add(warning_key)
+                    # Log every 10th missing cost to avoid spam
+                    if len(self._cost_fallback_warnings_shown) % 10 == 1:
+                        logger.warning(
+                            f"⚠️ No cost found for SKU '{sku_val}' ({year}-{month:02d}). "
+                            f"This will result in 0 total_cost for reports. "
+                            f"Please add cost data to cost.csv for this SKU."
+                        )
+            
+            key_costs[i] = cost
+            key_sources.append(source)
+        
+        # Quantity per cost key, then every total in one vectorized pass
+        quantity_by_key = np.bincount(
+            np.array(txn_key_idx, dtype=np.int64),
+            weights=np.array(txn_quantities, dtype=np.float64),
+            minlength=len(cost_keys)
+        )
+        has_cost = key_costs > 0  # Only count items with valid cost data
+        total_cost = float(np.dot(key_costs[has_cost], quantity_by_key[has_cost]))
+        total_quantity_with_cost = int(quantity_by_key[has_cost].sum())
+        total_quantity_sold = int(quantity_by_key.sum())
+        
+        for source, quantity in zip(key_sources, quantity_by_key.tolist()):
+            # Track cost source (local and global statistics)
+            cost_sources[source] += int(quantity)
+            self._cost_fallback_stats[source] += int(quantity)
+        
+        # Use proper normalization for consistent SKU tracking
+        for sku_val in {key[0] for key in cost_keys}:
+            normalized_sku = self._normalize_sku_for_comparison(sku_val)
+            if normalized_sku:  # Only add if normalization succeeded
+                unique_skus.add(normalized_sku)
         
         # Determine if we have complete cost data
         has_complete_cost_data = (total_quantity_sold > 0 and total_quantity_with_cost == total_quantity_sold)
@@ -2585,65 +3610,88 @@ class EcommerceAnalyticsOptimized:
         total_us_import_tax = 0.0   # US import taxes (COST to us)
         total_fedex_processing_fee = 0.0
         
-        for order in completed_orders:
-            order_country = order.get('country', 'US')
+        # Line items are flattened into arrays and priced in bulk after the loop:
+        # international items in one vectorized FedEx lookup, US items with one
+        # vectorized pass over their per-SKU FedEx/duty/tax table
+        intl_weights = []
+        intl_zones = []
+        us_sku_idx = []
+        us_quantities = []
+        us_prices = []
+        # Per-period lookup tables: each distinct SKU and country is resolved once,
+        # not once per line item
+        weight_by_sku = {
+            txn['sku']: self.get_desi_for_sku(txn['sku'])
+            for transactions in order_transactions for txn in transactions if txn.get('sku')
+        }
+        us_row_by_sku = {}
+        us_cost_rows = []
+        zone_by_country = {}
+        for order_country, transactions in zip(order_countries, order_transactions):
+            is_us_order = bool(order_country) and order_country.upper() in ('US', 'USA', 'UNITED STATES')
             
             # Calculate actual FedEx shipping costs for this order
             # IMPORTANT: We process each transaction (line item) separately because:
             # 1. Each SKU may have different weight (desi)
             # 2. Each SKU may have different duty/tax rates
             # 3. Total shipping cost = sum of all items' shipping costs
-            for txn in order['transactions']:
+            for txn in transactions:
                 if not txn or not txn.get('sku'):
                     continue
                 
                 sku_val = txn['sku']
                 quantity = int(txn.get('quantity', 0))
-                item_price = float(txn.get('price', 0))  # Price per unit in this order
-                
-                # Get product weight (desi) - this is weight per unit
-                weight_per_item = self.get_desi_for_sku(sku_val)
-                total_weight = weight_per_item * quantity  # Total weight for all units of this SKU
                 
                 # Check if this is a US order
-                if order_country and order_country.upper() in ['US', 'USA', 'UNITED STATES']:
+                if is_us_order:
                     # US orders: Use special US pricing with duties/taxes
-                    us_costs = self.get_us_shipping_costs(sku_val)
-                    
-                    # FedEx charges are per-item in the CSV, multiply by quantity
-                    total_actual_shipping_cost += us_costs['fedex_charge'] * quantity
-                    total_fedex_processing_fee += us_costs['processing_fee'] * quantity
-                    
-                    # Duty and tax calculations
-                    # IMPORTANT: The CSV may contain either:
-                    # 1. Pre-calculated amounts (already per unit) - just multiply by quantity
-                    # 2. Rates (as decimals) - calculate from item_price
-                    
-                    # Calculate based on the actual item price in this order
-                    # This is more accurate because prices can vary between orders
-                    invoice_price_per_item = item_price
-                    
-                    # Use rates to calculate (more accurate for variable pricing)
-                    if us_costs['duty_rate'] > 0:
-                        duty_per_item = invoice_price_per_item * us_costs['duty_rate']
-                        total_us_import_duty += duty_per_item * quantity
-                    elif us_costs['duty_amount'] > 0:
-                        # Fallback: use pre-calculated amount if rate is not available
-                        total_us_import_duty += us_costs['duty_amount'] * quantity
-                    
-                    if us_costs['tax_rate'] > 0:
-                        tax_per_item = invoice_price_per_item * us_costs['tax_rate']
-                        total_us_import_tax += tax_per_item * quantity
-                    elif us_costs['tax_amount'] > 0:
-                        # Fallback: use pre-calculated amount if rate is not available
-                        total_us_import_tax += us_costs['tax_amount'] * quantity
+                    us_row = us_row_by_sku.get(sku_val)
+                    if us_row is None:
+                        us_costs = self.get_us_shipping_costs(sku_val)
+                        us_row = us_row_by_sku[sku_val] = len(us_cost_rows)
+                        us_cost_rows.append((
+                            us_costs['fedex_charge'], us_costs['processing_fee'],
+                            us_costs['duty_rate'], us_costs['duty_amount'],
+                            us_costs['tax_rate'], us_costs['tax_amount'],
+                        ))
+                    us_sku_idx.append(us_row)
+                    us_quantities.append(quantity)
+                    us_prices.append(float(txn.get('price', 0)))  # Price per unit in this order
                 else:
                     # International orders: Use zone-based FedEx pricing
-                    # Get the FedEx zone for this country
-                    zone = self.get_zone_for_country(order_country or 'US')
-                    # Get price for total weight of all items
-                    fedex_price = self.get_fedex_price(total_weight, zone)
-                    total_actual_shipping_cost += fedex_price
+                    # Get the FedEx zone for this country; price the total weight of all items below
+                    country_key = order_country or 'US'
+                    zone = zone_by_country.get(country_key)
+                    if zone is None:
+                        zone = zone_by_country[country_key] = self.get_zone_for_country(country_key)
+                    # Product weight (desi) is per unit: total weight for all units of this SKU
+                    intl_weights.append(weight_by_sku[sku_val] * quantity)
+                    intl_zones.append(zone)
+        
+        if intl_weights:
+            total_actual_shipping_cost += float(self.get_fedex_prices(intl_weights, intl_zones).sum())
+        
+        if us_sku_idx:
+            (fedex_charges, processing_fees, duty_rates, duty_amounts,
+             tax_rates, tax_amounts) = np.array(us_cost_rows, dtype=np.float64)[us_sku_idx].T
+            quantities = np.array(us_quantities, dtype=np.float64)
+            invoice_prices = np.array(us_prices, dtype=np.float64)
+            
+            # FedEx charges are per-item in the CSV, multiply by quantity
+            total_actual_shipping_cost += float(np.dot(fedex_charges, quantities))
+            total_fedex_processing_fee += float(np.dot(processing_fees, quantities))
+            
+            # Duty and tax calculations
+            # IMPORTANT: The CSV may contain either:
+            # 1. Pre-calculated amounts (already per unit) - just multiply by quantity
+            # 2. Rates (as decimals) - calculate from the actual item price in this order
+            # Rates win when present (more accurate for variable pricing); amounts are the fallback
+            duty_per_item = np.where(duty_rates > 0, invoice_prices * duty_rates,
+                                     np.where(duty_amounts > 0, duty_amounts, 0.0))
+            tax_per_item = np.where(tax_rates > 0, invoice_prices * tax_rates,
+                                    np.where(tax_amounts > 0, tax_amounts, 0.0))
+            total_us_import_duty += float(np.dot(duty_per_item, quantities))
+            total_us_import_tax += float(np.dot(tax_per_item, quantities))
         
         # Calculate shipping profit/loss
         # This shows if we make or lose money on shipping
@@ -2676,47 +3724,52 @@ class EcommerceAnalyticsOptimized:
         # (profit from product sales only, before shipping costs)
         contribution_margin = product_revenue - total_cost
         
-        # Order metrics (vectorized)
-        total_orders = len(completed_orders)
-        total_items = int(np.sum(item_counts))
-        
-        # Customer metrics
-        customer_ids = [o['buyer_id'] for o in completed_orders if o['buyer_id']]
-        unique_customers = len(set(customer_ids))
-        repeat_customers = len(customer_ids) - unique_customers
+        # Customer metrics: buyer ids as an int64 column (0 = no buyer), distinct count via np.unique
+        buyer_ids = np.fromiter(order_buyer_ids, dtype=np.int64, count=total_orders)
+        has_buyer = buyer_ids != 0
+        customer_ids = buyer_ids[has_buyer]
+        unique_customers = int(np.unique(customer_ids).size)
+        repeat_customers = int(customer_ids.size) - unique_customers
+        # (buyer, order) pairs so roll-ups can count distinct customers instead of summing
+        customer_orders = np.column_stack((
+            customer_ids, np.fromiter(order_ids, dtype=np.int64, count=total_orders)[has_buyer]
+        ))
         
         # Payment methods
-        payment_methods = [o['payment_method'] for o in completed_orders if o['payment_method']]
-        payment_method_counts = defaultdict(int)
-        for pm in payment_methods:
-            payment_method_counts[pm] += 1
+        # Counter tallies in C (and keeps first-seen order, so max() ties resolve as before)
+        payment_method_counts = Counter(method for method in order_payment_methods if method)
+        
+        # Temporal peaks in local time (like the month assignment below): the histogram
+        # is kept so roll-ups can sum it and take their own peaks
+        order_time_counts = _order_time_counts(order_timestamps) if total_orders > 0 else None
+        peak_month, peak_day_of_week, peak_hour = _order_time_peaks(order_time_counts)
         
         # Operational metrics (vectorized)
-        shipped_count = sum(1 for o in completed_orders if o['is_shipped'])
         shipping_rate = shipped_count / total_orders if total_orders > 0 else 0
-        
-        gift_order_count = sum(1 for o in completed_orders if o['is_gift'])
         gift_rate = gift_order_count / total_orders if total_orders > 0 else 0
         
         # Revenue distribution (NumPy percentiles - super fast!)
-        median_order_value = float(np.median(grand_totals))
-        percentile_75_order_value = float(np.percentile(grand_totals, 75))
-        percentile_25_order_value = float(np.percentile(grand_totals, 25))
-        order_value_std = float(np.std(grand_totals))
-        
-        # Time analysis
         avg_time_between_orders = 0
-        if len(completed_orders) > 1:
-            timestamps = np.array(sorted([o['created_timestamp'] for o in completed_orders]))
-            time_diffs = np.diff(timestamps)
-            avg_time_between_orders = float(np.mean(time_diffs)) / 3600
+        if total_orders == 1:
+            # Single-order periods (common for long-tail SKUs): every quantile is the one
+            # order value, spread and time between orders are 0
+            percentile_25_order_value = median_order_value = percentile_75_order_value = gross_revenue
+            order_value_std = 0.0
+        else:
+            # One quantile call partitions the array once for all three cut points
+            # (numbagg's compiled kernel when installed; grand totals are never NaN)
+            quantile = numbagg.nanquantile if NUMBAGG_AVAILABLE else np.quantile
+            percentile_25_order_value, median_order_value, percentile_75_order_value = (
+                quantile(grand_totals, [0.25, 0.5, 0.75]).tolist()
+            )
+            order_value_std = float(np.std(grand_totals))
+            
+            # Time analysis
+            # Mean gap between consecutive orders telescopes to (last - first) / (n - 1): no sort needed
+            time_span = float(order_timestamps.max() - order_timestamps.min())
+            avg_time_between_orders = time_span / (len(order_timestamps) - 1) / 3600
         
         # Refund metrics (vectorized)
-        refund_amounts = np.array([o['refund_amount'] for o in completed_orders])
-        refund_counts = np.array([o['refund_count'] for o in completed_orders])
-        
-        total_refund_amount = float(np.sum(refund_amounts))
-        total_refund_count = int(np.sum(refund_counts))
         orders_with_refunds = int(np.sum(refund_counts > 0))
         
         # ===== ETSY FEES ON REFUNDS =====
@@ -2755,7 +3808,7 @@ class EcommerceAnalyticsOptimized:
                         )
                         
                         if listing_metrics:
-                            period_key = f"{date_range.start_date.strftime('%Y-%m-%d')}_to_{date_range.end_date.strftime('%Y-%m-%d')}"
+                            period_key = date_range.period_key
                             listing_data = listing_metrics.get(period_key, {})
                             listing_revenue = listing_data.get('gross_revenue', 0)
                             
@@ -2784,7 +3837,8 @@ class EcommerceAnalyticsOptimized:
         
         customer_acquisition_cost = total_cost / unique_customers if unique_customers > 0 else 0
         
-        period_days = (date_range.end_date - date_range.start_date).days + 1
+        # Days covered, counted as whole days between the bounds plus one (precomputed on DateRange)
+        period_days = date_range.days
         daily_profit_per_customer = (gross_profit / unique_customers) / period_days if unique_customers > 0 and period_days > 0 else 0
         payback_period_days = customer_acquisition_cost / daily_profit_per_customer if daily_profit_per_customer > 0 else 0
         
@@ -2804,112 +3858,114 @@ class EcommerceAnalyticsOptimized:
             "period_days": period_days,
             
             # ===== REVENUE METRICS (CORRECTED FOR ETSY) =====
-            "gross_revenue": round(gross_revenue, 2),  # What buyers paid (grand_total)
-            "total_revenue": round(gross_revenue, 2),  # Alias for backwards compatibility
-            "product_revenue": round(product_revenue, 2),  # Net product sales (after fees, excl shipping)
-            "total_shipping_charged": round(total_shipping_charged, 2),  # Shipping charged to customers
-            "total_tax_collected": round(total_tax_collected, 2),
-            "total_vat_collected": round(total_vat_collected, 2),
-            "total_gift_wrap_revenue": round(total_gift_wrap_revenue, 2),
-            "total_discounts_given": round(total_discounts_given, 2),
+            "gross_revenue": gross_revenue,  # What buyers paid (grand_total)
+            "total_revenue": gross_revenue,  # Alias for backwards compatibility
+            "product_revenue": product_revenue,  # Net product sales (after fees, excl shipping)
+            "total_shipping_charged": total_shipping_charged,  # Shipping charged to customers
+            "total_tax_collected": total_tax_collected,
+            "total_vat_collected": total_vat_collected,
+            "total_gift_wrap_revenue": total_gift_wrap_revenue,
+            "total_discounts_given": total_discounts_given,
             
             # ===== ETSY FEES (NEW) =====
-            "etsy_transaction_fees": round(etsy_transaction_fees, 2),
-            "etsy_processing_fees": round(etsy_processing_fees, 2),
-            "total_etsy_fees": round(total_etsy_fees, 2),
-            "etsy_fee_rate": round(total_etsy_fees / gross_revenue, 4) if gross_revenue > 0 else 0,
+            "etsy_transaction_fees": etsy_transaction_fees,
+            "etsy_processing_fees": etsy_processing_fees,
+            "total_etsy_fees": total_etsy_fees,
+            "etsy_fee_rate": total_etsy_fees / gross_revenue if gross_revenue > 0 else 0,
             
             # ===== NET REVENUE (CORRECTED) =====
-            "net_revenue": round(net_revenue_from_sales, 2),  # After Etsy fees & taxes
-            "net_revenue_after_refunds": round(net_revenue_after_refunds, 2),
-            "take_home_rate": round(net_revenue_from_sales / gross_revenue, 4) if gross_revenue > 0 else 0,
-            "discount_rate": round(total_discounts_given / gross_revenue, 4) if gross_revenue > 0 else 0,
+            "net_revenue": net_revenue_from_sales,  # After Etsy fees & taxes
+            "net_revenue_after_refunds": net_revenue_after_refunds,
+            "take_home_rate": net_revenue_from_sales / gross_revenue if gross_revenue > 0 else 0,
+            "discount_rate": total_discounts_given / gross_revenue if gross_revenue > 0 else 0,
             
             # ===== SHIPPING COST METRICS (NEW) =====
-            "actual_shipping_cost": round(total_actual_shipping_cost, 2),  # Actual FedEx costs
-            "shipping_profit": round(shipping_profit, 2),  # Profit/loss on shipping
-            "duty_amount": round(total_us_import_duty, 2),  # US customs duties (COST to us)
-            "tax_amount": round(total_us_import_tax, 2),  # US import taxes (COST to us)
-            "fedex_processing_fee": round(total_fedex_processing_fee, 2),  # FedEx processing fees
+            "actual_shipping_cost": total_actual_shipping_cost,  # Actual FedEx costs
+            "shipping_profit": shipping_profit,  # Profit/loss on shipping
+            "duty_amount": total_us_import_duty,  # US customs duties (COST to us)
+            "tax_amount": total_us_import_tax,  # US import taxes (COST to us)
+            "fedex_processing_fee": total_fedex_processing_fee,  # FedEx processing fees
             
             # ===== COST & PROFIT METRICS (CORRECTED WITH SHIPPING) =====
-            "total_cost": round(total_cost, 2),  # COGS only
-            "total_cost_with_shipping": round(total_cost_with_shipping, 2),  # COGS + Shipping + Duties + Taxes
-            "avg_cost_per_item": round(avg_cost_per_item, 2),
-            "cost_per_order": round(total_cost_with_shipping / total_orders, 2) if total_orders > 0 else 0,
-            
-            "contribution_margin": round(contribution_margin, 2),  # Product profit before shipping costs
-            "gross_profit": round(gross_profit, 2),  # After COGS, shipping, duties, taxes & Etsy fees
-            "gross_margin": round(gross_profit / gross_revenue, 4) if gross_revenue > 0 else 0,
-            "net_profit": round(net_profit, 2),  # After everything including refunds AND ad spend
-            "net_margin": round(net_profit / gross_revenue, 4) if gross_revenue > 0 else 0,
-            "return_on_revenue": round(net_profit / gross_revenue, 4) if gross_revenue > 0 else 0,
-            "markup_ratio": round(gross_profit / total_cost_with_shipping, 4) if total_cost_with_shipping > 0 else 0,
+            "total_cost": total_cost,  # COGS only
+            "total_cost_with_shipping": total_cost_with_shipping,  # COGS + Shipping + Duties + Taxes
+            "avg_cost_per_item": avg_cost_per_item,
+            "cost_per_order": total_cost_with_shipping / total_orders if total_orders > 0 else 0,
+            
+            "contribution_margin": contribution_margin,  # Product profit before shipping costs
+            "gross_profit": gross_profit,  # After COGS, shipping, duties, taxes & Etsy fees
+            "gross_margin": gross_profit / gross_revenue if gross_revenue > 0 else 0,
+            "net_profit": net_profit,  # After everything including refunds AND ad spend
+            "net_margin": net_profit / gross_revenue if gross_revenue > 0 else 0,
+            "return_on_revenue": net_profit / gross_revenue if gross_revenue > 0 else 0,
+            "markup_ratio": gross_profit / total_cost_with_shipping if total_cost_with_shipping > 0 else 0,
             
             # ===== ADVERTISING METRICS (NEW) =====
-            "total_ad_spend": round(total_ad_spend, 2),  # Total advertising spend for the period
-            "ad_spend_rate": round(total_ad_spend / gross_revenue, 4) if gross_revenue > 0 else 0,  # Ad spend as % of revenue
-            "roas": round(gross_revenue / total_ad_spend, 2) if total_ad_spend > 0 else 0,  # Return on Ad Spend
+            "total_ad_spend": total_ad_spend,  # Total advertising spend for the period
+            "ad_spend_rate": total_ad_spend / gross_revenue if gross_revenue > 0 else 0,  # Ad spend as % of revenue
+            "roas": gross_revenue / total_ad_spend if total_ad_spend > 0 else 0,  # Return on Ad Spend
             
             # ===== ORDER METRICS =====
             "total_orders": total_orders,
             "total_items": total_items,
             "total_quantity_sold": total_quantity_sold,
             "unique_skus": len(unique_skus),
-            "average_order_value": round(gross_revenue / total_orders, 2) if total_orders > 0 else 0,
-            "median_order_value": round(median_order_value, 2),
-            "percentile_75_order_value": round(percentile_75_order_value, 2),
-            "percentile_25_order_value": round(percentile_25_order_value, 2),
-            "order_value_std": round(order_value_std, 2),
-            "items_per_order": round(total_items / total_orders, 2) if total_orders > 0 else 0,
-            "revenue_per_item": round(gross_revenue / total_items, 2) if total_items > 0 else 0,
-            "profit_per_item": round(gross_profit / total_items, 2) if total_items > 0 else 0,
+            "average_order_value": gross_revenue / total_orders if total_orders > 0 else 0,
+            "median_order_value": median_order_value,
+            "percentile_75_order_value": percentile_75_order_value,
+            "percentile_25_order_value": percentile_25_order_value,
+            "order_value_std": order_value_std,
+            "items_per_order": total_items / total_orders if total_orders > 0 else 0,
+            "revenue_per_item": gross_revenue / total_items if total_items > 0 else 0,
+            "profit_per_item": gross_profit / total_items if total_items > 0 else 0,
             
             # ===== CUSTOMER METRICS =====
             "unique_customers": unique_customers,
             "repeat_customers": repeat_customers,
-            "customer_retention_rate": round(customer_retention_rate, 4),
-            "revenue_per_customer": round(avg_customer_value, 2),
-            "orders_per_customer": round(total_orders / unique_customers, 2) if unique_customers > 0 else 0,
-            "profit_per_customer": round(gross_profit / unique_customers, 2) if unique_customers > 0 else 0,
+            "customer_orders": customer_orders,  # In-memory only (not a report column)
+            "customer_retention_rate": customer_retention_rate,
+            "revenue_per_customer": avg_customer_value,
+            "orders_per_customer": total_orders / unique_customers if unique_customers > 0 else 0,
+            "profit_per_customer": gross_profit / unique_customers if unique_customers > 0 else 0,
             
             # ===== OPERATIONAL METRICS =====
             "shipped_orders": shipped_count,
-            "shipping_rate": round(shipping_rate, 4),
+            "shipping_rate": shipping_rate,
             "gift_orders": gift_order_count,
-            "gift_rate": round(gift_rate, 4),
-            "avg_time_between_orders_hours": round(avg_time_between_orders, 2),
-            "orders_per_day": round(total_orders / period_days, 2),
-            "revenue_per_day": round(gross_revenue / period_days, 2),
+            "gift_rate": gift_rate,
+            "avg_time_between_orders_hours": avg_time_between_orders,
+            "orders_per_day": total_orders / period_days,
+            "revenue_per_day": gross_revenue / period_days,
             
             # ===== REFUND METRICS =====
-            "total_refund_amount": round(total_refund_amount, 2),
+            "total_refund_amount": total_refund_amount,
             "total_refund_count": total_refund_count,
             "orders_with_refunds": orders_with_refunds,
-            "etsy_fees_retained_on_refunds": round(etsy_fees_retained_on_refunds, 2),  # NEW: Etsy keeps these!
-            "refund_rate_by_order": round(total_refund_count / total_orders, 4) if total_orders > 0 else 0,
-            "refund_rate_by_value": round(total_refund_amount / gross_revenue, 4) if gross_revenue > 0 else 0,
-            "order_refund_rate": round(orders_with_refunds / total_orders, 4) if total_orders > 0 else 0,
+            "etsy_fees_retained_on_refunds": etsy_fees_retained_on_refunds,  # NEW: Etsy keeps these!
+            "refund_rate_by_order": total_refund_count / total_orders if total_orders > 0 else 0,
+            "refund_rate_by_value": total_refund_amount / gross_revenue if gross_revenue > 0 else 0,
+            "order_refund_rate": orders_with_refunds / total_orders if total_orders > 0 else 0,
             
             # ===== CANCELLATION METRICS =====
-            "cancelled_orders": len(orders) - len(completed_orders),
-            "cancellation_rate": round((len(orders) - len(completed_orders)) / len(orders), 4) if len(orders) > 0 else 0,
-            "completion_rate": round(total_orders / len(orders), 4) if len(orders) > 0 else 0,
+            "cancelled_orders": len(cancelled_order_ids),
+            "cancellation_rate": len(cancelled_order_ids) / all_order_count if all_order_count > 0 else 0,
+            "completion_rate": total_orders / all_order_count if all_order_count > 0 else 0,
             
             # ===== PAYMENT METRICS =====
-            "primary_payment_method": max(payment_method_counts, key=payment_method_counts.get) if payment_method_counts else None,
+            "primary_payment_method": payment_method_counts.most_common(1)[0][0] if payment_method_counts else None,
             "payment_method_diversity": len(payment_method_counts),
             
             # ===== BUSINESS METRICS =====
-            "customer_lifetime_value": round(estimated_clv, 2),
-            "payback_period_days": round(payback_period_days, 1),
-            "customer_acquisition_cost": round(customer_acquisition_cost, 2),
-            "price_elasticity": round(price_elasticity, 4),
+            "customer_lifetime_value": estimated_clv,
+            "payback_period_days": payback_period_days,
+            "customer_acquisition_cost": customer_acquisition_cost,
+            "price_elasticity": price_elasticity,
             
             # ===== TEMPORAL METRICS =====
-            "peak_month": None,
-            "peak_day_of_week": None,
-            "peak_hour": None,
+            "peak_month": peak_month,
+            "peak_day_of_week": peak_day_of_week,
+            "peak_hour": peak_hour,
+            "order_time_counts": order_time_counts,  # In-memory only (not a report column)
             "seasonality_index": 0,
             
             # ===== INVENTORY METRICS =====
@@ -2922,7 +3978,7 @@ class EcommerceAnalyticsOptimized:
             
             # ===== COST DATA QUALITY METRICS (NEW) =====
             "has_complete_cost_data": has_complete_cost_data,
-            "cost_coverage_percent": round(cost_coverage_pct, 2),
+            "cost_coverage_percent": cost_coverage_pct,
             "cost_data_sources": cost_sources.copy(),
             "items_with_direct_cost": cost_sources["direct"],
             "items_with_fallback_cost": cost_sources["sibling_same_period"] + cost_sources["sibling_historical"],
@@ -2932,16 +3988,12 @@ class EcommerceAnalyticsOptimized:
         # Get inventory from cache (instant!)
         if sku:
             cache_key = f"sku_{sku}"
-            inventory_data = self._inventory_cache.get(cache_key, {
-                "total_inventory": 0, "avg_price": 0, "price_range": 0, "active_variants": 0
-            })
+            inventory_data = self._inventory_cache.get(cache_key, self._INVENTORY_DEFAULT)
         elif listing_id:
             cache_key = f"listing_{listing_id}"
-            inventory_data = self._inventory_cache.get(cache_key, {
-                "total_inventory": 0, "avg_price": 0, "price_range": 0, "active_variants": 0
-            })
+            inventory_data = self._inventory_cache.get(cache_key, self._INVENTORY_DEFAULT)
         else:
-            inventory_data = {"total_inventory": 0, "avg_price": 0, "price_range": 0, "active_variants": 0}
+            inventory_data = self._INVENTORY_DEFAULT
         
         metrics.update(inventory_data)
         
@@ -2949,19 +4001,18 @@ class EcommerceAnalyticsOptimized:
         if inventory_data.get("total_inventory", 0) > 0:
             inventory_turnover = total_quantity_sold / inventory_data["total_inventory"]
             stockout_risk = max(0, min(1, 1 - (inventory_data["total_inventory"] / max(total_quantity_sold, 1))))
-            metrics["inventory_turnover"] = round(inventory_turnover, 4)
-            metrics["stockout_risk"] = round(stockout_risk, 4)
+            metrics["inventory_turnover"] = inventory_turnover
+            metrics["stockout_risk"] = stockout_risk
         
         # Log detailed cost data information
         if not has_complete_cost_data and total_quantity_sold > 0:
-            period_str = f"{date_range.start_date.date()} to {date_range.end_date.date()}"
-            entity_str = f"SKU={sku}" if sku else f"Listing={listing_id}" if listing_id else "Shop"
-            
-            # Only log periodically to avoid spam
-            warning_key = f"{entity_str}_{period_str}"
+            # Only log periodically to avoid spam (tuple key: no string formatting per call)
+            warning_key = (sku, listing_id, date_range.start_ts, date_range.end_ts)
             if warning_key not in self._cost_coverage_warnings_shown:
                 self._cost_coverage_warnings_shown.add(warning_key)
                 if len(self._cost_coverage_warnings_shown) % 10 == 1:  # Log 1st, 11th, 21st, etc.
+                    period_str = f"{date_range.start_date.date()} to {date_range.end_date.date()}"
+                    entity_str = f"SKU={sku}" if sku else f"Listing={listing_id}" if listing_id else "Shop"
                     logger.info(
                         f"ℹ️ Cost data for {entity_str}, period {period_str}: "
                         f"{cost_coverage_pct:.1f}% coverage "
@@ -2976,593 +4027,106 @@ class EcommerceAnalyticsOptimized:
     async def get_inventory_insights_by_sku(self, sku: str) -> Dict:
         """Get inventory insights for a specific SKU from cache."""
         cache_key = f"sku_{sku}"
-        return self._inventory_cache.get(cache_key, {
-            "total_inventory": 0, "avg_price": 0, "price_range": 0, "active_variants": 0
-        })
+        inventory_data = self._inventory_cache.get(cache_key)
+        return inventory_data if inventory_data is not None else dict(self._INVENTORY_DEFAULT)
 
     async def get_inventory_insights_by_listing(self, listing_id: int) -> Dict:
         """Get inventory insights for a listing from cache."""
         cache_key = f"listing_{listing_id}"
-        return self._inventory_cache.get(cache_key, {
-            "total_inventory": 0, "avg_price": 0, "price_range": 0, "active_variants": 0
-        })
+        inventory_data = self._inventory_cache.get(cache_key)
+        return inventory_data if inventory_data is not None else dict(self._INVENTORY_DEFAULT)
 
-    async def _empty_metrics(self, sku: Optional[str] = None, 
-                           listing_id: Optional[int] = None,
-                           date_range: Optional[DateRange] = None) -> Dict:
+    def _empty_metrics(self, sku: Optional[str] = None, 
+                       listing_id: Optional[int] = None,
+                       date_range: Optional[DateRange] = None) -> Dict:
         """Return empty metrics with corrected Etsy structure and shipping costs."""
-        return {
-            "period_start": date_range.start_date if date_range else None,
-            "period_end": date_range.end_date if date_range else None,
-            "period_days": 0,
-            # Revenue
-            "gross_revenue": 0, "total_revenue": 0, "product_revenue": 0, 
-            "total_shipping_charged": 0, "total_tax_collected": 0, "total_vat_collected": 0, 
-            "total_gift_wrap_revenue": 0, "total_discounts_given": 0,
-            # Etsy fees
-            "etsy_transaction_fees": 0, "etsy_processing_fees": 0, "total_etsy_fees": 0, "etsy_fee_rate": 0,
-            # Net revenue
-            "net_revenue": 0, "net_revenue_after_refunds": 0, "take_home_rate": 0, "discount_rate": 0,
-            # Shipping costs
-            "actual_shipping_cost": 0, "shipping_profit": 0, "duty_amount": 0, "tax_amount": 0, "fedex_processing_fee": 0,
-            # Costs & Profit
-            "total_cost": 0, "total_cost_with_shipping": 0, "avg_cost_per_item": 0, "cost_per_order": 0, 
-            "contribution_margin": 0, "gross_profit": 0, "gross_margin": 0, 
-            "net_profit": 0, "net_margin": 0, "return_on_revenue": 0, "markup_ratio": 0,
-            # Orders
-            "total_orders": 0, "total_items": 0, "total_quantity_sold": 0, "unique_skus": 0,
-            "average_order_value": 0, "median_order_value": 0, "percentile_75_order_value": 0,
-            "percentile_25_order_value": 0, "order_value_std": 0, "items_per_order": 0,
-            "revenue_per_item": 0, "profit_per_item": 0,
-            # Customers
-            "unique_customers": 0, "repeat_customers": 0, "customer_retention_rate": 0,
-            "revenue_per_customer": 0, "orders_per_customer": 0, "profit_per_customer": 0,
-            # Operations
-            "shipped_orders": 0, "shipping_rate": 0, "gift_orders": 0, "gift_rate": 0,
-            "avg_time_between_orders_hours": 0, "orders_per_day": 0, "revenue_per_day": 0,
-            # Refunds
-            "total_refund_amount": 0, "total_refund_count": 0, "orders_with_refunds": 0,
-            "etsy_fees_retained_on_refunds": 0,
-            "refund_rate_by_order": 0, "refund_rate_by_value": 0, "order_refund_rate": 0,
-            # Cancellations
-            "cancelled_orders": 0, "cancellation_rate": 0, "completion_rate": 0,
-            # Payment
-            "primary_payment_method": None, "payment_method_diversity": 0,
-            # Temporal
-            "peak_month": None, "peak_day_of_week": None, "peak_hour": None, "seasonality_index": 0,
-            # Inventory
-            "total_inventory": 0, "avg_price": 0, "price_range": 0, "active_variants": 0,
-            "inventory_turnover": 0, "stockout_risk": 0,
-            # Business
-            "customer_lifetime_value": 0, "payback_period_days": 0, "customer_acquisition_cost": 0,
-            "price_elasticity": 0,
-            # Cost data quality
-            "has_complete_cost_data": False,
-            "cost_coverage_percent": 0,
-            "cost_data_sources": {"direct": 0, "sibling_same_period": 0, "sibling_historical": 0, "missing": 0},
-            "items_with_direct_cost": 0,
-            "items_with_fallback_cost": 0,
-            "items_missing_cost": 0,
-        }
+        metrics = dict(self._EMPTY_METRICS_TEMPLATE)
+        if date_range:
+            metrics["period_start"] = date_range.start_date
+            metrics["period_end"] = date_range.end_date
+        metrics["cost_data_sources"] = {"direct": 0, "sibling_same_period": 0, "sibling_historical": 0, "missing": 0}
+        return metrics
 
     # --- SAVE METHODS (BULK OPTIMIZED) ---
 
     def _snake_to_camel(self, snake_str: str) -> str:
-        """Convert snake_case to camelCase."""
-        components = snake_str.split('_')
-        return components[0] + ''.join(x.title() for x in components[1:])
+        """Convert snake_case to camelCase (memoized in _SNAKE_TO_CAMEL)."""
+        camel = _SNAKE_TO_CAMEL.get(snake_str)
+        if camel is None:
+            camel = _SNAKE_TO_CAMEL[snake_str] = _camel_case(snake_str)
+        return camel
 
-    async def _bulk_save_reports(self, reports: List[Tuple[str, Dict]], report_type: str):
-        """⚡ Bulk save reports using raw SQL for maximum performance."""
-        if not reports:
-            return
+    def _clean_metric_value(self, value, _isfinite=math.isfinite):
+        """Clean metric values to prevent NaN, Infinity, or None issues."""
+        if value is None:
+            return 0
+        # isinstance (not type() is float) so np.float64 NaN/inf are caught too
+        if isinstance(value, float) and not _isfinite(value):
+            return 0
+        return value
+
+    def _clean_metric_values(self, metrics: Dict, keys: Tuple[str, ...]) -> List:
+        """
+        Look up keys in metrics and clean them all in one vectorized pass.
         
+        None/NaN/Infinity become 0 (same rules as _clean_metric_value). Only the
+        offending positions are replaced, so ints stay ints for Prisma Int columns.
+        """
+        values = list(map(metrics.get, keys))
         try:
-            # Group reports into batches
-            for i in range(0, len(reports), self.batch_size):
-                batch = reports[i:i + self.batch_size]
-                
-                if report_type == "shop":
-                    await self._bulk_upsert_shop_reports(batch)
-                elif report_type == "listing":
-                    await self._bulk_upsert_listing_reports(batch)
-                elif report_type == "product":
-                    await self._bulk_upsert_product_reports(batch)
-                    
-        except Exception as e:
-            logger.error(f"Error in bulk save: {e}")
+            # None -> NaN in the float array, so one isfinite check finds everything
+            bad = np.flatnonzero(~np.isfinite(np.array(values, dtype=np.float64)))
+        except (TypeError, ValueError):
+            # A non-numeric value slipped in; clean value by value instead
+            return [self._clean_metric_value(value) for value in values]
+        for i in bad.tolist():
+            values[i] = 0
+        return values
 
-    async def _bulk_upsert_shop_reports(self, batch: List[Tuple[str, Dict]]):
-        """
-        Bulk upsert shop reports using raw SQL with comprehensive error handling.
-        Includes automatic retry logic and graceful fallback to individual saves.
+    def _round_metrics(self, metrics: Dict) -> Dict:
+        """Return a copy of metrics with float fields rounded to their stored precision."""
+        rounded = metrics.copy()
+        # map(metrics.get, ...) fetches every rounded field in one C-level pass
+        rounded.update({
+            key: round(value, ndigits)
+            for key, value, ndigits in zip(_METRIC_DECIMAL_KEYS, map(metrics.get, _METRIC_DECIMAL_KEYS),
+                                           _METRIC_DECIMAL_NDIGITS)
+            if isinstance(value, float)
+        })
+        return rounded
+
+    def _shop_report_upsert(self, metrics: Dict, period_type: str, period_start: datetime,
+                            period_end: datetime, clean: bool = True) -> Tuple[Dict, Dict]:
         """
-        if not batch:
-            return
+        Build the (where, payload) pair of a shop report upsert.
         
-        max_retries = 3
-        retry_delay = 1
-        
-        for attempt in range(max_retries):
-            try:
-                # Ensure connection before batch operation
-                await self._ensure_connection()
-                
-                # Build VALUES clause with proper escaping
-                values = []
-                for period_type, period_start, period_end, metrics in batch:
-                    period_type_enum = period_type.upper()
-                    m = metrics
-                    
-                    # Clean and validate all numeric values
-                    period_days = self._clean_metric_value(m.get('period_days', 0))
-                    total_revenue = self._clean_metric_value(m.get('total_revenue', 0))
-                    product_revenue = self._clean_metric_value(m.get('product_revenue', 0))
-                    total_shipping_revenue = self._clean_metric_value(m.get('total_shipping_revenue', 0))
-                    total_cost = self._clean_metric_value(m.get('total_cost', 0))
-                    gross_profit = self._clean_metric_value(m.get('gross_profit', 0))
-                    net_profit = self._clean_metric_value(m.get('net_profit', 0))
-                    total_orders = int(m.get('total_orders', 0))
-                    total_items = int(m.get('total_items', 0))
-                    unique_customers = int(m.get('unique_customers', 0))
-                    
-                    values.append(f"""(
-                        '{period_type_enum}',
-                        '{period_start.isoformat()}',
-                        '{period_end.isoformat()}',
-                        {period_days},
-                        {total_revenue},
-                        {product_revenue},
-                        {total_shipping_revenue},
-                        {total_cost},
-                        {gross_profit},
-                        {net_profit},
-                        {total_orders},
-                        {total_items},
-                        {unique_customers}
-                    )""")
-                
-                # Use ON CONFLICT DO UPDATE for upsert
-                query = f"""
-                    INSERT INTO shop_reports (
-                        period_type, period_start, period_end, period_days,
-                        total_revenue, product_revenue, total_shipping_revenue,
-                        total_cost, gross_profit, net_profit,
-                        total_orders, total_items, unique_customers
-                    ) VALUES {','.join(values)}
-                    ON CONFLICT (period_type, period_start, period_end)
-                    DO UPDATE SET
-                        period_days = EXCLUDED.period_days,
-                        total_revenue = EXCLUDED.total_revenue,
-                        product_revenue = EXCLUDED.product_revenue,
-                        total_shipping_revenue = EXCLUDED.total_shipping_revenue,
-                        total_cost = EXCLUDED.total_cost,
-                        gross_profit = EXCLUDED.gross_profit,
-                        net_profit = EXCLUDED.net_profit,
-                        total_orders = EXCLUDED.total_orders,
-                        total_items = EXCLUDED.total_items,
-                        unique_customers = EXCLUDED.unique_customers,
-                        updated_at = NOW()
-                """
-                
-                await self.prisma.execute_raw(query)
-                logger.debug(f"✓ Bulk saved {len(batch)} shop reports")
-                return  # Success!
-                
-            except Exception as e:
-                error_str = str(e)
-                error_type = type(e).__name__
-                
-                # Check if it's a connection error
-                is_connection_error = (
-                    "Can't reach database server" in error_str or
-                    "Connection" in error_str or
-                    "not connected" in error_str.lower() or
-                    "ClientNotConnectedError" in error_type or
-                    "ConnectError" in error_type or
-                    "Closed" in error_str or
-                    "broken pipe" in error_str.lower() or
-                    "connection refused" in error_str.lower()
-                )
-                
-                if is_connection_error and attempt < max_retries - 1:
-                    logger.warning(
-                        f"Connection error in bulk shop report save "
-                        f"(attempt {attempt + 1}/{max_retries}), retrying in {retry_delay}s..."
-                    )
-                    await asyncio.sleep(retry_delay)
-                    retry_delay *= 2
-                    continue
-                else:
-                    # Final attempt failed or non-connection error - fallback to individual saves
-                    logger.error(
-                        f"⚠️  Bulk shop report save failed after {attempt + 1} attempts: {error_type}"
-                    )
-                    logger.info(f"Falling back to individual saves for {len(batch)} shop reports...")
-                    
-                    # Fallback: Save each report individually with error handling
-                    success_count = 0
-                    fail_count = 0
-                    
-                    for item in batch:
-                        try:
-                            await self._retry_on_connection_error(
-                                self.save_shop_report,
-                                *item
-                            )
-                            success_count += 1
-                        except Exception as individual_error:
-                            fail_count += 1
-                            logger.error(
-                                f"Failed to save individual shop report: {individual_error}"
-                            )
-                    
-                    logger.info(
-                        f"Individual save results: {success_count} succeeded, {fail_count} failed"
-                    )
-                    return  # Don't retry the entire batch again
-
-    async def _bulk_upsert_listing_reports(self, batch: List[Tuple[str, Dict]]):
-        """
-        Bulk upsert listing reports using Prisma ORM with comprehensive error handling.
-        Includes automatic retry logic and graceful fallback to individual saves.
+        clean=False leaves numeric values as-is for save_reports_bulk, which
+        cleans a whole batch at once.
         """
-        if not batch:
-            return
-        
-        max_retries = 3
-        retry_delay = 1
-        
-        for attempt in range(max_retries):
-            try:
-                # Ensure connection before batch operation
-                await self._ensure_connection()
-                
-                success_count = 0
-                fail_count = 0
-                
-                # Use Prisma's upsert for each report
-                for period_type, metrics in batch:
-                    try:
-                        period_type_enum = {
-                            "yearly": PeriodType.YEARLY,
-                            "monthly": PeriodType.MONTHLY,
-                            "weekly": PeriodType.WEEKLY
-                        }[period_type]
-                        
-                        listing_id = metrics.get('listing_id')
-                        if not listing_id:
-                            continue
-                            
-                        period_start = metrics['period_start']
-                        period_end = metrics['period_end']
-                        
-                        await self.prisma.listingreport.upsert(
-                            where={
-                                'listingId_periodType_periodStart_periodEnd': {
-                                    'listingId': int(listing_id),
-                                    'periodType': period_type_enum,
-                                    'periodStart': period_start,
-                                    'periodEnd': period_end
-                                }
-                            },
-                            data={
-                                'create': {
-                                    'listingId': int(listing_id),
-                                    'periodType': period_type_enum,
-                                    'periodStart': period_start,
-                                    'periodEnd': period_end,
-                                    'periodDays': metrics.get('period_days', 0),
-                                    'grossRevenue': self._clean_metric_value(metrics.get('gross_revenue', 0)),
-                                    'totalRevenue': self._clean_metric_value(metrics.get('total_revenue', 0)),
-                                    'productRevenue': self._clean_metric_value(metrics.get('product_revenue', 0)),
-                                    'totalShippingRevenue': self._clean_metric_value(metrics.get('total_shipping_revenue', 0)),
-                                    'totalShippingCharged': self._clean_metric_value(metrics.get('total_shipping_charged', 0)),
-                                    'actualShippingCost': self._clean_metric_value(metrics.get('actual_shipping_cost', 0)),
-                                    'shippingProfit': self._clean_metric_value(metrics.get('shipping_profit', 0)),
-                                    'dutyAmount': self._clean_metric_value(metrics.get('duty_amount', 0)),
-                                    'taxAmount': self._clean_metric_value(metrics.get('tax_amount', 0)),
-                                    'fedexProcessingFee': self._clean_metric_value(metrics.get('fedex_processing_fee', 0)),
-                                    'totalTaxCollected': self._clean_metric_value(metrics.get('total_tax_collected', 0)),
-                                    'totalVatCollected': self._clean_metric_value(metrics.get('total_vat_collected', 0)),
-                                    'totalGiftWrapRevenue': self._clean_metric_value(metrics.get('total_gift_wrap_revenue', 0)),
-                                    'totalDiscountsGiven': self._clean_metric_value(metrics.get('total_discounts_given', 0)),
-                                    'etsyTransactionFees': self._clean_metric_value(metrics.get('etsy_transaction_fees', 0)),
-                                    'etsyProcessingFees': self._clean_metric_value(metrics.get('etsy_processing_fees', 0)),
-                                    'totalEtsyFees': self._clean_metric_value(metrics.get('total_etsy_fees', 0)),
-                                    'etsyFeeRate': self._clean_metric_value(metrics.get('etsy_fee_rate', 0)),
-                                    'netRevenue': self._clean_metric_value(metrics.get('net_revenue', 0)),
-                                    'netRevenueAfterRefunds': self._clean_metric_value(metrics.get('net_revenue_after_refunds', 0)),
-                                    'takeHomeRate': self._clean_metric_value(metrics.get('take_home_rate', 0)),
-                                    'discountRate': self._clean_metric_value(metrics.get('discount_rate', 0)),
-                                    'contributionMargin': self._clean_metric_value(metrics.get('contribution_margin', 0)),
-                                    'totalCost': self._clean_metric_value(metrics.get('total_cost', 0)),
-                                    'totalCostWithShipping': self._clean_metric_value(metrics.get('total_cost_with_shipping', 0)),
-                                    'avgCostPerItem': self._clean_metric_value(metrics.get('avg_cost_per_item', 0)),
-                                    'costPerOrder': self._clean_metric_value(metrics.get('cost_per_order', 0)),
-                                    'grossProfit': self._clean_metric_value(metrics.get('gross_profit', 0)),
-                                    'grossMargin': self._clean_metric_value(metrics.get('gross_margin', 0)),
-                                    'netProfit': self._clean_metric_value(metrics.get('net_profit', 0)),
-                                    'netMargin': self._clean_metric_value(metrics.get('net_margin', 0)),
-                                    'returnOnRevenue': self._clean_metric_value(metrics.get('return_on_revenue', 0)),
-                                    'markupRatio': self._clean_metric_value(metrics.get('markup_ratio', 0)),
-                                    'totalOrders': metrics.get('total_orders', 0),
-                                    'totalItems': metrics.get('total_items', 0),
-                                    'totalQuantitySold': metrics.get('total_quantity_sold', 0),
-                                    'uniqueSkus': metrics.get('unique_skus', 0),
-                            'averageOrderValue': self._clean_metric_value(metrics.get('average_order_value', 0)),
-                            'medianOrderValue': self._clean_metric_value(metrics.get('median_order_value', 0)),
-                            'percentile75OrderValue': self._clean_metric_value(metrics.get('percentile_75_order_value', 0)),
-                            'percentile25OrderValue': self._clean_metric_value(metrics.get('percentile_25_order_value', 0)),
-                            'orderValueStd': self._clean_metric_value(metrics.get('order_value_std', 0)),
-                            'itemsPerOrder': self._clean_metric_value(metrics.get('items_per_order', 0)),
-                            'revenuePerItem': self._clean_metric_value(metrics.get('revenue_per_item', 0)),
-                            'profitPerItem': self._clean_metric_value(metrics.get('profit_per_item', 0)),
-                            'uniqueCustomers': metrics.get('unique_customers', 0),
-                            'repeatCustomers': metrics.get('repeat_customers', 0),
-                            'customerRetentionRate': self._clean_metric_value(metrics.get('customer_retention_rate', 0)),
-                            'revenuePerCustomer': self._clean_metric_value(metrics.get('revenue_per_customer', 0)),
-                            'ordersPerCustomer': self._clean_metric_value(metrics.get('orders_per_customer', 0)),
-                            'profitPerCustomer': self._clean_metric_value(metrics.get('profit_per_customer', 0)),
-                            'shippedOrders': metrics.get('shipped_orders', 0),
-                            'shippingRate': self._clean_metric_value(metrics.get('shipping_rate', 0)),
-                            'giftOrders': metrics.get('gift_orders', 0),
-                            'giftRate': self._clean_metric_value(metrics.get('gift_rate', 0)),
-                            'avgTimeBetweenOrdersHours': self._clean_metric_value(metrics.get('avg_time_between_orders_hours', 0)),
-                            'ordersPerDay': self._clean_metric_value(metrics.get('orders_per_day', 0)),
-                            'revenuePerDay': self._clean_metric_value(metrics.get('revenue_per_day', 0)),
-                            'totalRefundAmount': self._clean_metric_value(metrics.get('total_refund_amount', 0)),
-                            'totalRefundCount': metrics.get('total_refund_count', 0),
-                            'ordersWithRefunds': metrics.get('orders_with_refunds', 0),
-                            'etsyFeesRetainedOnRefunds': self._clean_metric_value(metrics.get('etsy_fees_retained_on_refunds', 0)),
-                            'refundRateByOrder': self._clean_metric_value(metrics.get('refund_rate_by_order', 0)),
-                            'refundRateByValue': self._clean_metric_value(metrics.get('refund_rate_by_value', 0)),
-                            'orderRefundRate': self._clean_metric_value(metrics.get('order_refund_rate', 0)),
-                            'cancelledOrders': metrics.get('cancelled_orders', 0),
-                            'cancellationRate': self._clean_metric_value(metrics.get('cancellation_rate', 0)),
-                            'completionRate': self._clean_metric_value(metrics.get('completion_rate', 0)),
-                            'primaryPaymentMethod': metrics.get('primary_payment_method'),
-                            'paymentMethodDiversity': metrics.get('payment_method_diversity', 0),
-                            'customerLifetimeValue': self._clean_metric_value(metrics.get('customer_lifetime_value', 0)),
-                            'paybackPeriodDays': self._clean_metric_value(metrics.get('payback_period_days', 0)),
-                            'customerAcquisitionCost': self._clean_metric_value(metrics.get('customer_acquisition_cost', 0)),
-                            'priceElasticity': self._clean_metric_value(metrics.get('price_elasticity', 0)),
-                            'peakMonth': metrics.get('peak_month'),
-                            'peakDayOfWeek': metrics.get('peak_day_of_week'),
-                            'peakHour': metrics.get('peak_hour'),
-                            'seasonalityIndex': self._clean_metric_value(metrics.get('seasonality_index', 0)),
-                            'totalInventory': metrics.get('total_inventory', 0),
-                            'avgPrice': self._clean_metric_value(metrics.get('avg_price', 0)),
-                            'priceRange': self._clean_metric_value(metrics.get('price_range', 0)),
-                            'activeVariants': metrics.get('active_variants', 0),
-                            'inventoryTurnover': self._clean_metric_value(metrics.get('inventory_turnover', 0)),
-                            'stockoutRisk': self._clean_metric_value(metrics.get('stockout_risk', 0)),
-                            'totalAdSpend': self._clean_metric_value(metrics.get('total_ad_spend', 0)),
-                            'adSpendRate': self._clean_metric_value(metrics.get('ad_spend_rate', 0)),
-                            'roas': self._clean_metric_value(metrics.get('roas', 0)),
-                        },
-                        'update': {
-                            'periodDays': metrics.get('period_days', 0),
-                            'grossRevenue': self._clean_metric_value(metrics.get('gross_revenue', 0)),
-                            'totalRevenue': self._clean_metric_value(metrics.get('total_revenue', 0)),
-                            'productRevenue': self._clean_metric_value(metrics.get('product_revenue', 0)),
-                            'totalShippingCharged': self._clean_metric_value(metrics.get('total_shipping_charged', 0)),
-                            'actualShippingCost': self._clean_metric_value(metrics.get('actual_shipping_cost', 0)),
-                            'shippingProfit': self._clean_metric_value(metrics.get('shipping_profit', 0)),
-                            'totalCost': self._clean_metric_value(metrics.get('total_cost', 0)),
-                            'totalCostWithShipping': self._clean_metric_value(metrics.get('total_cost_with_shipping', 0)),
-                            'grossProfit': self._clean_metric_value(metrics.get('gross_profit', 0)),
-                            'netProfit': self._clean_metric_value(metrics.get('net_profit', 0)),
-                            'totalOrders': metrics.get('total_orders', 0),
-                            'totalItems': metrics.get('total_items', 0),
-                            'uniqueCustomers': metrics.get('unique_customers', 0),
-                            'totalAdSpend': self._clean_metric_value(metrics.get('total_ad_spend', 0)),
-                            'roas': self._clean_metric_value(metrics.get('roas', 0)),
-                        }
-                    }
-                )
-                        success_count += 1
-                    except Exception as item_error:
-                        fail_count += 1
-                        logger.error(f"Failed to save listing report {listing_id}: {item_error}")
-                
-                # Log batch results
-                logger.debug(f"✓ Bulk listing reports: {success_count} succeeded, {fail_count} failed")
-                return  # Success (with possible partial failures)
-                
-            except Exception as e:
-                error_str = str(e)
-                error_type = type(e).__name__
-                
-                # Check if it's a connection error
-                is_connection_error = (
-                    "Can't reach database server" in error_str or
-                    "Connection" in error_str or
-                    "not connected" in error_str.lower() or
-                    "ClientNotConnectedError" in error_type or
-                    "ConnectError" in error_type or
-                    "Closed" in error_str or
-                    "broken pipe" in error_str.lower() or
-                    "connection refused" in error_str.lower()
-                )
-                
-                if is_connection_error and attempt < max_retries - 1:
-                    logger.warning(
-                        f"Connection error in bulk listing report save "
-                        f"(attempt {attempt + 1}/{max_retries}), retrying in {retry_delay}s..."
-                    )
-                    await asyncio.sleep(retry_delay)
-                    retry_delay *= 2
-                    continue
-                else:
-                    # Final attempt failed - log and continue
-                    logger.error(
-                        f"⚠️  Bulk listing report save failed after {attempt + 1} attempts: {error_type}"
-                    )
-                    return  # Don't crash, allow processing to continue
-
-    async def _bulk_upsert_product_reports(self, batch: List[Tuple[str, Dict]]):
-        """Bulk upsert product reports using Prisma ORM."""
-        try:
-            # Use Prisma's upsert for each report
-            for period_type, metrics in batch:
-                period_type_enum = {
-                    "yearly": PeriodType.YEARLY,
-                    "monthly": PeriodType.MONTHLY,
-                    "weekly": PeriodType.WEEKLY
-                }[period_type]
-                
-                sku = metrics.get('sku')
-                if not sku:
-                    continue
-                    
-                period_start = metrics['period_start']
-                period_end = metrics['period_end']
-                
-                await self.prisma.productreport.upsert(
-                    where={
-                        'sku_periodType_periodStart_periodEnd': {
-                            'sku': sku,
-                            'periodType': period_type_enum,
-                            'periodStart': period_start,
-                            'periodEnd': period_end
-                        }
-                    },
-                    data={
-                        'create': {
-                            'sku': sku,
-                            'periodType': period_type_enum,
-                            'periodStart': period_start,
-                            'periodEnd': period_end,
-                            'periodDays': metrics.get('period_days', 0),
-                            'grossRevenue': self._clean_metric_value(metrics.get('gross_revenue', 0)),
-                            'totalRevenue': self._clean_metric_value(metrics.get('total_revenue', 0)),
-                            'productRevenue': self._clean_metric_value(metrics.get('product_revenue', 0)),
-                            'totalShippingRevenue': self._clean_metric_value(metrics.get('total_shipping_revenue', 0)),
-                            'totalShippingCharged': self._clean_metric_value(metrics.get('total_shipping_charged', 0)),
-                            'actualShippingCost': self._clean_metric_value(metrics.get('actual_shipping_cost', 0)),
-                            'shippingProfit': self._clean_metric_value(metrics.get('shipping_profit', 0)),
-                            'dutyAmount': self._clean_metric_value(metrics.get('duty_amount', 0)),
-                            'taxAmount': self._clean_metric_value(metrics.get('tax_amount', 0)),
-                            'fedexProcessingFee': self._clean_metric_value(metrics.get('fedex_processing_fee', 0)),
-                            'totalTaxCollected': self._clean_metric_value(metrics.get('total_tax_collected', 0)),
-                            'totalVatCollected': self._clean_metric_value(metrics.get('total_vat_collected', 0)),
-                            'totalGiftWrapRevenue': self._clean_metric_value(metrics.get('total_gift_wrap_revenue', 0)),
-                            'totalDiscountsGiven': self._clean_metric_value(metrics.get('total_discounts_given', 0)),
-                            'etsyTransactionFees': self._clean_metric_value(metrics.get('etsy_transaction_fees', 0)),
-                            'etsyProcessingFees': self._clean_metric_value(metrics.get('etsy_processing_fees', 0)),
-                            'totalEtsyFees': self._clean_metric_value(metrics.get('total_etsy_fees', 0)),
-                            'etsyFeeRate': self._clean_metric_value(metrics.get('etsy_fee_rate', 0)),
-                            'netRevenue': self._clean_metric_value(metrics.get('net_revenue', 0)),
-                            'netRevenueAfterRefunds': self._clean_metric_value(metrics.get('net_revenue_after_refunds', 0)),
-                            'takeHomeRate': self._clean_metric_value(metrics.get('take_home_rate', 0)),
-                            'discountRate': self._clean_metric_value(metrics.get('discount_rate', 0)),
-                            'contributionMargin': self._clean_metric_value(metrics.get('contribution_margin', 0)),
-                            'totalCost': self._clean_metric_value(metrics.get('total_cost', 0)),
-                            'totalCostWithShipping': self._clean_metric_value(metrics.get('total_cost_with_shipping', 0)),
-                            'avgCostPerItem': self._clean_metric_value(metrics.get('avg_cost_per_item', 0)),
-                            'costPerOrder': self._clean_metric_value(metrics.get('cost_per_order', 0)),
-                            'grossProfit': self._clean_metric_value(metrics.get('gross_profit', 0)),
-                            'grossMargin': self._clean_metric_value(metrics.get('gross_margin', 0)),
-                            'netProfit': self._clean_metric_value(metrics.get('net_profit', 0)),
-                            'netMargin': self._clean_metric_value(metrics.get('net_margin', 0)),
-                            'returnOnRevenue': self._clean_metric_value(metrics.get('return_on_revenue', 0)),
-                            'markupRatio': self._clean_metric_value(metrics.get('markup_ratio', 0)),
-                            'totalOrders': metrics.get('total_orders', 0),
-                            'totalItems': metrics.get('total_items', 0),
-                            'totalQuantitySold': metrics.get('total_quantity_sold', 0),
-                            'uniqueSkus': metrics.get('unique_skus', 0),
-                            'averageOrderValue': self._clean_metric_value(metrics.get('average_order_value', 0)),
-                            'medianOrderValue': self._clean_metric_value(metrics.get('median_order_value', 0)),
-                            'percentile75OrderValue': self._clean_metric_value(metrics.get('percentile_75_order_value', 0)),
-                            'percentile25OrderValue': self._clean_metric_value(metrics.get('percentile_25_order_value', 0)),
-                            'orderValueStd': self._clean_metric_value(metrics.get('order_value_std', 0)),
-                            'itemsPerOrder': self._clean_metric_value(metrics.get('items_per_order', 0)),
-                            'revenuePerItem': self._clean_metric_value(metrics.get('revenue_per_item', 0)),
-                            'profitPerItem': self._clean_metric_value(metrics.get('profit_per_item', 0)),
-                            'uniqueCustomers': metrics.get('unique_customers', 0),
-                            'repeatCustomers': metrics.get('repeat_customers', 0),
-                            'customerRetentionRate': self._clean_metric_value(metrics.get('customer_retention_rate', 0)),
-                            'revenuePerCustomer': self._clean_metric_value(metrics.get('revenue_per_customer', 0)),
-                            'ordersPerCustomer': self._clean_metric_value(metrics.get('orders_per_customer', 0)),
-                            'profitPerCustomer': self._clean_metric_value(metrics.get('profit_per_customer', 0)),
-                            'shippedOrders': metrics.get('shipped_orders', 0),
-                            'shippingRate': self._clean_metric_value(metrics.get('shipping_rate', 0)),
-                            'giftOrders': metrics.get('gift_orders', 0),
-                            'giftRate': self._clean_metric_value(metrics.get('gift_rate', 0)),
-                            'avgTimeBetweenOrdersHours': self._clean_metric_value(metrics.get('avg_time_between_orders_hours', 0)),
-                            'ordersPerDay': self._clean_metric_value(metrics.get('orders_per_day', 0)),
-                            'revenuePerDay': self._clean_metric_value(metrics.get('revenue_per_day', 0)),
-                            'totalRefundAmount': self._clean_metric_value(metrics.get('total_refund_amount', 0)),
-                            'totalRefundCount': metrics.get('total_refund_count', 0),
-                            'ordersWithRefunds': metrics.get('orders_with_refunds', 0),
-                            'etsyFeesRetainedOnRefunds': self._clean_metric_value(metrics.get('etsy_fees_retained_on_refunds', 0)),
-                            'refundRateByOrder': self._clean_metric_value(metrics.get('refund_rate_by_order', 0)),
-                            'refundRateByValue': self._clean_metric_value(metrics.get('refund_rate_by_value', 0)),
-                            'orderRefundRate': self._clean_metric_value(metrics.get('order_refund_rate', 0)),
-                            'cancelledOrders': metrics.get('cancelled_orders', 0),
-                            'cancellationRate': self._clean_metric_value(metrics.get('cancellation_rate', 0)),
-                            'completionRate': self._clean_metric_value(metrics.get('completion_rate', 0)),
-                            'primaryPaymentMethod': metrics.get('primary_payment_method'),
-                            'paymentMethodDiversity': metrics.get('payment_method_diversity', 0),
-                            'customerLifetimeValue': self._clean_metric_value(metrics.get('customer_lifetime_value', 0)),
-                            'paybackPeriodDays': self._clean_metric_value(metrics.get('payback_period_days', 0)),
-                            'customerAcquisitionCost': self._clean_metric_value(metrics.get('customer_acquisition_cost', 0)),
-                            'priceElasticity': self._clean_metric_value(metrics.get('price_elasticity', 0)),
-                            'peakMonth': metrics.get('peak_month'),
-                            'peakDayOfWeek': metrics.get('peak_day_of_week'),
-                            'peakHour': metrics.get('peak_hour'),
-                            'seasonalityIndex': self._clean_metric_value(metrics.get('seasonality_index', 0)),
-                            'totalInventory': metrics.get('total_inventory', 0),
-                            'avgPrice': self._clean_metric_value(metrics.get('avg_price', 0)),
-                            'priceRange': self._clean_metric_value(metrics.get('price_range', 0)),
-                            'activeVariants': metrics.get('active_variants', 0),
-                            'inventoryTurnover': self._clean_metric_value(metrics.get('inventory_turnover', 0)),
-                            'stockoutRisk': self._clean_metric_value(metrics.get('stockout_risk', 0)),
-                        },
-                        'update': {
-                            'periodDays': metrics.get('period_days', 0),
-                            'grossRevenue': self._clean_metric_value(metrics.get('gross_revenue', 0)),
-                            'totalRevenue': self._clean_metric_value(metrics.get('total_revenue', 0)),
-                            'productRevenue': self._clean_metric_value(metrics.get('product_revenue', 0)),
-                            'totalShippingCharged': self._clean_metric_value(metrics.get('total_shipping_charged', 0)),
-                            'actualShippingCost': self._clean_metric_value(metrics.get('actual_shipping_cost', 0)),
-                            'shippingProfit': self._clean_metric_value(metrics.get('shipping_profit', 0)),
-                            'totalCost': self._clean_metric_value(metrics.get('total_cost', 0)),
-                            'totalCostWithShipping': self._clean_metric_value(metrics.get('total_cost_with_shipping', 0)),
-                            'grossProfit': self._clean_metric_value(metrics.get('gross_profit', 0)),
-                            'netProfit': self._clean_metric_value(metrics.get('net_profit', 0)),
-                            'totalOrders': metrics.get('total_orders', 0),
-                            'totalItems': metrics.get('total_items', 0),
-                            'uniqueCustomers': metrics.get('unique_customers', 0),
-                        }
-                    }
-                )
-        except Exception as e:
-            logger.error(f"Error in bulk upsert product reports: {e}")
-            # Fallback to individual saves
-            for period_type, metrics in batch:
-                try:
-                    sku = metrics.get('sku')
-                    if sku:
-                        await self.save_product_report(
-                            sku,
-                            metrics,
-                            period_type,
-                            metrics['period_start'],
-                            metrics['period_end']
-                        )
-                except Exception as ex:
-                    logger.error(f"Failed to save product report {sku}: {ex}")
-
-    def _clean_metric_value(self, value):
-        """Clean metric values to prevent NaN, Infinity, or None issues."""
-        if value is None:
-            return 0
-        if isinstance(value, float):
-            if math.isnan(value) or math.isinf(value):
-                return 0
-        return value
+        # Round once at the save boundary (metrics are kept unrounded)
+        metrics = self._round_metrics(metrics)
+        
+        # Map period_type string to enum (same as reportsv3.py)
+        period_type_enum = self._PERIOD_TYPE_MAP[period_type]
+        
+        # Use the same working approach as reportsv3.py - explicit field mapping
+        # Clean all metrics to prevent NaN/Infinity issues
+        # The compound key doubles as the upsert `where`; the payload starts as a copy of it
+        key = {
+            "periodType": period_type_enum,
+            "periodStart": period_start,
+            "periodEnd": period_end,
+        }
+        where = {_SHOP_WHERE_KEY: key}
+        payload = key.copy()
+        # One sweep over the precomputed key map instead of a
+        # _clean_metric_value(metrics.get(...)) call per column
+        payload.update(zip(_SHOP_REPORT_NUMERIC_COLUMNS,
+                           self._clean_metric_values(metrics, _SHOP_REPORT_NUMERIC_KEYS) if clean
+                           else map(metrics.get, _SHOP_REPORT_NUMERIC_KEYS)))
+        payload.update(zip(_SHOP_REPORT_RAW_COLUMNS, map(metrics.get, _SHOP_REPORT_RAW_KEYS)))
+        
+        return where, payload
 
     async def save_shop_report(self, metrics: Dict, period_type: str, 
                               period_start: datetime, period_end: datetime) -> None:
@@ -3571,116 +4135,12 @@ class EcommerceAnalyticsOptimized:
             # Ensure database connection is healthy
             await self._ensure_connection()
             
-            # Map period_type string to enum (same as reportsv3.py)
-            period_type_enum = {
-                "yearly": PeriodType.YEARLY,
-                "monthly": PeriodType.MONTHLY, 
-                "weekly": PeriodType.WEEKLY
-            }[period_type]
-            
-            # Use the same working approach as reportsv3.py - explicit field mapping
-            # Clean all metrics to prevent NaN/Infinity issues
-            payload = {
-                "periodType": period_type_enum,
-                "periodStart": period_start,
-                "periodEnd": period_end,
-                "periodDays": self._clean_metric_value(metrics.get("period_days", 0)),
-                "grossRevenue": self._clean_metric_value(metrics.get("gross_revenue", 0)),
-                "totalRevenue": self._clean_metric_value(metrics.get("total_revenue", 0)),
-                "productRevenue": self._clean_metric_value(metrics.get("product_revenue", 0)),
-                "totalShippingRevenue": self._clean_metric_value(metrics.get("total_shipping_revenue", 0)),
-                "totalShippingCharged": self._clean_metric_value(metrics.get("total_shipping_charged", 0)),
-                "actualShippingCost": self._clean_metric_value(metrics.get("actual_shipping_cost", 0)),
-                "shippingProfit": self._clean_metric_value(metrics.get("shipping_profit", 0)),
-                "dutyAmount": self._clean_metric_value(metrics.get("duty_amount", 0)),
-                "taxAmount": self._clean_metric_value(metrics.get("tax_amount", 0)),
-                "fedexProcessingFee": self._clean_metric_value(metrics.get("fedex_processing_fee", 0)),
-                "totalTaxCollected": self._clean_metric_value(metrics.get("total_tax_collected", 0)),
-                "totalVatCollected": self._clean_metric_value(metrics.get("total_vat_collected", 0)),
-                "totalGiftWrapRevenue": self._clean_metric_value(metrics.get("total_gift_wrap_revenue", 0)),
-                "totalDiscountsGiven": self._clean_metric_value(metrics.get("total_discounts_given", 0)),
-                "etsyTransactionFees": self._clean_metric_value(metrics.get("etsy_transaction_fees", 0)),
-                "etsyProcessingFees": self._clean_metric_value(metrics.get("etsy_processing_fees", 0)),
-                "totalEtsyFees": self._clean_metric_value(metrics.get("total_etsy_fees", 0)),
-                "etsyFeeRate": self._clean_metric_value(metrics.get("etsy_fee_rate", 0)),
-                "netRevenue": self._clean_metric_value(metrics.get("net_revenue", 0)),
-                "netRevenueAfterRefunds": self._clean_metric_value(metrics.get("net_revenue_after_refunds", 0)),
-                "takeHomeRate": self._clean_metric_value(metrics.get("take_home_rate", 0)),
-                "discountRate": self._clean_metric_value(metrics.get("discount_rate", 0)),
-                "contributionMargin": self._clean_metric_value(metrics.get("contribution_margin", 0)),
-                "totalCost": self._clean_metric_value(metrics.get("total_cost", 0)),
-                "totalCostWithShipping": self._clean_metric_value(metrics.get("total_cost_with_shipping", 0)),
-                "avgCostPerItem": self._clean_metric_value(metrics.get("avg_cost_per_item", 0)),
-                "costPerOrder": self._clean_metric_value(metrics.get("cost_per_order", 0)),
-                "grossProfit": self._clean_metric_value(metrics.get("gross_profit", 0)),
-                "grossMargin": self._clean_metric_value(metrics.get("gross_margin", 0)),
-                "netProfit": self._clean_metric_value(metrics.get("net_profit", 0)),
-                "netMargin": self._clean_metric_value(metrics.get("net_margin", 0)),
-                "returnOnRevenue": self._clean_metric_value(metrics.get("return_on_revenue", 0)),
-                "markupRatio": self._clean_metric_value(metrics.get("markup_ratio", 0)),
-                "totalOrders": self._clean_metric_value(metrics.get("total_orders", 0)),
-                "totalItems": self._clean_metric_value(metrics.get("total_items", 0)),
-                "totalQuantitySold": self._clean_metric_value(metrics.get("total_quantity_sold", 0)),
-                "uniqueSkus": self._clean_metric_value(metrics.get("unique_skus", 0)),
-                "averageOrderValue": self._clean_metric_value(metrics.get("average_order_value", 0)),
-                "medianOrderValue": self._clean_metric_value(metrics.get("median_order_value", 0)),
-                "percentile75OrderValue": self._clean_metric_value(metrics.get("percentile_75_order_value", 0)),
-                "percentile25OrderValue": self._clean_metric_value(metrics.get("percentile_25_order_value", 0)),
-                "orderValueStd": self._clean_metric_value(metrics.get("order_value_std", 0)),
-                "itemsPerOrder": self._clean_metric_value(metrics.get("items_per_order", 0)),
-                "revenuePerItem": self._clean_metric_value(metrics.get("revenue_per_item", 0)),
-                "profitPerItem": self._clean_metric_value(metrics.get("profit_per_item", 0)),
-                "uniqueCustomers": self._clean_metric_value(metrics.get("unique_customers", 0)),
-                "repeatCustomers": self._clean_metric_value(metrics.get("repeat_customers", 0)),
-                "customerRetentionRate": self._clean_metric_value(metrics.get("customer_retention_rate", 0)),
-                "revenuePerCustomer": self._clean_metric_value(metrics.get("revenue_per_customer", 0)),
-                "ordersPerCustomer": self._clean_metric_value(metrics.get("orders_per_customer", 0)),
-                "profitPerCustomer": self._clean_metric_value(metrics.get("profit_per_customer", 0)),
-                "shippedOrders": self._clean_metric_value(metrics.get("shipped_orders", 0)),
-                "shippingRate": self._clean_metric_value(metrics.get("shipping_rate", 0)),
-                "giftOrders": self._clean_metric_value(metrics.get("gift_orders", 0)),
-                "giftRate": self._clean_metric_value(metrics.get("gift_rate", 0)),
-                "avgTimeBetweenOrdersHours": self._clean_metric_value(metrics.get("avg_time_between_orders_hours", 0)),
-                "ordersPerDay": self._clean_metric_value(metrics.get("orders_per_day", 0)),
-                "revenuePerDay": self._clean_metric_value(metrics.get("revenue_per_day", 0)),
-                "totalRefundAmount": self._clean_metric_value(metrics.get("total_refund_amount", 0)),
-                "totalRefundCount": self._clean_metric_value(metrics.get("total_refund_count", 0)),
-                "ordersWithRefunds": self._clean_metric_value(metrics.get("orders_with_refunds", 0)),
-                "etsyFeesRetainedOnRefunds": self._clean_metric_value(metrics.get("etsy_fees_retained_on_refunds", 0)),
-                "refundRateByOrder": self._clean_metric_value(metrics.get("refund_rate_by_order", 0)),
-                "refundRateByValue": self._clean_metric_value(metrics.get("refund_rate_by_value", 0)),
-                "orderRefundRate": self._clean_metric_value(metrics.get("order_refund_rate", 0)),
-                "cancelledOrders": self._clean_metric_value(metrics.get("cancelled_orders", 0)),
-                "cancellationRate": self._clean_metric_value(metrics.get("cancellation_rate", 0)),
-                "completionRate": self._clean_metric_value(metrics.get("completion_rate", 0)),
-                "primaryPaymentMethod": metrics.get("primary_payment_method"),
-                "paymentMethodDiversity": self._clean_metric_value(metrics.get("payment_method_diversity", 0)),
-                "customerLifetimeValue": self._clean_metric_value(metrics.get("customer_lifetime_value", 0)),
-                "paybackPeriodDays": self._clean_metric_value(metrics.get("payback_period_days", 0)),
-                "customerAcquisitionCost": self._clean_metric_value(metrics.get("customer_acquisition_cost", 0)),
-                "priceElasticity": self._clean_metric_value(metrics.get("price_elasticity", 0)),
-                "peakMonth": metrics.get("peak_month"),
-                "peakDayOfWeek": metrics.get("peak_day_of_week"),
-                "peakHour": metrics.get("peak_hour"),
-                "seasonalityIndex": self._clean_metric_value(metrics.get("seasonality_index", 0)),
-                "totalInventory": self._clean_metric_value(metrics.get("total_inventory", 0)),
-                "avgPrice": self._clean_metric_value(metrics.get("avg_price", 0)),
-                "priceRange": self._clean_metric_value(metrics.get("price_range", 0)),
-                "activeVariants": self._clean_metric_value(metrics.get("active_variants", 0)),
-                "inventoryTurnover": self._clean_metric_value(metrics.get("inventory_turnover", 0)),
-                "stockoutRisk": self._clean_metric_value(metrics.get("stockout_risk", 0)),
-            }
+            where, payload = self._shop_report_upsert(metrics, period_type, period_start, period_end)
             
             # Wrap upsert with connection retry logic
             async def _upsert_shop_report():
                 return await self.prisma.shopreport.upsert(
-                    where={
-                        "periodType_periodStart_periodEnd": {
-                            "periodType": period_type_enum,
-                            "periodStart": period_start,
-                            "periodEnd": period_end,
-                        }
-                    },
+                    where=where,
                     data={
                         "create": payload,
                         "update": payload
@@ -3690,7 +4150,7 @@ class EcommerceAnalyticsOptimized:
             await self._retry_on_connection_error(_upsert_shop_report)
             
         except Exception as e:
-            logger.error(f"Error saving shop report for {period_type} {period_start}-{period_end}: {e}", exc_info=True)
+            self._log_error(f"Error saving shop report for {period_type} {period_start}-{period_end}: {e}", e)
             raise  # Re-raise to see the full error
 
     async def save_listing_with_products(
@@ -3846,6 +4306,34 @@ class EcommerceAnalyticsOptimized:
                     # Don't raise - allow processing to continue with other listings
                     return
 
+    def _listing_report_upsert(self, listing_id: int, metrics: Dict, period_type: str,
+                               period_start: datetime, period_end: datetime,
+                               clean: bool = True) -> Tuple[Dict, Dict]:
+        """Build the (where, payload) pair of a listing report upsert (see _shop_report_upsert)."""
+        # Round once at the save boundary (metrics are kept unrounded)
+        metrics = self._round_metrics(metrics)
+        
+        # Map period_type string to enum (same as reportsv3.py)
+        period_type_enum = self._PERIOD_TYPE_MAP[period_type]
+        
+        # The compound key doubles as the upsert `where`; the payload starts as a copy of it
+        key = {
+            "listingId": listing_id,
+            "periodType": period_type_enum,
+            "periodStart": period_start,
+            "periodEnd": period_end,
+        }
+        where = {_LISTING_WHERE_KEY: key}
+        payload = key.copy()
+        # Table-driven payload: one sweep over the precomputed key map
+        # instead of a hand-written _clean_metric_value(...) line per column
+        payload.update(zip(_LISTING_REPORT_NUMERIC_COLUMNS,
+                           self._clean_metric_values(metrics, _LISTING_REPORT_NUMERIC_KEYS) if clean
+                           else map(metrics.get, _LISTING_REPORT_NUMERIC_KEYS)))
+        payload.update(zip(_SHOP_REPORT_RAW_COLUMNS, map(metrics.get, _SHOP_REPORT_RAW_KEYS)))
+        
+        return where, payload
+
     async def save_listing_report(self, listing_id: int, metrics: Dict, period_type: str,
                                  period_start: datetime, period_end: datetime) -> None:
         """Save listing report to database."""
@@ -3853,135 +4341,12 @@ class EcommerceAnalyticsOptimized:
             # Ensure database connection is healthy
             await self._ensure_connection()
             
-            # Map period_type string to enum (same as reportsv3.py)
-            period_type_enum = {
-                "yearly": PeriodType.YEARLY,
-                "monthly": PeriodType.MONTHLY, 
-                "weekly": PeriodType.WEEKLY
-            }[period_type]
-            
-            # Use the same working approach - explicit field mapping
-            # Clean all metrics to prevent NaN/Infinity issues
-            payload = {
-                "listingId": listing_id,
-                "periodType": period_type_enum,
-                "periodStart": period_start,
-                "periodEnd": period_end,
-                "periodDays": self._clean_metric_value(metrics.get("period_days", 0)),
-                "grossRevenue": self._clean_metric_value(metrics.get("gross_revenue", 0)),
-                "totalRevenue": self._clean_metric_value(metrics.get("total_revenue", 0)),
-                "productRevenue": self._clean_metric_value(metrics.get("product_revenue", 0)),
-                "totalShippingRevenue": self._clean_metric_value(metrics.get("total_shipping_revenue", 0)),
-                "totalShippingCharged": self._clean_metric_value(metrics.get("total_shipping_charged", 0)),
-                "actualShippingCost": self._clean_metric_value(metrics.get("actual_shipping_cost", 0)),
-                "shippingProfit": self._clean_metric_value(metrics.get("shipping_profit", 0)),
-                "dutyAmount": self._clean_metric_value(metrics.get("duty_amount", 0)),
-                "taxAmount": self._clean_metric_value(metrics.get("tax_amount", 0)),
-                "fedexProcessingFee": self._clean_metric_value(metrics.get("fedex_processing_fee", 0)),
-                "totalTaxCollected": self._clean_metric_value(metrics.get("total_tax_collected", 0)),
-                "totalVatCollected": self._clean_metric_value(metrics.get("total_vat_collected", 0)),
-                "totalGiftWrapRevenue": self._clean_metric_value(metrics.get("total_gift_wrap_revenue", 0)),
-                "totalDiscountsGiven": self._clean_metric_value(metrics.get("total_discounts_given", 0)),
-                "etsyTransactionFees": self._clean_metric_value(metrics.get("etsy_transaction_fees", 0)),
-                "etsyProcessingFees": self._clean_metric_value(metrics.get("etsy_processing_fees", 0)),
-                "totalEtsyFees": self._clean_metric_value(metrics.get("total_etsy_fees", 0)),
-                "etsyFeeRate": self._clean_metric_value(metrics.get("etsy_fee_rate", 0)),
-                "netRevenue": self._clean_metric_value(metrics.get("net_revenue", 0)),
-                "netRevenueAfterRefunds": self._clean_metric_value(metrics.get("net_revenue_after_refunds", 0)),
-                "takeHomeRate": self._clean_metric_value(metrics.get("take_home_rate", 0)),
-                "discountRate": self._clean_metric_value(metrics.get("discount_rate", 0)),
-                "contributionMargin": self._clean_metric_value(metrics.get("contribution_margin", 0)),
-                "totalCost": self._clean_metric_value(metrics.get("total_cost", 0)),
-                "totalCostWithShipping": self._clean_metric_value(metrics.get("total_cost_with_shipping", 0)),
-                "avgCostPerItem": self._clean_metric_value(metrics.get("avg_cost_per_item", 0)),
-                "costPerOrder": self._clean_metric_value(metrics.get("cost_per_order", 0)),
-                "grossProfit": self._clean_metric_value(metrics.get("gross_profit", 0)),
-                "grossMargin": self._clean_metric_value(metrics.get("gross_margin", 0)),
-                "netProfit": self._clean_metric_value(metrics.get("net_profit", 0)),
-                "netMargin": self._clean_metric_value(metrics.get("net_margin", 0)),
-                "returnOnRevenue": self._clean_metric_value(metrics.get("return_on_revenue", 0)),
-                "markupRatio": self._clean_metric_value(metrics.get("markup_ratio", 0)),
-                "totalOrders": self._clean_metric_value(metrics.get("total_orders", 0)),
-                "totalItems": self._clean_metric_value(metrics.get("total_items", 0)),
-                "totalQuantitySold": self._clean_metric_value(metrics.get("total_quantity_sold", 0)),
-                "uniqueSkus": self._clean_metric_value(metrics.get("unique_skus", 0)),
-                "averageOrderValue": self._clean_metric_value(metrics.get("average_order_value", 0)),
-                "medianOrderValue": self._clean_metric_value(metrics.get("median_order_value", 0)),
-                "percentile75OrderValue": self._clean_metric_value(metrics.get("percentile_75_order_value", 0)),
-                "percentile25OrderValue": self._clean_metric_value(metrics.get("percentile_25_order_value", 0)),
-                "orderValueStd": self._clean_metric_value(metrics.get("order_value_std", 0)),
-                "itemsPerOrder": self._clean_metric_value(metrics.get("items_per_order", 0)),
-                "revenuePerItem": self._clean_metric_value(metrics.get("revenue_per_item", 0)),
-                "profitPerItem": self._clean_metric_value(metrics.get("profit_per_item", 0)),
-                "uniqueCustomers": self._clean_metric_value(metrics.get("unique_customers", 0)),
-                "repeatCustomers": self._clean_metric_value(metrics.get("repeat_customers", 0)),
-                "customerRetentionRate": self._clean_metric_value(metrics.get("customer_retention_rate", 0)),
-                "revenuePerCustomer": self._clean_metric_value(metrics.get("revenue_per_customer", 0)),
-                "ordersPerCustomer": self._clean_metric_value(metrics.get("orders_per_customer", 0)),
-                "profitPerCustomer": self._clean_metric_value(metrics.get("profit_per_customer", 0)),
-                "shippedOrders": self._clean_metric_value(metrics.get("shipped_orders", 0)),
-                "shippingRate": self._clean_metric_value(metrics.get("shipping_rate", 0)),
-                "giftOrders": self._clean_metric_value(metrics.get("gift_orders", 0)),
-                "giftRate": self._clean_metric_value(metrics.get("gift_rate", 0)),
-                "avgTimeBetweenOrdersHours": self._clean_metric_value(metrics.get("avg_time_between_orders_hours", 0)),
-                "ordersPerDay": self._clean_metric_value(metrics.get("orders_per_day", 0)),
-                "revenuePerDay": self._clean_metric_value(metrics.get("revenue_per_day", 0)),
-                "totalRefundAmount": self._clean_metric_value(metrics.get("total_refund_amount", 0)),
-                "totalRefundCount": self._clean_metric_value(metrics.get("total_refund_count", 0)),
-                "ordersWithRefunds": self._clean_metric_value(metrics.get("orders_with_refunds", 0)),
-                "etsyFeesRetainedOnRefunds": self._clean_metric_value(metrics.get("etsy_fees_retained_on_refunds", 0)),
-                "refundRateByOrder": self._clean_metric_value(metrics.get("refund_rate_by_order", 0)),
-                "refundRateByValue": self._clean_metric_value(metrics.get("refund_rate_by_value", 0)),
-                "orderRefundRate": self._clean_metric_value(metrics.get("order_refund_rate", 0)),
-                "cancelledOrders": self._clean_metric_value(metrics.get("cancelled_orders", 0)),
-                "cancellationRate": self._clean_metric_value(metrics.get("cancellation_rate", 0)),
-                "completionRate": self._clean_metric_value(metrics.get("completion_rate", 0)),
-                "primaryPaymentMethod": metrics.get("primary_payment_method"),
-                "paymentMethodDiversity": self._clean_metric_value(metrics.get("payment_method_diversity", 0)),
-                "customerLifetimeValue": self._clean_metric_value(metrics.get("customer_lifetime_value", 0)),
-                "paybackPeriodDays": self._clean_metric_value(metrics.get("payback_period_days", 0)),
-                "customerAcquisitionCost": self._clean_metric_value(metrics.get("customer_acquisition_cost", 0)),
-                "priceElasticity": self._clean_metric_value(metrics.get("price_elasticity", 0)),
-                "peakMonth": metrics.get("peak_month"),
-                "peakDayOfWeek": metrics.get("peak_day_of_week"),
-                "peakHour": metrics.get("peak_hour"),
-                "seasonalityIndex": self._clean_metric_value(metrics.get("seasonality_index", 0)),
-                "totalInventory": self._clean_metric_value(metrics.get("total_inventory", 0)),
-                "avgPrice": self._clean_metric_value(metrics.get("avg_price", 0)),
-                "priceRange": self._clean_metric_value(metrics.get("price_range", 0)),
-                "activeVariants": self._clean_metric_value(metrics.get("active_variants", 0)),
-                "inventoryTurnover": self._clean_metric_value(metrics.get("inventory_turnover", 0)),
-                "stockoutRisk": self._clean_metric_value(metrics.get("stockout_risk", 0)),
-                # Listing-specific fields
-                "listingViews": self._clean_metric_value(metrics.get("listing_views", 0)),
-                "listingFavorites": self._clean_metric_value(metrics.get("listing_favorites", 0)),
-                "conversionRate": self._clean_metric_value(metrics.get("conversion_rate", 0)),
-                "favoriteToOrderRate": self._clean_metric_value(metrics.get("favorite_to_order_rate", 0)),
-                "viewToFavoriteRate": self._clean_metric_value(metrics.get("view_to_favorite_rate", 0)),
-                "revenuePerView": self._clean_metric_value(metrics.get("revenue_per_view", 0)),
-                "profitPerView": self._clean_metric_value(metrics.get("profit_per_view", 0)),
-                "costPerAcquisition": self._clean_metric_value(metrics.get("cost_per_acquisition", 0)),
-                "shopAvgViews": self._clean_metric_value(metrics.get("shop_avg_views", 0)),
-                "shopAvgFavorites": self._clean_metric_value(metrics.get("shop_avg_favorites", 0)),
-                "viewsVsShopAvg": self._clean_metric_value(metrics.get("views_vs_shop_avg", 0)),
-                "favoritesVsShopAvg": self._clean_metric_value(metrics.get("favorites_vs_shop_avg", 0)),
-                # Ad spend fields
-                "totalAdSpend": self._clean_metric_value(metrics.get("total_ad_spend", 0)),
-                "adSpendRate": self._clean_metric_value(metrics.get("ad_spend_rate", 0)),
-                "roas": self._clean_metric_value(metrics.get("roas", 0)),
-            }
+            where, payload = self._listing_report_upsert(listing_id, metrics, period_type, period_start, period_end)
             
             # Wrap upsert with connection retry logic
             async def _upsert_listing_report():
                 return await self.prisma.listingreport.upsert(
-                    where={
-                        "listingId_periodType_periodStart_periodEnd": {
-                            "listingId": listing_id,
-                            "periodType": period_type_enum,
-                            "periodStart": period_start,
-                            "periodEnd": period_end,
-                        }
-                    },
+                    where=where,
                     data={
                         "create": payload,
                         "update": payload
@@ -3991,7 +4356,35 @@ class EcommerceAnalyticsOptimized:
             await self._retry_on_connection_error(_upsert_listing_report)
             
         except Exception as e:
-            logger.error(f"Error saving listing report for listing {listing_id}, {period_type} {period_start}-{period_end}: {e}", exc_info=True)
+            self._log_error(f"Error saving listing report for listing {listing_id}, {period_type} {period_start}-{period_end}: {e}", e)
+
+    def _product_report_upsert(self, sku: str, metrics: Dict, period_type: str,
+                               period_start: datetime, period_end: datetime,
+                               clean: bool = True) -> Tuple[Dict, Dict]:
+        """Build the (where, payload) pair of a product report upsert (see _shop_report_upsert)."""
+        # Round once at the save boundary (metrics are kept unrounded)
+        metrics = self._round_metrics(metrics)
+        
+        # Map period_type string to enum (same as reportsv3.py)
+        period_type_enum = self._PERIOD_TYPE_MAP[period_type]
+        
+        # The compound key doubles as the upsert `where`; the payload starts as a copy of it
+        key = {
+            "sku": sku,
+            "periodType": period_type_enum,
+            "periodStart": period_start,
+            "periodEnd": period_end,
+        }
+        where = {_PRODUCT_WHERE_KEY: key}
+        payload = key.copy()
+        # Table-driven payload: one sweep over the precomputed key map
+        # instead of a hand-written _clean_metric_value(...) line per column
+        payload.update(zip(_PRODUCT_REPORT_NUMERIC_COLUMNS,
+                           self._clean_metric_values(metrics, _PRODUCT_REPORT_NUMERIC_KEYS) if clean
+                           else map(metrics.get, _PRODUCT_REPORT_NUMERIC_KEYS)))
+        payload.update(zip(_SHOP_REPORT_RAW_COLUMNS, map(metrics.get, _SHOP_REPORT_RAW_KEYS)))
+        
+        return where, payload
 
     async def save_product_report(self, sku: str, metrics: Dict, period_type: str,
                                  period_start: datetime, period_end: datetime) -> None:
@@ -4000,121 +4393,12 @@ class EcommerceAnalyticsOptimized:
             # Ensure database connection is healthy
             await self._ensure_connection()
             
-            # Map period_type string to enum (same as reportsv3.py)
-            period_type_enum = {
-                "yearly": PeriodType.YEARLY,
-                "monthly": PeriodType.MONTHLY, 
-                "weekly": PeriodType.WEEKLY
-            }[period_type]
-            
-            # Use the same working approach - explicit field mapping
-            # Clean all metrics to prevent NaN/Infinity issues
-            payload = {
-                "sku": sku,
-                "periodType": period_type_enum,
-                "periodStart": period_start,
-                "periodEnd": period_end,
-                "periodDays": self._clean_metric_value(metrics.get("period_days", 0)),
-                "grossRevenue": self._clean_metric_value(metrics.get("gross_revenue", 0)),
-                "totalRevenue": self._clean_metric_value(metrics.get("total_revenue", 0)),
-                "productRevenue": self._clean_metric_value(metrics.get("product_revenue", 0)),
-                "totalShippingRevenue": self._clean_metric_value(metrics.get("total_shipping_revenue", 0)),
-                "totalShippingCharged": self._clean_metric_value(metrics.get("total_shipping_charged", 0)),
-                "actualShippingCost": self._clean_metric_value(metrics.get("actual_shipping_cost", 0)),
-                "shippingProfit": self._clean_metric_value(metrics.get("shipping_profit", 0)),
-                "dutyAmount": self._clean_metric_value(metrics.get("duty_amount", 0)),
-                "taxAmount": self._clean_metric_value(metrics.get("tax_amount", 0)),
-                "fedexProcessingFee": self._clean_metric_value(metrics.get("fedex_processing_fee", 0)),
-                "totalTaxCollected": self._clean_metric_value(metrics.get("total_tax_collected", 0)),
-                "totalVatCollected": self._clean_metric_value(metrics.get("total_vat_collected", 0)),
-                "totalGiftWrapRevenue": self._clean_metric_value(metrics.get("total_gift_wrap_revenue", 0)),
-                "totalDiscountsGiven": self._clean_metric_value(metrics.get("total_discounts_given", 0)),
-                "etsyTransactionFees": self._clean_metric_value(metrics.get("etsy_transaction_fees", 0)),
-                "etsyProcessingFees": self._clean_metric_value(metrics.get("etsy_processing_fees", 0)),
-                "totalEtsyFees": self._clean_metric_value(metrics.get("total_etsy_fees", 0)),
-                "etsyFeeRate": self._clean_metric_value(metrics.get("etsy_fee_rate", 0)),
-                "netRevenue": self._clean_metric_value(metrics.get("net_revenue", 0)),
-                "netRevenueAfterRefunds": self._clean_metric_value(metrics.get("net_revenue_after_refunds", 0)),
-                "takeHomeRate": self._clean_metric_value(metrics.get("take_home_rate", 0)),
-                "discountRate": self._clean_metric_value(metrics.get("discount_rate", 0)),
-                "contributionMargin": self._clean_metric_value(metrics.get("contribution_margin", 0)),
-                "totalCost": self._clean_metric_value(metrics.get("total_cost", 0)),
-                "totalCostWithShipping": self._clean_metric_value(metrics.get("total_cost_with_shipping", 0)),
-                "avgCostPerItem": self._clean_metric_value(metrics.get("avg_cost_per_item", 0)),
-                "costPerOrder": self._clean_metric_value(metrics.get("cost_per_order", 0)),
-                "grossProfit": self._clean_metric_value(metrics.get("gross_profit", 0)),
-                "grossMargin": self._clean_metric_value(metrics.get("gross_margin", 0)),
-                "netProfit": self._clean_metric_value(metrics.get("net_profit", 0)),
-                "netMargin": self._clean_metric_value(metrics.get("net_margin", 0)),
-                "returnOnRevenue": self._clean_metric_value(metrics.get("return_on_revenue", 0)),
-                "markupRatio": self._clean_metric_value(metrics.get("markup_ratio", 0)),
-                "totalOrders": self._clean_metric_value(metrics.get("total_orders", 0)),
-                "totalItems": self._clean_metric_value(metrics.get("total_items", 0)),
-                "totalQuantitySold": self._clean_metric_value(metrics.get("total_quantity_sold", 0)),
-                "uniqueSkus": self._clean_metric_value(metrics.get("unique_skus", 0)),
-                "averageOrderValue": self._clean_metric_value(metrics.get("average_order_value", 0)),
-                "medianOrderValue": self._clean_metric_value(metrics.get("median_order_value", 0)),
-                "percentile75OrderValue": self._clean_metric_value(metrics.get("percentile_75_order_value", 0)),
-                "percentile25OrderValue": self._clean_metric_value(metrics.get("percentile_25_order_value", 0)),
-                "orderValueStd": self._clean_metric_value(metrics.get("order_value_std", 0)),
-                "itemsPerOrder": self._clean_metric_value(metrics.get("items_per_order", 0)),
-                "revenuePerItem": self._clean_metric_value(metrics.get("revenue_per_item", 0)),
-                "profitPerItem": self._clean_metric_value(metrics.get("profit_per_item", 0)),
-                "uniqueCustomers": self._clean_metric_value(metrics.get("unique_customers", 0)),
-                "repeatCustomers": self._clean_metric_value(metrics.get("repeat_customers", 0)),
-                "customerRetentionRate": self._clean_metric_value(metrics.get("customer_retention_rate", 0)),
-                "revenuePerCustomer": self._clean_metric_value(metrics.get("revenue_per_customer", 0)),
-                "ordersPerCustomer": self._clean_metric_value(metrics.get("orders_per_customer", 0)),
-                "profitPerCustomer": self._clean_metric_value(metrics.get("profit_per_customer", 0)),
-                "shippedOrders": self._clean_metric_value(metrics.get("shipped_orders", 0)),
-                "shippingRate": self._clean_metric_value(metrics.get("shipping_rate", 0)),
-                "giftOrders": self._clean_metric_value(metrics.get("gift_orders", 0)),
-                "giftRate": self._clean_metric_value(metrics.get("gift_rate", 0)),
-                "avgTimeBetweenOrdersHours": self._clean_metric_value(metrics.get("avg_time_between_orders_hours", 0)),
-                "ordersPerDay": self._clean_metric_value(metrics.get("orders_per_day", 0)),
-                "revenuePerDay": self._clean_metric_value(metrics.get("revenue_per_day", 0)),
-                "totalRefundAmount": self._clean_metric_value(metrics.get("total_refund_amount", 0)),
-                "totalRefundCount": self._clean_metric_value(metrics.get("total_refund_count", 0)),
-                "ordersWithRefunds": self._clean_metric_value(metrics.get("orders_with_refunds", 0)),
-                "etsyFeesRetainedOnRefunds": self._clean_metric_value(metrics.get("etsy_fees_retained_on_refunds", 0)),
-                "refundRateByOrder": self._clean_metric_value(metrics.get("refund_rate_by_order", 0)),
-                "refundRateByValue": self._clean_metric_value(metrics.get("refund_rate_by_value", 0)),
-                "orderRefundRate": self._clean_metric_value(metrics.get("order_refund_rate", 0)),
-                "cancelledOrders": self._clean_metric_value(metrics.get("cancelled_orders", 0)),
-                "cancellationRate": self._clean_metric_value(metrics.get("cancellation_rate", 0)),
-                "completionRate": self._clean_metric_value(metrics.get("completion_rate", 0)),
-                "primaryPaymentMethod": metrics.get("primary_payment_method"),
-                "paymentMethodDiversity": self._clean_metric_value(metrics.get("payment_method_diversity", 0)),
-                "customerLifetimeValue": self._clean_metric_value(metrics.get("customer_lifetime_value", 0)),
-                "paybackPeriodDays": self._clean_metric_value(metrics.get("payback_period_days", 0)),
-                "customerAcquisitionCost": self._clean_metric_value(metrics.get("customer_acquisition_cost", 0)),
-                "priceElasticity": self._clean_metric_value(metrics.get("price_elasticity", 0)),
-                "peakMonth": metrics.get("peak_month"),
-                "peakDayOfWeek": metrics.get("peak_day_of_week"),
-                "peakHour": metrics.get("peak_hour"),
-                "seasonalityIndex": self._clean_metric_value(metrics.get("seasonality_index", 0)),
-                "totalInventory": self._clean_metric_value(metrics.get("total_inventory", 0)),
-                "avgPrice": self._clean_metric_value(metrics.get("avg_price", 0)),
-                "priceRange": self._clean_metric_value(metrics.get("price_range", 0)),
-                "activeVariants": self._clean_metric_value(metrics.get("active_variants", 0)),
-                "inventoryTurnover": self._clean_metric_value(metrics.get("inventory_turnover", 0)),
-                "stockoutRisk": self._clean_metric_value(metrics.get("stockout_risk", 0)),
-                "totalAdSpend": self._clean_metric_value(metrics.get("total_ad_spend", 0)),
-                "adSpendRate": self._clean_metric_value(metrics.get("ad_spend_rate", 0)),
-                "roas": self._clean_metric_value(metrics.get("roas", 0)),
-            }
+            where, payload = self._product_report_upsert(sku, metrics, period_type, period_start, period_end)
             
             # Wrap upsert with connection retry logic
             async def _upsert_product_report():
                 return await self.prisma.productreport.upsert(
-                    where={
-                        "sku_periodType_periodStart_periodEnd": {
-                            "sku": sku,
-                            "periodType": period_type_enum,
-                            "periodStart": period_start,
-                            "periodEnd": period_end,
-                        }
-                    },
+                    where=where,
                     data={
                         "create": payload,
                         "update": payload
@@ -4124,9 +4408,292 @@ class EcommerceAnalyticsOptimized:
             await self._retry_on_connection_error(_upsert_product_report)
             
         except Exception as e:
-            logger.error(f"Error saving product report for SKU {sku}, {period_type} {period_start}-{period_end}: {e}", exc_info=True)
+            self._log_error(f"Error saving product report for SKU {sku}, {period_type} {period_start}-{period_end}: {e}", e)
+
+    def _log_error(self, message: str, error: Exception) -> None:
+        """
+        Log an error from a per-entity hot path.
+        
+        Only the first few errors of each exception type carry a traceback, so a
+        cascading failure (e.g. a DB outage across thousands of SKUs) doesn't
+        spend the run formatting identical stack traces.
+        """
+        error_type = type(error).__name__
+        self._error_counts[error_type] += 1
+        logger.error(message, exc_info=self._error_counts[error_type] <= self._ERROR_TRACEBACKS_PER_TYPE)
+
+    def _clean_report_payloads(self, report_type: str, upserts: List[Tuple[Dict, Dict]]) -> None:
+        """
+        Clean the numeric columns of many report payloads in place, in one pass.
+        
+        All payloads are stacked into a (reports x columns) float64 matrix (None ->
+        NaN) and one np.isfinite mask finds every cell to zero; other cells keep
+        their original value and type (ints stay ints).
+        """
+        numeric_columns = self._REPORT_NUMERIC_COLUMNS[report_type]
+        get_numeric = itemgetter(*numeric_columns)
+        try:
+            matrix = np.array([get_numeric(payload) for _, payload in upserts], dtype=np.float64)
+        except (TypeError, ValueError):
+            # A non-numeric value slipped in; clean value by value instead
+            for _, payload in upserts:
+                payload.update(zip(numeric_columns, map(self._clean_metric_value, get_numeric(payload))))
+            return
+        
+        bad_rows, bad_cols = np.nonzero(~np.isfinite(matrix))
+        for row, col in zip(bad_rows.tolist(), bad_cols.tolist()):
+            upserts[row][1][numeric_columns[col]] = 0
+
+    def _bulk_report_upsert_query(self, report_type: str) -> Tuple[str, Tuple[str, ...]]:
+        """Build (once per report type) the unnest() upsert statement and its column order."""
+        cached = self._BULK_REPORT_QUERIES.get(report_type)
+        if cached is not None:
+            return cached
+        
+        table, key_columns, value_columns = self._REPORT_TABLES[report_type]
+        columns = (*key_columns, *value_columns)
+        mapped = self._REPORT_MAPPED_COLUMNS
+        db_columns = [f'"{mapped.get(column, column)}"' for column in columns]
+        arrays = ", ".join(
+            f"${i}::{self._REPORT_COLUMN_TYPES.get(column, 'float8[]')}" for i, column in enumerate(columns, 1)
+        )
+        query = f"""
+            INSERT INTO {table} ({", ".join(db_columns)})
+            SELECT * FROM unnest({arrays})
+            ON CONFLICT ({", ".join(db_columns[:len(key_columns)])})
+            DO UPDATE SET {", ".join(f"{c} = EXCLUDED.{c}" for c in db_columns[len(key_columns):])}
+        """
+        cached = self._BULK_REPORT_QUERIES[report_type] = (query, columns)
+        return cached
+
+    def _bulk_report_params(self, columns: Tuple[str, ...], column_values) -> List[List]:
+        """Turn per-column value tuples into plain-Python arrays matching the SQL casts."""
+        params = []
+        for column, values in zip(columns, column_values):
+            sql_type = self._REPORT_COLUMN_TYPES.get(column, 'float8[]')
+            if sql_type == 'float8[]':
+                values = np.asarray(values, dtype=np.float64).tolist()
+            elif sql_type == 'int[]':
+                values = [None if value is None else int(value) for value in values]
+            elif column == 'periodType':
+                labels = self._PERIOD_TYPE_LABELS
+                values = [labels[value] if value in labels else str(value) for value in values]
+            else:
+                values = list(values)
+            params.append(values)
+        return params
+
+    @staticmethod
+    def _report_row_key(values: Tuple) -> Tuple:
+        """Normalize (entity..., period type, start, end) from a DB row or an upsert where."""
+        *entity, period_type, period_start, period_end = values
+        period_type = period_type.value if hasattr(period_type, 'value') else str(period_type)
+        if isinstance(period_start, str):
+            period_start = datetime.fromisoformat(period_start.replace('Z', '+00:00'))
+        if isinstance(period_end, str):
+            period_end = datetime.fromisoformat(period_end.replace('Z', '+00:00'))
+        return (*entity, period_type, period_start.date(), period_end.date())
+
+    def _report_fingerprint_layout(self, report_type: str) -> Tuple:
+        """
+        Build (once per report type) the SQL fingerprint query and the matching Python packing.
+        
+        A fingerprint is the md5 of the value columns in their binary send format:
+        float8 columns first (8 big-endian bytes each), then int and text columns,
+        each behind a NULL marker byte (text also behind its byte length).
+        _report_fingerprint packs a payload the same way with struct, so stored
+        rows are compared without reading their values into Python.
+        """
+        cached = self._REPORT_FINGERPRINT_LAYOUTS.get(report_type)
+        if cached is not None:
+            return cached
+        
+        table, key_columns, value_columns = self._REPORT_TABLES[report_type]
+        mapped = self._REPORT_MAPPED_COLUMNS
+        types = self._REPORT_COLUMN_TYPES
+        float_columns = tuple(c for c in value_columns if types.get(c, 'float8[]') == 'float8[]')
+        int_columns = tuple(c for c in value_columns if types.get(c) == 'int[]')
+        text_columns = tuple(c for c in value_columns if types.get(c) == 'text[]')
+        
+        def db(column):
+            return f'"{mapped.get(column, column)}"'
+        
+        # A stored NULL float becomes NaN, which cleaned payloads never contain
+        parts = [f"float8send(coalesce({db(c)}, 'NaN'))" for c in float_columns]
+        parts += [f"coalesce('\\x01'::bytea || int4send({db(c)}), '\\x00'::bytea)" for c in int_columns]
+        parts += [
+            f"coalesce('\\x01'::bytea || int4send(octet_length({db(c)})) || convert_to({db(c)}, 'UTF8'), '\\x00'::bytea)"
+            for c in text_columns
+        ]
+        select = ", ".join(f'{db(c)} AS "{c}"' for c in key_columns)
+        # Only the periods being regenerated, matched by date like _report_row_key
+        query = f"""
+            SELECT {select}, md5({" || ".join(parts)}) AS fingerprint
+            FROM {table}
+            WHERE ("periodType"::text, "periodStart"::date, "periodEnd"::date) IN (
+                SELECT * FROM unnest($1::text[], $2::text[]::date[], $3::text[]::date[])
+            )
+        """
+        cached = self._REPORT_FINGERPRINT_LAYOUTS[report_type] = (
+            query, itemgetter(*float_columns), struct.Struct(f">{len(float_columns)}d"), int_columns, text_columns
+        )
+        return cached
+
+    def _report_fingerprint(self, report_type: str, payload: Dict) -> Optional[str]:
+        """md5 of a cleaned payload's value columns, packed like the SQL fingerprint (None if unpackable)."""
+        _, get_floats, pack_floats, int_columns, text_columns = self._report_fingerprint_layout(report_type)
+        try:
+            parts = [pack_floats.pack(*get_floats(payload))]
+            for column in int_columns:
+                value = payload.get(column)
+                parts.append(b'\x00' if value is None else b'\x01' + _PACK_INT4(int(value)))
+            for column in text_columns:
+                value = payload.get(column)
+                if value is None:
+                    parts.append(b'\x00')
+                else:
+                    raw = str(value).encode('utf-8')
+                    parts.append(b'\x01' + _PACK_INT4(len(raw)) + raw)
+        except (TypeError, ValueError, struct.error):
+            return None
+        return hashlib.md5(b''.join(parts)).hexdigest()
+
+    async def _load_report_fingerprints(self, report_type: str, periods: Dict[str, List[DateRange]]) -> None:
+        """
+        Fingerprint the stored report rows of the periods being regenerated so
+        save_reports_bulk can skip upserts that would rewrite identical values
+        (e.g. closed past periods).
+        
+        Postgres hashes each row itself and returns only (key, md5), so no stored
+        value crosses the wire. On failure nothing is skipped.
+        """
+        _, key_columns, _ = self._REPORT_TABLES[report_type]
+        query = self._report_fingerprint_layout(report_type)[0]
+        labels = self._PERIOD_TYPE_LABELS
+        period_keys = [
+            (labels[self._PERIOD_TYPE_MAP[period_type]], date_range.start_date.date().isoformat(),
+             date_range.end_date.date().isoformat())
+            for period_type, date_ranges in periods.items() for date_range in date_ranges
+        ]
+        
+        try:
+            await self._ensure_connection()
+            rows = await self.prisma.query_raw(query, *map(list, zip(*period_keys))) if period_keys else []
+        except Exception as e:
+            logger.warning(f"Could not fingerprint stored {report_type} reports, every report will be saved: {e}")
+            self._report_fingerprints.pop(report_type, None)
+            return
+        
+        get_key = itemgetter(*key_columns)
+        self._report_fingerprints[report_type] = {
+            self._report_row_key(get_key(row)): row['fingerprint'] for row in rows
+        }
+        tqdm.write(f"  ✓ Fingerprinted {len(rows):,} stored {report_type} reports (unchanged ones are not re-saved)")
+
+    async def save_reports_bulk(self, report_type: str, upserts: List[Tuple[Dict, Dict]]) -> None:
+        """
+        Save many reports of one type ("shop", "listing" or "product") in batches.
+        
+        upserts are (where, payload) pairs from the _*_report_upsert builders; ones
+        identical to the stored row (see _load_report_fingerprints) are skipped. Every
+        _REPORT_FLUSH_SIZE of them go to Postgres as ONE INSERT ... SELECT FROM unnest()
+        ... ON CONFLICT DO UPDATE statement (one array parameter per column); a chunk
+        that fails is retried report by report through Prisma so one bad row doesn't
+        drop the rest.
+        """
+        if not upserts:
+            return
+        
+        # Zero None/NaN/Infinity across the whole batch before comparing or sending
+        self._clean_report_payloads(report_type, upserts)
+        
+        # Drop reports whose values match the stored row exactly
+        fingerprints = self._report_fingerprints.get(report_type)
+        if fingerprints:
+            _, key_columns, _ = self._REPORT_TABLES[report_type]
+            get_key = itemgetter(*key_columns)
+            changed = []
+            for where, payload in upserts:
+                stored = fingerprints.get(self._report_row_key(get_key(payload)))
+                if stored is None or stored != self._report_fingerprint(report_type, payload):
+                    changed.append((where, payload))
+            if len(changed) < len(upserts):
+                logger.debug(f"Skipped {len(upserts) - len(changed)} unchanged {report_type} reports")
+            upserts = changed
+        
+        model_name = self._REPORT_MODELS[report_type]
+        query, columns = self._bulk_report_upsert_query(report_type)
+        get_columns = itemgetter(*columns)
+        for i in range(0, len(upserts), self._REPORT_FLUSH_SIZE):
+            chunk = upserts[i:i + self._REPORT_FLUSH_SIZE]
+            
+            async with self._write_semaphore:
+                try:
+                    params = self._bulk_report_params(columns, zip(*(get_columns(payload) for _, payload in chunk)))
+                    await self._retry_on_connection_error(self.prisma.execute_raw, query, *params)
+                except Exception as e:
+                    logger.error(f"Bulk save of {len(chunk)} {report_type} reports failed, saving one by one: {e}")
+                    model = getattr(self.prisma, model_name)
+                    for where, payload in chunk:
+                        try:
+                            await self._retry_on_connection_error(
+                                model.upsert, where=where, data={"create": payload, "update": payload}
+                            )
+                        except Exception as row_error:
+                            self._log_error(f"Error saving {report_type} report {where}: {row_error}", row_error)
             
 
+    async def _start_report_writers(self) -> None:
+        """Start one background writer per write slot to drain queue_report_saves."""
+        if self._report_queue is not None:
+            return
+        self._report_queue = asyncio.Queue(maxsize=self._REPORT_QUEUE_SIZE)
+        self._report_writers = [
+            asyncio.create_task(self._report_writer(self._report_queue)) for _ in range(self._db_write_slots)
+        ]
+
+    async def _report_writer(self, queue: asyncio.Queue) -> None:
+        """Save queued (report_type, upserts) batches until cancelled."""
+        while True:
+            report_type, upserts = await queue.get()
+            try:
+                await self.save_reports_bulk(report_type, upserts)
+            except Exception as e:
+                self._log_error(f"Background save of {len(upserts)} {report_type} reports failed: {e}", e)
+            finally:
+                queue.task_done()
+
+    async def queue_report_saves(self, report_type: str, upserts: List[Tuple[Dict, Dict]]) -> None:
+        """
+        Hand a batch of report upserts to the background writers.
+        
+        The caller goes back to calculating while the batch is written (it only
+        waits when _REPORT_QUEUE_SIZE batches are already pending). Without
+        running writers the batch is saved inline.
+        """
+        if not upserts:
+            return
+        if self._report_queue is None:
+            await self.save_reports_bulk(report_type, upserts)
+            return
+        await self._report_queue.put((report_type, upserts))
+
+    async def _drain_report_saves(self) -> None:
+        """Wait until every queued report batch has been written."""
+        if self._report_queue is not None:
+            await self._report_queue.join()
+
+    async def _stop_report_writers(self) -> None:
+        """Drain the queue, then stop the background writers."""
+        if self._report_queue is None:
+            return
+        await self._drain_report_saves()
+        for writer in self._report_writers:
+            writer.cancel()
+        await asyncio.gather(*self._report_writers, return_exceptions=True)
+        self._report_queue = None
+        self._report_writers = []
+
     async def generate_all_insights_batch(self, clean_old_data: bool = False, 
                                          skip_products: bool = False,
                                          skip_listings: bool = False,
@@ -4174,25 +4741,34 @@ class EcommerceAnalyticsOptimized:
             
             # Get all SKUs and listings
             all_skus = await self.get_all_skus()
+            await self.refresh_listings_view()
             all_listings = await self.get_all_listings()
             tqdm.write(f"📦 Found {len(all_skus)} SKUs and {len(all_listings)} listings")
             
-            # Create semaphore for controlled parallelism
-            semaphore = asyncio.Semaphore(self.max_concurrent)
+            # Create semaphore for controlled parallelism (read lane; writes use _write_semaphore)
+            semaphore = asyncio.Semaphore(max(1, self.max_concurrent - self._db_write_slots))
+            # Report batches are written in the background while the next ones are calculated
+            await self._start_report_writers()
             
             # Storage for calculated metrics (for aggregation)
-            sku_metrics_store = {}  # {sku: {period_key: metrics}}
-            listing_metrics_store = {}  # {listing_id: {period_key: metrics}}
+            sku_metrics_store = SkuMetricsStore(  # (sku, period, additive field) array + non-additive dicts
+                [dr.cache_key(period_type)
+                 for period_type, date_ranges in periods.items() for dr in date_ranges],
+                capacity=len(all_skus)
+            )
+            listing_rollup_store = {}  # {(period_type, start, end): PeriodRollup} - listings folded per period
             
             # Chunk size for processing - REDUCED for listings due to multiple queries per listing
             # Each listing makes 3-5 database queries (get_child_skus, calculate_metrics, ad_spend, save)
             # So we need much smaller chunks to avoid overwhelming the connection pool
             sku_chunk_size = self.max_concurrent * 3  # SKUs: balanced for file descriptors
             listing_chunk_size = max(5, self.max_concurrent // 4)  # Listings: MUCH smaller due to multiple DB calls per listing
+            sku_chunk_workers = max(2, self.max_concurrent // 4)  # SKU chunks in flight (one bulk query + one bulk save each)
             
             tqdm.write(f"🔧 Concurrency settings:")
-            tqdm.write(f"   max_concurrent: {self.max_concurrent}")
-            tqdm.write(f"   SKU chunk size: {sku_chunk_size}")
+            tqdm.write(f"   max_concurrent: {self.max_concurrent} "
+                       f"({self.max_concurrent - self._db_write_slots} read / {self._db_write_slots} write slots)")
+            tqdm.write(f"   SKU chunk size: {sku_chunk_size} ({sku_chunk_workers} chunk workers)")
             tqdm.write(f"   Listing chunk size: {listing_chunk_size} (reduced due to 3-5 DB queries per listing)")
             tqdm.write(f"   Estimated peak DB connections: ~{listing_chunk_size * 5} for listings\n")
             
@@ -4205,27 +4781,32 @@ class EcommerceAnalyticsOptimized:
                 tqdm.write("   Processing from raw transactions (base level)")
                 tqdm.write("="*80)
                 
-                sku_tasks = []
-                for sku in all_skus:
-                    task = self._process_sku_reports_with_cache(sku, periods, semaphore, sku_metrics_store)
-                    sku_tasks.append(task)
+                await self._load_report_fingerprints("product", periods)
                 
                 # Process with progress bar
                 with tqdm(
-                    total=len(sku_tasks), 
+                    total=len(all_skus), 
                     desc="📦 Processing SKUs",
                     unit="sku",
                     ncols=100,
+                    mininterval=0.5,  # Repaint at most twice a second
                     bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]",
                     colour='green'
                 ) as pbar:
-                    for i in range(0, len(sku_tasks), sku_chunk_size):
-                        chunk = sku_tasks[i:i + sku_chunk_size]
-                        await asyncio.gather(*chunk)
-                        pbar.update(len(chunk))
-                        # Small delay to prevent file descriptor exhaustion
-                        if len(chunk) == sku_chunk_size:
-                            await asyncio.sleep(0.01)
+                    # Long-lived workers pull SKU chunks from a queue, so a worker that
+                    # finishes picks up the next chunk at once instead of waiting for
+                    # the slowest chunk of a lock-step round
+                    chunk_queue: asyncio.Queue = asyncio.Queue()
+                    for i in range(0, len(all_skus), sku_chunk_size):
+                        chunk_queue.put_nowait(all_skus[i:i + sku_chunk_size])
+                    
+                    async def _sku_chunk_worker():
+                        while not chunk_queue.empty():
+                            chunk = chunk_queue.get_nowait()
+                            await self._process_sku_chunk(chunk, periods, semaphore, sku_metrics_store, pbar)
+                    
+                    await asyncio.gather(*(_sku_chunk_worker() for _ in range(sku_chunk_workers)))
+                    await self._drain_report_saves()
                 
                 tqdm.write(f"✅ Completed {len(all_skus)} SKUs\n")
             else:
@@ -4240,8 +4821,8 @@ class EcommerceAnalyticsOptimized:
                 
                 # Debug: Check what's actually in the cache
                 if sku_metrics_store:
-                    sample_sku = list(sku_metrics_store.keys())[0]
-                    sample_periods = list(sku_metrics_store[sample_sku].keys())
+                    sample_sku = next(iter(sku_metrics_store.sku_index))
+                    sample_periods = sku_metrics_store.periods_of(sample_sku)
                     tqdm.write(f"   Example SKU: {sample_sku}")
                     tqdm.write(f"   Sample periods: {sample_periods[:3] if len(sample_periods) > 3 else sample_periods}")
                 else:
@@ -4263,12 +4844,18 @@ class EcommerceAnalyticsOptimized:
                 tqdm.write("   Aggregating from child products")
                 tqdm.write("="*80)
                 
-                listing_tasks = []
-                for listing_id in all_listings:
-                    task = self._process_listing_reports_aggregated(
-                        listing_id, periods, semaphore, sku_metrics_store, listing_metrics_store
-                    )
-                    listing_tasks.append(task)
+                await self._load_report_fingerprints("listing", periods)
+                
+                # Bound listings with their own semaphore instead of fixed-size chunks:
+                # peak concurrency stays at listing_chunk_size, but one slow listing
+                # no longer holds back the rest of its chunk
+                listing_semaphore = asyncio.Semaphore(listing_chunk_size)
+                listing_tasks = [
+                    asyncio.create_task(self._process_listing_reports_aggregated(
+                        listing_id, periods, listing_semaphore, sku_metrics_store, listing_rollup_store
+                    ))
+                    for listing_id in all_listings
+                ]
                 
                 # Process with progress bar
                 with tqdm(
@@ -4276,17 +4863,14 @@ class EcommerceAnalyticsOptimized:
                     desc="📋 Processing Listings",
                     unit="listing",
                     ncols=100,
+                    mininterval=0.5,  # Repaint at most twice a second
                     bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]",
                     colour='blue'
                 ) as pbar:
-                    for i in range(0, len(listing_tasks), listing_chunk_size):
-                        chunk = listing_tasks[i:i + listing_chunk_size]
-                        await asyncio.gather(*chunk)
-                        pbar.update(len(chunk))
-                        # Longer delay for listings to prevent connection pool exhaustion
-                        # Each listing makes 3-5 database queries, so we need more breathing room
-                        if len(chunk) == listing_chunk_size:
-                            await asyncio.sleep(0.1)  # 100ms delay between chunks
+                    for finished in asyncio.as_completed(listing_tasks):
+                        await finished
+                        pbar.update(1)
+                    await self._drain_report_saves()
                 
                 tqdm.write(f"✅ Completed {len(all_listings)} listings\n")
             else:
@@ -4296,8 +4880,13 @@ class EcommerceAnalyticsOptimized:
                 tqdm.write("   (Skipping recalculation - using cached data)")
                 tqdm.write("="*80)
                 
-                await self._load_listing_reports_into_cache(listing_metrics_store, periods)
-                tqdm.write(f"✅ Loaded {len(listing_metrics_store)} listings from database\n")
+                await self._load_listing_reports_into_cache(listing_rollup_store, periods)
+                tqdm.write(f"✅ Loaded {len(self._rolled_up_listing_ids)} listings from database\n")
+            
+            # Phase 3 reads only the per-period listing roll-ups, so drop the SKU
+            # store (its arrays and per-SKU extras) before the shop pass by dropping
+            # the last reference to it
+            sku_metrics_store = None
             
             # ==========================================
             # PHASE 3: SHOP REPORTS (AGGREGATE FROM ALL LISTINGS)
@@ -4308,37 +4897,33 @@ class EcommerceAnalyticsOptimized:
                 tqdm.write("   Aggregating from all listings")
                 tqdm.write("="*80)
                 
-                shop_tasks = []
-                for period_type, date_ranges in periods.items():
-                    task = self._process_shop_reports_aggregated(
-                        period_type, date_ranges, semaphore, listing_metrics_store
-                    )
-                    shop_tasks.append(task)
+                await self._load_report_fingerprints("shop", periods)
                 
-                tqdm.write(f"   Processing {len(shop_tasks)} report types (yearly, monthly, weekly)")
+                tqdm.write(f"   Processing {len(periods)} report types ({', '.join(periods)}) concurrently")
                 tqdm.write(f"   Note: Shop reports aggregate from all listings, queries may be large")
-                tqdm.write(f"   Processing SEQUENTIALLY to avoid overwhelming database\n")
+                tqdm.write(f"   Each type holds one semaphore slot, so DB load stays bounded\n")
                 
-                # Process with progress bar - shop reports MUST be processed SEQUENTIALLY
-                # Running them in parallel with asyncio.gather() would create too many DB connections!
-                # Each shop task processes all date ranges for that period type
+                # Period types are independent (one lookup pass, at most one batched
+                # fallback query and one bulk save each), so run them side by side;
+                # the bar advances as each type finishes, in whatever order
                 with tqdm(
-                    total=len(shop_tasks), 
+                    total=len(periods), 
                     desc="🏪 Processing Shop Reports",
                     unit="type",
                     ncols=100,
+                    mininterval=0.5,  # Repaint at most twice a second
                     bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]",
                     colour='cyan'
                 ) as pbar:
-                    # IMPORTANT: Process sequentially, NOT in parallel!
-                    for i, task in enumerate(shop_tasks):
-                        period_name = ['Yearly', 'Monthly', 'Weekly'][i] if i < 3 else f'Period {i+1}'
-                        tqdm.write(f"   Processing {period_name} reports...")
-                        await task
-                        pbar.update(1)
-                        # Add delay between shop report types to prevent connection issues
-                        if i < len(shop_tasks) - 1:  # Don't delay after last one
-                            await asyncio.sleep(0.5)  # 500ms delay between report types
+                    shop_tasks = []
+                    for period_type, date_ranges in periods.items():
+                        task = asyncio.create_task(self._process_shop_reports_aggregated(
+                            period_type, date_ranges, semaphore, listing_rollup_store
+                        ))
+                        task.add_done_callback(lambda _: pbar.update(1))
+                        shop_tasks.append(task)
+                    await asyncio.gather(*shop_tasks)
+                    await self._drain_report_saves()
                 
                 tqdm.write(f"✅ Completed all shop reports\n")
             else:
@@ -4410,6 +4995,13 @@ class EcommerceAnalyticsOptimized:
         except Exception as e:
             logger.error(f"Error in batch generation: {e}", exc_info=True)
             return None
+        finally:
+            await self._stop_report_writers()
+            if self._error_counts:
+                logger.warning(
+                    f"⚠️ Errors during generation by type: {dict(self._error_counts)} "
+                    f"(tracebacks logged for the first {self._ERROR_TRACEBACKS_PER_TYPE} of each)"
+                )
 
     async def _process_shop_reports(self, period_type: str, date_ranges: List[DateRange], semaphore: asyncio.Semaphore):
         """Process all shop reports for a given period type."""
@@ -4418,14 +5010,13 @@ class EcommerceAnalyticsOptimized:
                 logger.info(f"  → Processing {period_type.upper()} shop reports...")
                 all_metrics = await self.calculate_metrics_batch(date_ranges, period_type=period_type)
                 
-                saved_count = 0
-                for period_key, metrics in all_metrics.items():
-                    if metrics.get('total_orders', 0) > 0:
-                        await self.save_shop_report(
-                            metrics, period_type,
-                            metrics['period_start'], metrics['period_end']
-                        )
-                        saved_count += 1
+                shop_saves = [
+                    self._shop_report_upsert(metrics, period_type, metrics['period_start'], metrics['period_end'],
+                                             clean=False)
+                    for metrics in all_metrics.values() if metrics.get('total_orders', 0) > 0
+                ]
+                saved_count = len(shop_saves)
+                await self.save_reports_bulk("shop", shop_saves)
                 
                 logger.info(f"  ✅ {period_type.upper()}: Saved {saved_count}/{len(date_ranges)} periods")
             except Exception as e:
@@ -4435,15 +5026,15 @@ class EcommerceAnalyticsOptimized:
         """Process all reports for a single listing (all period types)."""
         async with semaphore:
             try:
-                for period_type, date_ranges in periods.items():
-                    all_metrics = await self.calculate_metrics_batch(date_ranges, period_type=period_type, listing_id=listing_id)
-                    
-                    for period_key, metrics in all_metrics.items():
-                        if metrics.get('total_orders', 0) > 0:
-                            await self.save_listing_report(
-                                listing_id, metrics, period_type,
-                                metrics['period_start'], metrics['period_end']
-                            )
+                # One query for all period types of this listing
+                metrics_by_type = await self.calculate_metrics_for_periods(periods, listing_id=listing_id)
+                # Every period type of the listing in batched round trips
+                await self.save_reports_bulk("listing", [
+                    self._listing_report_upsert(listing_id, metrics, period_type,
+                                                metrics['period_start'], metrics['period_end'], clean=False)
+                    for period_type, all_metrics in metrics_by_type.items()
+                    for metrics in all_metrics.values() if metrics.get('total_orders', 0) > 0
+                ])
             except Exception as e:
                 logger.error(f"Error processing listing {listing_id}: {e}")
 
@@ -4451,15 +5042,15 @@ class EcommerceAnalyticsOptimized:
         """Process all reports for a single SKU (all period types)."""
         async with semaphore:
             try:
-                for period_type, date_ranges in periods.items():
-                    all_metrics = await self.calculate_metrics_batch(date_ranges, period_type=period_type, sku=sku)
-                    
-                    for period_key, metrics in all_metrics.items():
-                        if metrics.get('total_orders', 0) > 0:
-                            await self.save_product_report(
-                                sku, metrics, period_type,
-                                metrics['period_start'], metrics['period_end']
-                            )
+                # One query for all period types of this SKU
+                metrics_by_type = await self.calculate_metrics_for_periods(periods, sku=sku)
+                # Every period type of the SKU in batched round trips
+                await self.save_reports_bulk("product", [
+                    self._product_report_upsert(sku, metrics, period_type,
+                                                metrics['period_start'], metrics['period_end'], clean=False)
+                    for period_type, all_metrics in metrics_by_type.items()
+                    for metrics in all_metrics.values() if metrics.get('total_orders', 0) > 0
+                ])
             except Exception as e:
                 logger.error(f"Error processing SKU {sku}: {e}")
 
@@ -4467,52 +5058,94 @@ class EcommerceAnalyticsOptimized:
     # NEW HIERARCHICAL AGGREGATION METHODS
     # ============================================================================
     
-    async def _process_sku_reports_with_cache(self, sku: str, periods: Dict, semaphore: asyncio.Semaphore, cache_store: Dict):
+    async def _process_sku_chunk(self, chunk: List[str], periods: Dict, semaphore: asyncio.Semaphore,
+                                 sku_metrics_store: SkuMetricsStore, pbar: Optional[tqdm] = None):
+        """
+        Calculate, cache and bulk-save the product reports of one chunk of SKUs.
+        
+        pbar (if given) advances as each SKU finishes, not once per chunk.
+        """
+        # One query for the whole chunk instead of one per SKU
+        try:
+            metrics_by_sku = await self.calculate_metrics_for_skus(chunk, periods)
+        except Exception as e:
+            logger.error(f"Chunk query failed, falling back to per-SKU queries: {e}")
+            metrics_by_sku = {}
+        
+        # Reports of the whole chunk are collected and saved in batched round trips
+        product_saves = []
+        for finished in asyncio.as_completed([
+            self._process_sku_reports_with_cache(sku, periods, semaphore, sku_metrics_store,
+                                                 metrics_by_sku.get(sku), product_saves)
+            for sku in chunk
+        ]):
+            await finished
+            if pbar is not None:
+                pbar.update(1)
+        await self.queue_report_saves("product", product_saves)
+
+    async def _process_sku_reports_with_cache(self, sku: str, periods: Dict, semaphore: asyncio.Semaphore,
+                                              cache_store: SkuMetricsStore,
+                                              metrics_by_type: Optional[Dict[str, Dict[str, Dict]]] = None,
+                                              pending_saves: Optional[List[Tuple[Dict, Dict]]] = None):
         """
         Process SKU/product reports with fallback cost strategy - process ALL SKUs.
         
         This function processes products even if direct cost lookups fail,
         relying on the fallback cost strategy (sibling SKUs, historical costs).
         Products are saved to the database and cached for listing aggregation.
+        With pending_saves, report upserts are appended there for the caller to
+        save in bulk instead of being saved one by one.
         """
         async with semaphore:
             try:
-                cache_store[sku] = {}
+                cache_store.add_sku(sku)
                 has_saved_any = False
                 
-                for period_type, date_ranges in periods.items():
-                    all_metrics = await self.calculate_metrics_batch(date_ranges, period_type=period_type, sku=sku)
-                    
+                # One query for all period types of this SKU (unless prefetched for its chunk)
+                if metrics_by_type is None:
+                    metrics_by_type = await self.calculate_metrics_for_periods(periods, sku=sku)
+                for period_type, all_metrics in metrics_by_type.items():
                     for period_key, metrics in all_metrics.items():
                         # Only save if we have orders AND non-zero cost data
                         total_orders = metrics.get('total_orders', 0)
                         total_cost = metrics.get('total_cost', 0)
                         
-                        if total_orders > 0:
+                        if total_orders == 0:
+                            # Mark period as calculated with no orders so listing
+                            # aggregation can skip the direct DB fallback for it
+                            cache_store.put(sku, self._period_cache_key(period_type, metrics['period_start'], metrics['period_end']), None)
+                        else:
                             # Skip saving if total_cost is 0 - indicates missing cost data
                             if total_cost == 0:
                                 logger.warning(
-                                    f"⚠️ Skipping SKU {sku}, period {period_type} "
-                                    f"({metrics['period_start'].date()} to {metrics['period_end'].date()}): "
-                                    f"has {total_orders} orders but total_cost is 0. "
-                                    f"Check cost.csv for this SKU."
+                                    "⚠️ Skipping SKU %s, period %s (%s to %s): has %s orders but total_cost is 0. "
+                                    "Check cost.csv for this SKU.",
+                                    sku, period_type, metrics['period_start'].date(), metrics['period_end'].date(),
+                                    total_orders
                                 )
                                 continue
                             
                             cost_coverage = metrics.get('cost_coverage_percent', 0)
                             
                             # Save report with cost data
-                            await self.save_product_report(sku, metrics, period_type,
-                                                          metrics['period_start'], metrics['period_end'])
-                            full_key = f"{period_type}_{period_key}"
-                            cache_store[sku][full_key] = metrics
+                            if pending_saves is not None:
+                                pending_saves.append(self._product_report_upsert(
+                                    sku, metrics, period_type, metrics['period_start'], metrics['period_end'],
+                                    clean=False
+                                ))
+                            else:
+                                await self.save_product_report(sku, metrics, period_type,
+                                                              metrics['period_start'], metrics['period_end'])
+                            full_key = self._period_cache_key(period_type, metrics['period_start'], metrics['period_end'])
+                            cache_store.put(sku, full_key, metrics)
                             has_saved_any = True
                             
                             # Log if cost coverage is low (for monitoring)
                             if cost_coverage < 100:
                                 logger.info(
-                                    f"✓ Saved SKU {sku}, period {period_type} with "
-                                    f"{cost_coverage:.1f}% cost coverage (${total_cost:.2f} total cost)"
+                                    "✓ Saved SKU %s, period %s with %.1f%% cost coverage ($%.2f total cost)",
+                                    sku, period_type, cost_coverage, total_cost
                                 )
                 
                 # Track SKUs that had no data at all
@@ -4521,11 +5154,11 @@ class EcommerceAnalyticsOptimized:
                     self._skipped_count += 1
                     
             except Exception as e:
-                logger.error(f"Error processing SKU {sku}: {e}", exc_info=True)
+                self._log_error(f"Error processing SKU {sku}: {e}", e)
 
     async def _process_listing_reports_aggregated(self, listing_id: int, periods: Dict, 
                                                   semaphore: asyncio.Semaphore, 
-                                                  sku_metrics_store: Dict, listing_cache_store: Dict):
+                                                  sku_metrics_store: SkuMetricsStore, listing_rollup_store: Dict):
         """
         Listing reports with fallback cost strategy - process ALL listings.
         
@@ -4538,55 +5171,78 @@ class EcommerceAnalyticsOptimized:
                 await self._ensure_connection()
                 
                 # Get child SKUs for aggregation
-                child_product_ids = self._listing_to_products.get(listing_id, [])
+                child_product_ids = self._listing_to_products.get(listing_id, set())
                 child_skus = []
                 
                 if child_product_ids:
-                    child_skus = [sku for sku, pids in self._sku_to_products.items() 
-                                 if any(pid in child_product_ids for pid in pids)]
+                    # One index lookup per product; sorted positions keep the mapping order
+                    product_to_sku_indices = self._product_to_sku_indices
+                    indices = {i for pid in child_product_ids for i in product_to_sku_indices.get(pid, ())}
+                    child_skus = [self._sku_names[i] for i in sorted(indices)]
                 
                 # If no child SKUs found or empty, use direct calculation
                 if not child_skus:
-                    return await self._process_listing_reports_direct(listing_id, periods, listing_cache_store)
+                    return await self._process_listing_reports_direct(listing_id, periods, listing_rollup_store)
+                
+                # Normalize child SKUs and resolve their store rows once per listing
+                # instead of once per (SKU, period)
+                child_sku_rows = sku_metrics_store.resolve(
+                    [(sku, self._normalize_sku_for_comparison(sku)) for sku in child_skus]
+                )
                 
-                listing_cache_store[listing_id] = {}
                 has_saved_any = False
                 
                 period_count = 0
                 direct_calc_count = 0  # Track how many times we fallback to direct calculation
                 
+                # PASS 1: Aggregate from child SKUs, remember periods that need a direct calculation
+                aggregated_by_key: Dict[Tuple[str, date, date], Dict] = {}
+                missing_by_type: Dict[str, List[DateRange]] = defaultdict(list)
+                
                 for period_type, date_ranges in periods.items():
                     for dr in date_ranges:
-                        # Periodic connection health check every 5 periods to prevent idle timeout
-                        # This is important because listings take ~125 seconds and DB may close idle connections
                         period_count += 1
-                        if period_count % 5 == 0:
-                            await self._ensure_connection()
                         
-                        # CRITICAL: Use same format as calculate_metrics_batch returns
-                        period_key = f"{dr.start_date.strftime('%Y-%m-%d')}_to_{dr.end_date.strftime('%Y-%m-%d')}"
-                        full_key = f"{period_type}_{period_key}"
+                        full_key = dr.cache_key(period_type)
                         
                         # TRY 1: Aggregate from child SKUs
-                        aggregated_metrics = self._aggregate_from_skus(child_skus, full_key, sku_metrics_store, dr)
+                        aggregated_metrics = self._aggregate_from_skus(child_sku_rows, full_key, sku_metrics_store)
                         
-                        # TRY 2: If aggregation returned nothing, calculate directly
-                        # This will use the fallback cost strategy automatically
-                        # NOTE: This makes a database query and is SLOW - try to avoid!
                         if not aggregated_metrics or aggregated_metrics.get('total_orders', 0) == 0:
-                            direct_calc_count += 1
-                            
-                            # Warn if we're doing too many direct calculations (indicates missing SKU data)
-                            if direct_calc_count == 1:
-                                logger.debug(
-                                    f"Listing {listing_id}: Falling back to direct calculation "
-                                    f"(SKU metrics not found in cache for {', '.join(child_skus[:3])})"
-                                )
-                            
-                            # Direct calculation for this listing
-                            batch_metrics = await self.calculate_metrics_batch([dr], period_type=period_type, listing_id=listing_id)
-                            if batch_metrics:
-                                aggregated_metrics = batch_metrics.get(period_key)
+                            # Every child SKU was calculated with zero orders - a direct
+                            # calculation would return zero orders as well
+                            if sku_metrics_store.all_no_orders(child_sku_rows, full_key):
+                                continue
+                            missing_by_type[period_type].append(dr)
+                        else:
+                            aggregated_by_key[full_key] = aggregated_metrics
+                
+                # TRY 2: Calculate all missing periods directly - ONE query for all period types
+                # This will use the fallback cost strategy automatically
+                # NOTE: This makes a database query and is SLOW - try to avoid!
+                if missing_by_type:
+                    direct_calc_count += sum(len(missing_ranges) for missing_ranges in missing_by_type.values())
+                    
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(
+                            "Listing %s: Falling back to direct calculation for %d periods "
+                            "(SKU metrics not found in cache for %s)",
+                            listing_id, direct_calc_count, ', '.join(child_skus[:3])
+                        )
+                    
+                    # Connection health check before the batch to prevent idle timeout
+                    await self._ensure_connection()
+                    metrics_by_type = await self.calculate_metrics_for_periods(missing_by_type, listing_id=listing_id)
+                    for period_type, batch_metrics in metrics_by_type.items():
+                        for metrics in batch_metrics.values():
+                            aggregated_by_key[self._period_cache_key(period_type, metrics['period_start'], metrics['period_end'])] = metrics
+                
+                # PASS 2: Save in the original period order (one batched save per listing)
+                listing_saves = []
+                for period_type, date_ranges in periods.items():
+                    for dr in date_ranges:
+                        full_key = dr.cache_key(period_type)
+                        aggregated_metrics = aggregated_by_key.get(full_key)
                         
                         # Save if we have data with non-zero cost
                         if aggregated_metrics and aggregated_metrics.get('total_orders', 0) > 0:
@@ -4594,34 +5250,39 @@ class EcommerceAnalyticsOptimized:
                             
                             # Skip saving if total_cost is 0
                             if total_cost == 0:
-                                logger.warning(
-                                    f"⚠️ Skipping Listing {listing_id}, period {period_type} "
-                                    f"({aggregated_metrics['period_start'].date()} to {aggregated_metrics['period_end'].date()}): "
-                                    f"has {aggregated_metrics.get('total_orders', 0)} orders but total_cost is 0. "
-                                    f"Check cost.csv for child SKUs: {', '.join(child_skus[:5])}{'...' if len(child_skus) > 5 else ''}"
-                                )
+                                if logger.isEnabledFor(logging.WARNING):
+                                    logger.warning(
+                                        "⚠️ Skipping Listing %s, period %s (%s to %s): has %s orders but total_cost is 0. "
+                                        "Check cost.csv for child SKUs: %s%s",
+                                        listing_id, period_type, dr.start_date.date(), dr.end_date.date(),
+                                        aggregated_metrics.get('total_orders', 0),
+                                        ', '.join(child_skus[:5]), '...' if len(child_skus) > 5 else ''
+                                    )
                                 continue
                             
                             cost_coverage = aggregated_metrics.get('cost_coverage_percent', 0)
                             
                             # Save listing report with cost data
-                            await self.save_listing_report(
+                            listing_saves.append(self._listing_report_upsert(
                                 listing_id, 
                                 aggregated_metrics, 
                                 period_type,
-                                aggregated_metrics['period_start'], 
-                                aggregated_metrics['period_end']
-                            )
-                            listing_cache_store[listing_id][full_key] = aggregated_metrics
+                                dr.start_date, 
+                                dr.end_date,
+                                clean=False
+                            ))
+                            self._cache_listing_metrics(listing_rollup_store, listing_id, full_key, aggregated_metrics)
                             has_saved_any = True
                             
                             # Log if cost coverage is low (for monitoring)
                             if cost_coverage < 100:
                                 logger.info(
-                                    f"✓ Saved Listing {listing_id}, period {period_type} with "
-                                    f"{cost_coverage:.1f}% cost coverage (${total_cost:.2f} total cost)"
+                                    "✓ Saved Listing %s, period %s with %.1f%% cost coverage ($%.2f total cost)",
+                                    listing_id, period_type, cost_coverage, total_cost
                                 )
                 
+                await self.queue_report_saves("listing", listing_saves)
+                
                 # Track listings that had no data at all
                 if not has_saved_any:
                     self._listings_skipped_no_cost.add(listing_id)
@@ -4634,11 +5295,11 @@ class EcommerceAnalyticsOptimized:
                     )
                             
             except Exception as e:
-                logger.error(f"Error processing listing {listing_id}: {e}", exc_info=True)
+                self._log_error(f"Error processing listing {listing_id}: {e}", e)
 
-    async def _process_listing_reports_direct(self, listing_id: int, periods: Dict, cache_store: Dict):
+    async def _process_listing_reports_direct(self, listing_id: int, periods: Dict, rollup_store: Dict):
         """Fallback for listings without child SKUs."""
-        cache_store[listing_id] = {}
+        listing_saves = []
         for period_type, date_ranges in periods.items():
             all_metrics = await self.calculate_metrics_batch(date_ranges, period_type=period_type, listing_id=listing_id)
             for period_key, metrics in all_metrics.items():
@@ -4654,12 +5315,17 @@ class EcommerceAnalyticsOptimized:
                         )
                         continue
                     
-                    await self.save_listing_report(listing_id, metrics, period_type,
-                                                  metrics['period_start'], metrics['period_end'])
-                    cache_store[listing_id][f"{period_type}_{period_key}"] = metrics
+                    listing_saves.append(self._listing_report_upsert(
+                        listing_id, metrics, period_type, metrics['period_start'], metrics['period_end'],
+                        clean=False
+                    ))
+                    full_key = self._period_cache_key(period_type, metrics['period_start'], metrics['period_end'])
+                    self._cache_listing_metrics(rollup_store, listing_id, full_key, metrics)
+        
+        await self.queue_report_saves("listing", listing_saves)
 
     async def _process_shop_reports_aggregated(self, period_type: str, date_ranges: List[DateRange], 
-                                               semaphore: asyncio.Semaphore, listing_metrics_store: Dict):
+                                               semaphore: asyncio.Semaphore, listing_rollup_store: Dict):
         """
         Shop reports - try aggregation first, fall back to direct calculation.
         This ensures shop reports are always generated even if listing cache is incomplete.
@@ -4667,46 +5333,53 @@ class EcommerceAnalyticsOptimized:
         async with semaphore:
             try:
                 saved_count = 0
+                shop_saves = []
+                
+                # PASS 1: Shop totals were already folded from listings during Phase 2
+                # (PeriodRollup), so this is a lookup per period, not another reduction
+                aggregated_by_range: Dict[str, Optional[Dict]] = {}
+                missing_ranges: List[DateRange] = []
                 for dr in date_ranges:
-                    # IMPORTANT: Use the same key format as calculate_metrics_batch returns
-                    period_key = f"{dr.start_date.strftime('%Y-%m-%d')}_to_{dr.end_date.strftime('%Y-%m-%d')}"
-                    full_key = f"{period_type}_{period_key}"
+                    full_key = dr.cache_key(period_type)
                     
                     # TRY 1: Aggregate from listings if we have data
                     aggregated_metrics = None
-                    if listing_metrics_store:
-                        aggregated_metrics = self._aggregate_from_listings(
-                            list(listing_metrics_store.keys()), 
-                            full_key, 
-                            listing_metrics_store, 
-                            dr
-                        )
+                    if listing_rollup_store:
+                        aggregated_metrics = self._aggregate_from_listings(full_key, listing_rollup_store)
                     
-                    # TRY 2: If aggregation failed or no data, calculate directly from transactions
                     if not aggregated_metrics or aggregated_metrics.get('total_orders', 0) == 0:
-                        # Direct calculation for shop-level (all transactions)
-                        # This can be a VERY large query, so wrap with extra error handling
-                        try:
-                            batch_metrics = await self.calculate_metrics_batch([dr], period_type=period_type)
-                            if batch_metrics:
-                                # Use the same period_key format that calculate_metrics_batch returns
-                                aggregated_metrics = batch_metrics.get(period_key)
-                        except Exception as calc_error:
-                            error_msg = str(calc_error)
-                            if "timeout" in error_msg.lower() or "Can't reach" in error_msg:
-                                logger.error(
-                                    f"❌ Shop report calculation failed for {period_type} "
-                                    f"({dr.start_date.date()} to {dr.end_date.date()}): {calc_error}"
-                                )
-                                logger.error(
-                                    f"   This may be due to large dataset size. Consider:"
-                                    f"\n   1. Aggregating from listing reports instead (if available)"
-                                    f"\n   2. Increasing database timeout"
-                                    f"\n   3. Processing shorter time periods"
-                                )
-                                continue  # Skip this period and move to next
-                            else:
-                                raise  # Re-raise if not a timeout/connection error
+                        missing_ranges.append(dr)
+                    else:
+                        # IMPORTANT: Use the same key format as calculate_metrics_batch returns
+                        aggregated_by_range[dr.period_key] = aggregated_metrics
+                
+                # TRY 2: Calculate every period without listing data directly from
+                # transactions - ONE query for all of them instead of one per period
+                if missing_ranges:
+                    # This can be a VERY large query, so wrap with extra error handling
+                    try:
+                        batch_metrics = await self.calculate_metrics_batch(missing_ranges, period_type=period_type)
+                        aggregated_by_range.update(batch_metrics or {})
+                    except Exception as calc_error:
+                        error_msg = str(calc_error)
+                        if "timeout" in error_msg.lower() or "Can't reach" in error_msg:
+                            logger.error(
+                                f"❌ Shop report calculation failed for {len(missing_ranges)} {period_type} periods "
+                                f"({missing_ranges[0].start_date.date()} to {missing_ranges[-1].end_date.date()}): "
+                                f"{calc_error}"
+                            )
+                            logger.error(
+                                f"   This may be due to large dataset size. Consider:"
+                                f"\n   1. Aggregating from listing reports instead (if available)"
+                                f"\n   2. Increasing database timeout"
+                                f"\n   3. Processing shorter time periods"
+                            )
+                        else:
+                            raise  # Re-raise if not a timeout/connection error
+                
+                # PASS 3: Save in the original period order
+                for dr in date_ranges:
+                    aggregated_metrics = aggregated_by_range.get(dr.period_key)
                     
                     # Save if we have valid data AND non-zero cost
                     if aggregated_metrics and aggregated_metrics.get('total_orders', 0) > 0:
@@ -4715,142 +5388,126 @@ class EcommerceAnalyticsOptimized:
                         # Skip saving if total_cost is 0
                         if total_cost == 0:
                             logger.warning(
-                                f"⚠️ Skipping Shop report, period {period_type} "
-                                f"({aggregated_metrics['period_start'].date()} to {aggregated_metrics['period_end'].date()}): "
-                                f"has {aggregated_metrics.get('total_orders', 0)} orders but total_cost is 0"
+                                "⚠️ Skipping Shop report, period %s (%s to %s): has %s orders but total_cost is 0",
+                                period_type, dr.start_date.date(), dr.end_date.date(),
+                                aggregated_metrics.get('total_orders', 0)
                             )
                             continue
                         
                         try:
-                            await self.save_shop_report(
+                            shop_saves.append(self._shop_report_upsert(
                                 aggregated_metrics, 
                                 period_type,
-                                aggregated_metrics['period_start'], 
-                                aggregated_metrics['period_end']
-                            )
+                                dr.start_date, 
+                                dr.end_date,
+                                clean=False
+                            ))
                             saved_count += 1
-                            logger.info(
-                                f"✓ Saved Shop {period_type} report with ${total_cost:.2f} total cost"
-                            )
-                            # Small delay between shop report saves to prevent connection pool stress
-                            await asyncio.sleep(0.1)
+                            logger.info("✓ Saved Shop %s report with $%.2f total cost", period_type, total_cost)
                         except Exception as save_error:
                             logger.error(f"Failed to save shop report: {save_error}", exc_info=True)
                 
+                # All periods of this type in batched round trips (no per-report delay needed)
+                await self.queue_report_saves("shop", shop_saves)
+                
                 # Only log summary, not individual operations
                 logger.debug(f"Shop {period_type.upper()}: Saved {saved_count}/{len(date_ranges)} periods")
             except Exception as e:
                 logger.error(f"Error aggregating shop {period_type}: {e}", exc_info=True)
 
-    def _aggregate_from_skus(self, sku_list: List[str], period_key: str, 
-                            sku_store: Dict, date_range: DateRange) -> Dict:
+    def _aggregate_from_skus(self, sku_rows: Tuple[np.ndarray, np.ndarray], period_key: Tuple[str, date, date],
+                            sku_store: SkuMetricsStore) -> Optional[Dict]:
         """
         Aggregate metrics from SKUs.
         
         Handles both normalized (without prefix) and original (with prefix) SKU formats
-        using a prebuilt index for O(1) lookups instead of O(n) search.
+        through rows resolved once per listing by SkuMetricsStore.resolve; the
+        additive fields are summed straight from the store's array.
         """
-        agg = None
-        found_count = 0
+        col, matched = sku_store.matched_rows(sku_rows, period_key)
+        if not len(matched):
+            return None
         
-        # Get the normalized index if available
-        normalized_index = sku_store.get('_normalized_index', {})
+        first_row = int(matched[0])
+        if len(matched) == 1:
+            return sku_store.report(first_row, col)
         
-        for sku in sku_list:
-            # Try original SKU first (fast path)
-            if sku in sku_store and isinstance(sku_store[sku], dict) and period_key in sku_store[sku]:
-                agg = sku_store[sku][period_key].copy() if agg is None else self._sum_metrics(agg, sku_store[sku][period_key])
-                found_count += 1
-                continue
-            
-            # Try using normalized index (O(1) lookup)
-            normalized_sku = self._normalize_sku_for_comparison(sku)
-            if normalized_sku in normalized_index:
-                store_sku = normalized_index[normalized_sku]
-                if store_sku in sku_store and isinstance(sku_store[store_sku], dict) and period_key in sku_store[store_sku]:
-                    agg = sku_store[store_sku][period_key].copy() if agg is None else self._sum_metrics(agg, sku_store[store_sku][period_key])
-                    found_count += 1
+        totals = PeriodMetrics.dict_from_array(sku_store.sums[matched, col].sum(axis=0))
         
-        if agg:
-            agg['period_start'], agg['period_end'] = date_range.start_date, date_range.end_date
+        # Merge cost data sources (summed from the store's counter array as well)
+        sources = sku_store.summed_sources(matched, col)
         
-        return agg
+        return self._merge_totals(sku_store.extra(first_row, col), totals, sources,
+                                  sku_store.merged_customers(matched, col),
+                                  sku_store.summed_time_counts(matched, col))
 
-    def _aggregate_from_listings(self, listing_ids: List[int], period_key: str,
-                                listing_store: Dict, date_range: DateRange) -> Dict:
+    def _cache_listing_metrics(self, rollup_store: Dict, listing_id: int,
+                               period_key: Tuple[str, date, date], metrics: Dict):
+        """
+        Fold a listing report into the shop rollup for its period.
+        
+        Shop reports only need per-period totals, so listing dicts are summed
+        as they are produced rather than kept for every listing and period.
+        """
+        rollup = rollup_store.get(period_key)
+        if rollup is None:
+            rollup = rollup_store[period_key] = PeriodRollup()
+        rollup.add(metrics)
+        self._rolled_up_listing_ids.add(listing_id)
+
+    def _aggregate_from_listings(self, period_key: Tuple[str, date, date], rollup_store: Dict) -> Dict:
         """
         Aggregate metrics from listings.
         
         IMPORTANT: Only includes listings with complete cost data to ensure
-        accurate profit calculations at shop level.
+        accurate profit calculations at shop level. The filtering and summing
+        already happened in _cache_listing_metrics as listings were produced.
         """
-        agg = None
-        skipped_listings = []
-        
-        for lid in listing_ids:
-            if lid in listing_store and period_key in listing_store[lid]:
-                listing_metrics = listing_store[lid][period_key]
-                
-                # Skip listings without complete cost data
-                if not listing_metrics.get('has_complete_cost_data', False):
-                    skipped_listings.append(lid)
-                    continue
-                
-                agg = listing_metrics.copy() if agg is None else self._sum_metrics(agg, listing_metrics)
+        rollup = rollup_store.get(period_key)
+        if rollup is None:
+            return None
         
-        if skipped_listings:
+        if rollup.skipped:
             logger.debug(
-                f"Skipped {len(skipped_listings)} listings in shop aggregation "
-                f"due to incomplete cost data for period {period_key}"
+                "Skipped %d listings in shop aggregation due to incomplete cost data for period %s",
+                rollup.skipped, period_key
+            )
+        
+        if rollup.first is None:
+            return None
+        
+        if rollup.included == 1:
+            agg = rollup.first.copy()
+        else:
+            agg = self._merge_totals(
+                rollup.first,
+                PeriodMetrics.dict_from_array(rollup.sums),
+                rollup.sources if rollup.has_all_sources else None,
+                _merge_customer_orders(rollup.customer_orders) if rollup.has_all_customers else None,
+                rollup.order_time_counts if rollup.has_all_time_counts else None
             )
         
-        if agg:
-            agg['period_start'], agg['period_end'] = date_range.start_date, date_range.end_date
-            # Mark shop report as having potentially incomplete data if any listings were skipped
-            agg['listings_skipped_no_cost'] = len(skipped_listings)
-            agg['listings_included'] = len(listing_ids) - len(skipped_listings)
+        # Mark shop report as having potentially incomplete data if any listings were skipped
+        agg['listings_skipped_no_cost'] = rollup.skipped
+        agg['listings_included'] = len(self._rolled_up_listing_ids) - rollup.skipped
         
         return agg
 
-    def _sum_metrics(self, m1: Dict, m2: Dict) -> Dict:
-        """Sum metrics for aggregation with corrected Etsy calculations and shipping costs."""
-        r = m1.copy()
-        
-        # Sum all additive fields (including new shipping fields and cost tracking fields)
-        for f in ['gross_revenue', 'total_revenue', 'product_revenue', 'total_shipping_charged', 
-                 'total_tax_collected', 'total_vat_collected', 'total_gift_wrap_revenue', 
-                 'total_discounts_given', 'etsy_transaction_fees', 'etsy_processing_fees', 
-                 'total_etsy_fees', 'net_revenue', 'net_revenue_after_refunds',
-                 'actual_shipping_cost', 'shipping_profit', 'duty_amount', 'tax_amount', 'fedex_processing_fee',
-                 'total_cost', 'total_cost_with_shipping', 'contribution_margin', 'gross_profit', 'net_profit', 
-                 'total_orders', 'total_items', 'total_quantity_sold', 'shipped_orders', 
-                 'gift_orders', 'total_refund_amount', 'total_refund_count', 'orders_with_refunds', 
-                 'etsy_fees_retained_on_refunds',
-                 'cancelled_orders', 'unique_customers', 'repeat_customers', 'total_inventory', 
-                 'active_variants',
-                 'items_with_direct_cost', 'items_with_fallback_cost', 'items_missing_cost',
-                 'total_ad_spend']:  # Ad spend summed from child products/listings
-            r[f] = r.get(f, 0) + m2.get(f, 0)
-        
-        # Merge cost data sources
-        if 'cost_data_sources' in m1 and 'cost_data_sources' in m2:
-            r['cost_data_sources'] = {
-                'direct': m1['cost_data_sources'].get('direct', 0) + m2['cost_data_sources'].get('direct', 0),
-                'sibling_same_period': m1['cost_data_sources'].get('sibling_same_period', 0) + m2['cost_data_sources'].get('sibling_same_period', 0),
-                'sibling_historical': m1['cost_data_sources'].get('sibling_historical', 0) + m2['cost_data_sources'].get('sibling_historical', 0),
-                'missing': m1['cost_data_sources'].get('missing', 0) + m2['cost_data_sources'].get('missing', 0)
-            }
+    def _finalize_metrics(self, r: Dict) -> Dict:
+        """
+        Recalculate cost coverage, derived rates, margins and averages from summed totals.
         
-        # Recalculate cost coverage
-        total_items_counted = r.get('items_with_direct_cost', 0) + r.get('items_with_fallback_cost', 0) + r.get('items_missing_cost', 0)
-        if total_items_counted > 0:
-            r['cost_coverage_percent'] = ((r.get('items_with_direct_cost', 0) + r.get('items_with_fallback_cost', 0)) / total_items_counted) * 100
-            r['has_complete_cost_data'] = (r.get('items_missing_cost', 0) == 0)
-        else:
-            r['cost_coverage_percent'] = 0
-            r['has_complete_cost_data'] = False
+        All ratios are computed with one np.divide call; ratios whose
+        denominator is zero come out as 0 instead of branching per field.
+        """
+        # Cost coverage from the accumulated item counters
+        direct = r.get('items_with_direct_cost', 0)
+        fallback = r.get('items_with_fallback_cost', 0)
+        missing = r.get('items_missing_cost', 0)
+        total_items_counted = direct + fallback + missing
+        r['cost_coverage_percent'] = 100 * (direct + fallback) / total_items_counted if total_items_counted else 0
+        r['has_complete_cost_data'] = total_items_counted > 0 and missing == 0
         
-        # Recalculate all derived metrics (rates, margins, averages)
         gross_revenue = r.get('gross_revenue', 0) or r.get('total_revenue', 0)
         total_orders = r.get('total_orders', 0)
         total_items = r.get('total_items', 0)
@@ -4859,50 +5516,103 @@ class EcommerceAnalyticsOptimized:
         total_cost_with_shipping = r.get('total_cost_with_shipping', 0)
         gross_profit = r.get('gross_profit', 0)
         net_profit = r.get('net_profit', 0)
-        net_revenue = r.get('net_revenue', 0)
-        total_etsy_fees = r.get('total_etsy_fees', 0)
-        
-        # Revenue-based rates
-        if gross_revenue > 0:
-            r['discount_rate'] = r.get('total_discounts_given', 0) / gross_revenue
-            r['gross_margin'] = gross_profit / gross_revenue
-            r['net_margin'] = net_profit / gross_revenue
-            r['return_on_revenue'] = net_profit / gross_revenue
-            r['etsy_fee_rate'] = total_etsy_fees / gross_revenue
-            r['take_home_rate'] = net_revenue / gross_revenue
-            r['refund_rate_by_value'] = r.get('total_refund_amount', 0) / gross_revenue
-        
-        # Cost-based ratios (use total_cost_with_shipping for accurate markup)
-        if total_cost_with_shipping > 0:
-            r['markup_ratio'] = gross_profit / total_cost_with_shipping
-        elif total_cost > 0:
-            r['markup_ratio'] = gross_profit / total_cost
-        
-        # Order-based averages
-        if total_orders > 0:
-            r['average_order_value'] = gross_revenue / total_orders
-            r['items_per_order'] = total_items / total_orders
-            r['cost_per_order'] = total_cost_with_shipping / total_orders if total_cost_with_shipping > 0 else total_cost / total_orders
-            r['refund_rate_by_order'] = r.get('total_refund_count', 0) / total_orders
-            r['order_refund_rate'] = r.get('orders_with_refunds', 0) / total_orders
-        
-        # Item-based averages
-        if total_items > 0:
-            r['revenue_per_item'] = gross_revenue / total_items
-            r['profit_per_item'] = gross_profit / total_items
-            r['avg_cost_per_item'] = total_cost / total_items
-        
-        # Customer-based metrics
-        if unique_customers > 0:
-            r['revenue_per_customer'] = gross_revenue / unique_customers
-            r['orders_per_customer'] = total_orders / unique_customers
-            r['profit_per_customer'] = gross_profit / unique_customers
+        
+        # Use total_cost_with_shipping for accurate markup, fall back to product cost
+        cost_base = total_cost_with_shipping if total_cost_with_shipping > 0 else total_cost
+        
+        num = np.array([
+            r.get('total_discounts_given', 0), gross_profit, net_profit, net_profit,
+            r.get('total_etsy_fees', 0), r.get('net_revenue', 0), r.get('total_refund_amount', 0),
+            gross_profit,
+            gross_revenue, total_items, cost_base,
+            r.get('total_refund_count', 0), r.get('orders_with_refunds', 0),
+            gross_revenue, gross_profit, total_cost,
+            gross_revenue, total_orders, gross_profit,
+        ], dtype=np.float64)
+        den = np.array(
+            [gross_revenue] * 7 + [cost_base] + [total_orders] * 5
+            + [total_items] * 3 + [unique_customers] * 3,
+            dtype=np.float64
+        )
+        rates = np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+        r.update(zip(_DERIVED_RATE_KEYS, rates.tolist()))
+        
+        return r
+
+    def _combine_metrics(self, metrics_list: List[Dict]) -> Optional[Dict]:
+        """
+        Sum a list of period metrics into one report.
+        
+        Additive fields are summed into a PeriodMetrics struct and written
+        back once, so the full metrics dict is copied a single time instead of
+        once per summed report. Non-additive fields come from the first report.
+        """
+        if not metrics_list:
+            return None
+        
+        first = metrics_list[0]
+        if len(metrics_list) == 1:
+            return first.copy()
+        
+        totals = PeriodMetrics.from_sum(metrics_list).as_dict()
+        
+        # Merge cost data sources
+        sources = None
+        if all('cost_data_sources' in m for m in metrics_list):
+            sources = Counter()
+            for m in metrics_list:
+                sources.update(m['cost_data_sources'])
+        
+        customers = None
+        if all(m.get('customer_orders') is not None for m in metrics_list):
+            customers = _merge_customer_orders([m['customer_orders'] for m in metrics_list])
+        
+        time_counts = None
+        if all(m.get('order_time_counts') is not None for m in metrics_list):
+            time_counts = np.sum([m['order_time_counts'] for m in metrics_list], axis=0)
+        
+        return self._merge_totals(first, totals, sources, customers, time_counts)
+
+    def _merge_totals(self, first: Dict, totals: Dict, sources: Optional[Counter],
+                      customers: Optional[Tuple[np.ndarray, int, int]] = None,
+                      time_counts: Optional[np.ndarray] = None) -> Dict:
+        """
+        Write summed totals over a copy of the first report and recompute derived metrics.
+        
+        customers (from _merge_customer_orders) replaces the summed customer counts,
+        which count a customer once per SKU/listing they bought from. time_counts
+        (summed order-time histograms) gives the peaks; without it they are None
+        rather than the first report's.
+        """
+        r = first.copy()
+        r.update(totals)
+        if customers is not None:
+            r['customer_orders'], r['unique_customers'], r['repeat_customers'] = customers
+        else:
+            r.pop('customer_orders', None)  # Would only describe the first report
+        r['order_time_counts'] = time_counts
+        r['peak_month'], r['peak_day_of_week'], r['peak_hour'] = _order_time_peaks(time_counts)
+        
+        if sources is not None:
+            r['cost_data_sources'] = {
+                'direct': sources['direct'],
+                'sibling_same_period': sources['sibling_same_period'],
+                'sibling_historical': sources['sibling_historical'],
+                'missing': sources['missing']
+            }
+        
+        # Recalculate cost coverage and all derived metrics (rates, margins, averages)
+        self._finalize_metrics(r)
         
         # Period days should stay the same
-        r['period_days'] = m1.get('period_days', 0)
+        r['period_days'] = first.get('period_days', 0)
         
         return r
 
+    def _sum_metrics(self, m1: Dict, m2: Dict) -> Dict:
+        """Sum metrics for aggregation with corrected Etsy calculations and shipping costs."""
+        return self._combine_metrics([m1, m2])
+
 
 async def main():
     """Main execution function with ULTRA-OPTIMIZED batch processing."""
@@ -5023,7 +5733,6 @@ Examples:
     print("\n🔧 NEW: Accurate profit calculations with Etsy fees included!")
     print("="*80 + "\n")
     
-    import time
     start_time = time.time()
     
     # Use context manager to ensure connection is ALWAYS closed
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+SKU normalization shared by reportsv4_optimized.py and the diagnostic scripts.
+"""
+import re
+from functools import lru_cache
+
+import pandas as pd
+
+# Common prefixes to strip, matched as one anchored alternation: the trailing "+"
+# strips chained prefixes ("DELETED-OT-...") in a single scan, IGNORECASE covers
+# lowercase ones. Every prefix ends at its only hyphen, so at most one matches at a time.
+SKU_PREFIXES = (
+    "DELETED-", "OT-", "ZSTK-", "MG-", "LND-",
+    "EU-", "US-", "UK-",
+    "CA-",  # Canada
+    "AU-",  # Australia
+    "JP-",  # Japan
+)
+SKU_PREFIX_RE = re.compile(f"^(?:{'|'.join(map(re.escape, SKU_PREFIXES))})+", re.IGNORECASE)
+
+
+@lru_cache(maxsize=100_000)
+def normalize_sku(sku: str) -> str:
+    """
+    Normalize SKU for comparison by removing common prefixes and converting to lowercase.
+
+    Cached: the diagnostics normalize the same SKUs in several steps.
+    """
+    if not sku:
+        return sku
+
+    return SKU_PREFIX_RE.sub('', sku.strip(), count=1).lower()
+
+
+def normalize_sku_series(skus: pd.Series) -> pd.Series:
+    """normalize_sku over a whole column in vectorized string ops (NaN -> '')."""
+    normalized = skus.astype(str).str.strip().str.replace(SKU_PREFIX_RE, '', n=1, regex=True).str.lower()
+    return normalized.where(skus.notna(), '')
@@ -4,6 +4,32 @@ Quick test script to verify cost lookup for 2025 dates
 """
 import pandas as pd
 import os
+import re
+from collections import defaultdict
+
+# "US MAYIS 2025", "US MART 25", "US 2025 NISAN", "US 25 NISAN" - in lookup priority order
+COST_COLUMN_PATTERNS = (
+    re.compile(r'^US (?P<month>[A-Z]+) (?P<year>\d{4})$'),
+    re.compile(r'^US (?P<month>[A-Z]+) (?P<year>\d{2})$'),
+    re.compile(r'^US (?P<year>\d{4}) (?P<month>[A-Z]+)$'),
+    re.compile(r'^US (?P<year>\d{2}) (?P<month>[A-Z]+)$'),
+)
+
+
+def index_cost_columns(columns):
+    """Map (month_name, 4-digit year) -> matching US cost columns, best format first."""
+    found = defaultdict(list)
+    for col in columns:
+        for priority, pattern in enumerate(COST_COLUMN_PATTERNS):
+            match = pattern.match(col)
+            if match:
+                year = int(match['year'])
+                if year < 100:
+                    year += 2000
+                found[(match['month'], year)].append((priority, col))
+                break
+    return {key: [col for _, col in sorted(cols)] for key, cols in found.items()}
+
 
 def test_cost_lookup():
     csv_path = "cost.csv"
@@ -29,6 +55,9 @@ def test_cost_lookup():
     
     sku_row = df[df['SKU'] == test_sku]
     
+    # Parse every column name once instead of probing each format per month
+    cost_cols = index_cost_columns(df.columns)
+    
     # Test 2025 months
     test_dates = [
         (2025, 1, "OCAK"),   # January
@@ -43,28 +72,20 @@ def test_cost_lookup():
     print("="*80)
     
     for year, month, month_name in test_dates:
-        year_2digit = year % 100
-        
-        # All possible column formats
-        possible_cols = [
-            f"US {month_name} {year}",      # US MAYIS 2025
-            f"US {month_name} {year_2digit}",  # US MART 25
-            f"US {year} {month_name}",      # US 2025 MART
-            f"US {year_2digit} {month_name}",  # US 25 MART
-        ]
+        # Existing columns for this month, in the same format priority as before
+        possible_cols = cost_cols.get((month_name, year), [])
         
         found = False
         for col in possible_cols:
-            if col in sku_row.columns:
-                value = sku_row[col].values[0]
-                if pd.notna(value):
-                    try:
-                        cost = float(value)
-                        print(f"✅ {year}/{month:02d} ({month_name:8s}): ${cost:7.2f} (column: '{col}')")
-                        found = True
-                        break
-                    except:
-                        pass
+            value = sku_row[col].values[0]
+            if pd.notna(value):
+                try:
+                    cost = float(value)
+                    print(f"✅ {year}/{month:02d} ({month_name:8s}): ${cost:7.2f} (column: '{col}')")
+                    found = True
+                    break
+                except:
+                    pass
         
         if not found:
             print(f"❌ {year}/{month:02d} ({month_name:8s}): NOT FOUND")
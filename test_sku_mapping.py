@@ -12,29 +12,26 @@ This script:
 import pandas as pd
 from pathlib import Path
 
-def normalize_sku(sku: str) -> str:
-    """Normalize SKU by removing common prefixes (same logic as in reportsv4_optimized.py)"""
-    if not sku:
-        return sku
-    
-    prefixes_to_remove = [
-        "DELETED-", "OT-", "ZSTK-", "MG-", "LND-",
-        "EU-", "US-", "UK-", "CA-", "AU-", "JP-",
-    ]
-    
-    normalized_sku = sku.strip()
-    
-    # Keep stripping prefixes until none match
-    changed = True
-    while changed:
-        changed = False
-        for prefix in prefixes_to_remove:
-            if normalized_sku.upper().startswith(prefix):
-                normalized_sku = normalized_sku[len(prefix):]
-                changed = True
-                break
-    
-    return normalized_sku.lower()
+from sku_normalize import normalize_sku, normalize_sku_series
+
+# Cost columns expected in us_fedex_desi_and_price.csv
+US_COST_COLUMNS = [
+    'US FEDEX KARGO ÜCRETİ',
+    'FEDEX İŞLEM ÜCRETİ',
+    'DUTY',
+    'DUTY OTAN',
+    'VERGİ',
+    'VERGİ ORANI'
+]
+
+# Identifier columns are codes, not numbers
+ID_DTYPES = {'SKU': str, 'OTTOKOD': str}
+
+def read_csv_columns(path: Path, wanted, **kwargs):
+    """Read only the wanted columns present in a CSV; returns (data, all header columns)."""
+    columns = list(pd.read_csv(path, nrows=0, **kwargs).columns)
+    data = pd.read_csv(path, usecols=[col for col in columns if col in wanted], dtype=ID_DTYPES, **kwargs)
+    return data, columns
 
 def test_normalization():
     """Test the normalization function with various SKU formats."""
@@ -74,9 +71,9 @@ def test_sku_to_ottokod_mapping():
     
     # Load cost.csv
     try:
-        cost_data = pd.read_csv(cost_csv, encoding='utf-8')
+        cost_data, columns = read_csv_columns(cost_csv, ('SKU', 'OTTOKOD'), encoding='utf-8')
         print(f"\n✓ Loaded cost.csv: {len(cost_data)} rows")
-        print(f"  Columns: {list(cost_data.columns)}\n")
+        print(f"  Columns: {columns}\n")
     except Exception as e:
         print(f"\n❌ ERROR loading cost.csv: {e}")
         return None, None
@@ -85,28 +82,21 @@ def test_sku_to_ottokod_mapping():
     if 'SKU' not in cost_data.columns or 'OTTOKOD' not in cost_data.columns:
         print(f"❌ ERROR: cost.csv missing required columns!")
         print(f"   Expected: 'SKU' and 'OTTOKOD'")
-        print(f"   Found: {list(cost_data.columns)}")
+        print(f"   Found: {columns}")
         return None, None
     
-    # Build mappings (both raw and normalized)
-    sku_to_ottokod = {}
-    sku_to_ottokod_normalized = {}
+    # Build mappings (both raw and normalized) column-wise instead of per row
+    mapped = cost_data.dropna(subset=['SKU', 'OTTOKOD'])
+    sku_clean = mapped['SKU'].astype(str).str.strip()
+    ottokod_clean = mapped['OTTOKOD'].astype(str).str.strip()
     
-    for _, row in cost_data.iterrows():
-        sku = row.get('SKU')
-        ottokod = row.get('OTTOKOD')
-        
-        if pd.notna(sku) and pd.notna(ottokod):
-            sku_clean = str(sku).strip()
-            ottokod_clean = str(ottokod).strip()
-            
-            # Raw mapping
-            sku_to_ottokod[sku_clean] = ottokod_clean
-            
-            # Normalized mapping
-            normalized = normalize_sku(sku_clean)
-            if normalized:
-                sku_to_ottokod_normalized[normalized] = ottokod_clean
+    # Raw mapping
+    sku_to_ottokod = dict(zip(sku_clean, ottokod_clean))
+    
+    # Normalized mapping (same as normalize_sku, in one vectorized pass)
+    normalized = normalize_sku_series(sku_clean)
+    has_normalized = normalized != ''
+    sku_to_ottokod_normalized = dict(zip(normalized[has_normalized], ottokod_clean[has_normalized]))
     
     print(f"✓ Built SKU → OTTOKOD mapping:")
     print(f"  Raw mappings: {len(sku_to_ottokod)}")
@@ -114,9 +104,10 @@ def test_sku_to_ottokod_mapping():
     
     # Show first 10 examples
     print(f"\n  First 10 mappings (showing both raw and normalized):")
-    for i, (sku, ottokod) in enumerate(list(sku_to_ottokod.items())[:10]):
-        normalized = normalize_sku(sku)
-        print(f"    {sku:30s} → {ottokod:15s} (normalized: {normalized})")
+    print("\n".join(
+        f"    {sku:30s} → {ottokod:15s} (normalized: {normalize_sku(sku)})"
+        for sku, ottokod in list(sku_to_ottokod.items())[:10]
+    ))
     
     return sku_to_ottokod, sku_to_ottokod_normalized
 
@@ -133,9 +124,9 @@ def test_desi_lookup(sku_to_ottokod, sku_to_ottokod_normalized):
     
     # Load desi CSV
     try:
-        desi_data = pd.read_csv(desi_csv, encoding='utf-8', decimal=',')
+        desi_data, columns = read_csv_columns(desi_csv, ('OTTOKOD', 'DESİ', 'DESI'), encoding='utf-8', decimal=',')
         print(f"\n✓ Loaded all_products_desi.csv: {len(desi_data)} rows")
-        print(f"  Columns: {list(desi_data.columns)}\n")
+        print(f"  Columns: {columns}\n")
     except Exception as e:
         print(f"\n❌ ERROR loading all_products_desi.csv: {e}")
         return
@@ -143,12 +134,12 @@ def test_desi_lookup(sku_to_ottokod, sku_to_ottokod_normalized):
     # Check if it has OTTOKOD column
     if 'OTTOKOD' not in desi_data.columns:
         print(f"❌ ERROR: all_products_desi.csv missing 'OTTOKOD' column!")
-        print(f"   Found columns: {list(desi_data.columns)}")
+        print(f"   Found columns: {columns}")
         return
     
     if 'DESİ' not in desi_data.columns and 'DESI' not in desi_data.columns:
         print(f"❌ ERROR: all_products_desi.csv missing 'DESİ' or 'DESI' column!")
-        print(f"   Found columns: {list(desi_data.columns)}")
+        print(f"   Found columns: {columns}")
         return
     
     # Normalize column names
@@ -160,10 +151,11 @@ def test_desi_lookup(sku_to_ottokod, sku_to_ottokod_normalized):
     
     # Show first 10 rows
     print(f"\n  First 10 rows:")
-    for i, row in desi_data.head(10).iterrows():
-        ottokod = row.get('OTTOKOD', 'N/A')
-        desi = row.get(desi_col, 'N/A')
-        print(f"    OTTOKOD: {ottokod:20s} → {desi_col}: {desi}")
+    head = desi_data.head(10)
+    print("\n".join(
+        f"    OTTOKOD: {ottokod:20s} → {desi_col}: {desi}"
+        for ottokod, desi in zip(head['OTTOKOD'], head[desi_col])
+    ))
     
     # Test full lookup chain: SKU → OTTOKOD → Desi
     print(f"\n" + "="*80)
@@ -174,6 +166,11 @@ def test_desi_lookup(sku_to_ottokod, sku_to_ottokod_normalized):
         print("\n⚠️  No SKU mappings available (cost.csv issue)")
         return
     
+    # OTTOKOD → Desi hash map built once (first row wins, like the filter it replaces)
+    ottokods = desi_data['OTTOKOD'].str.strip()
+    first_rows = ~ottokods.duplicated()
+    desi_map = dict(zip(ottokods[first_rows], desi_data.loc[first_rows, desi_col]))
+    
     # Test with first 5 SKUs from cost.csv
     test_skus = list(sku_to_ottokod.keys())[:5]
     
@@ -193,15 +190,22 @@ def test_desi_lookup(sku_to_ottokod, sku_to_ottokod_normalized):
         
         # Step 3: OTTOKOD → Desi lookup
         if ottokod:
-            desi_row = desi_data[desi_data['OTTOKOD'].str.strip() == str(ottokod).strip()]
-            if not desi_row.empty:
-                desi_value = desi_row.iloc[0][desi_col]
+            desi_value = desi_map.get(str(ottokod).strip())
+            if desi_value is not None:
                 print(f"    └─ OTTOKOD '{ottokod}' → Desi: {desi_value} kg ✓")
             else:
                 print(f"    └─ OTTOKOD '{ottokod}' NOT FOUND in desi CSV ❌")
         else:
             print(f"    └─ No OTTOKOD found ❌")
         print()
+    
+    # Coverage over ALL mapped SKUs in one membership test, not just the sample above
+    sku_ottokods = pd.Series(sku_to_ottokod)
+    missing = sku_ottokods[~sku_ottokods.isin(set(desi_map))]
+    print(f"Desi coverage: {len(sku_ottokods) - len(missing)}/{len(sku_ottokods)} SKUs have an OTTOKOD in the desi CSV")
+    if len(missing):
+        print(f"  ❌ {len(missing)} SKUs without desi (first 5):")
+        print("\n".join(f"    {sku:30s} → OTTOKOD '{ottokod}'" for sku, ottokod in missing.head(5).items()))
 
 def test_us_shipping_lookup():
     """Test US shipping costs lookup from us_fedex_desi_and_price.csv"""
@@ -216,9 +220,9 @@ def test_us_shipping_lookup():
     
     # Load US shipping CSV
     try:
-        us_data = pd.read_csv(us_csv, encoding='utf-8')
+        us_data, columns = read_csv_columns(us_csv, ('SKU', 'OTTOKOD', *US_COST_COLUMNS), encoding='utf-8')
         print(f"\n✓ Loaded us_fedex_desi_and_price.csv: {len(us_data)} rows")
-        print(f"  Columns: {list(us_data.columns)}\n")
+        print(f"  Columns: {columns}\n")
     except Exception as e:
         print(f"\n❌ ERROR loading us_fedex_desi_and_price.csv: {e}")
         return
@@ -237,29 +241,24 @@ def test_us_shipping_lookup():
         return
     
     # Check for cost columns
-    expected_columns = [
-        'US FEDEX KARGO ÜCRETİ',
-        'FEDEX İŞLEM ÜCRETİ',
-        'DUTY',
-        'DUTY OTAN',
-        'VERGİ',
-        'VERGİ ORANI'
-    ]
-    
     print(f"\n  Checking cost columns:")
-    for col in expected_columns:
+    for col in US_COST_COLUMNS:
         exists = col in us_data.columns
         print(f"    - {col:30s}: {'✓' if exists else '❌ MISSING'}")
     
     # Show first 5 rows
     print(f"\n  First 5 rows:")
     identifier_col = 'SKU' if has_sku else 'OTTOKOD'
-    for i, row in us_data.head(5).iterrows():
-        identifier = row.get(identifier_col, 'N/A')
-        fedex = row.get('US FEDEX KARGO ÜCRETİ', 0)
-        duty = row.get('DUTY', 0)
-        tax = row.get('VERGİ', 0)
-        print(f"    {identifier_col}: {identifier:20s} → FedEx: ${fedex:6.2f}, Duty: ${duty:6.2f}, Tax: ${tax:6.2f}")
+    head = us_data.head(5)
+    # Missing cost columns preview as 0
+    fedex_values, duty_values, tax_values = (
+        head[col] if col in head.columns else [0] * len(head)
+        for col in ('US FEDEX KARGO ÜCRETİ', 'DUTY', 'VERGİ')
+    )
+    print("\n".join(
+        f"    {identifier_col}: {identifier:20s} → FedEx: ${fedex:6.2f}, Duty: ${duty:6.2f}, Tax: ${tax:6.2f}"
+        for identifier, fedex, duty, tax in zip(head[identifier_col], fedex_values, duty_values, tax_values)
+    ))
 
 def main():
     """Run all diagnostic tests."""
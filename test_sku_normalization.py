@@ -1,42 +1,7 @@
 #!/usr/bin/env python3
 """Test script for SKU normalization logic."""
 
-def normalize_sku_for_comparison(sku: str) -> str:
-    """
-    Normalize SKU for comparison by removing common prefixes and converting to lowercase.
-    """
-    if not sku:
-        return sku
-    
-    prefixes_to_remove = [
-        "DELETED-",
-        "OT-",
-        "ZSTK-",
-        "MG-",
-        "LND-",
-        "EU-",
-        "US-",
-        "UK-",
-        "CA-",
-        "AU-",
-        "JP-",
-    ]
-    
-    normalized_sku = sku.strip()
-    
-    # Keep stripping prefixes until none match (handles multiple prefixes)
-    # Compare case-insensitively by checking uppercase version
-    changed = True
-    while changed:
-        changed = False
-        for prefix in prefixes_to_remove:
-            if normalized_sku.upper().startswith(prefix):
-                normalized_sku = normalized_sku[len(prefix):]
-                changed = True
-                break
-    
-    # Convert to lowercase for case-insensitive comparison
-    return normalized_sku.lower()
+from sku_normalize import normalize_sku as normalize_sku_for_comparison
 
 
 # Test cases